@@ -0,0 +1,37 @@
+# REGISTRE DES TYPES COMPACTS PAR TABLE
+
+# Appliqué à la lecture des tables LV (DatabaseManager.iter_table_batch / get_table_batch) lorsque
+# QUERY_CONFIG['COMPACT_DTYPES'] est actif. Les snapshots J0 gardent les valeurs, pas les catégories.
+# pd.read_sql renvoie les codes et les champs CHAR complétés d'espaces sous forme de chaînes Python
+# (une allocation par cellule) : en catégories, chaque valeur distincte n'est stockée qu'une fois.
+#
+# Types possibles :
+#   'category' : codes (peu de valeurs distinctes). Seules les colonnes de chaînes sont converties.
+#   'Int32', 'Int64'... : entiers nullables (un NULL ne transforme plus la colonne en float).
+#                         Non appliqué si une valeur n'est pas entière ou sort de la plage du type.
+#   'float64' : montants / taux renvoyés en Decimal ou en objet (colonne partiellement NULL).
+#   'string' : chaînes stockées par Arrow (voir STRING_DTYPE).
+#   None : aucune conversion (exception à un motif).
+# Toute conversion impossible laisse la colonne inchangée : le registre ne fait jamais échouer une lecture.
+
+# Motifs de noms de colonnes, communs à toutes les tables (le premier motif qui correspond l'emporte)
+DTYPE_PATTERNS = [
+    ('C_*', 'category'),      # Codes (C_PROP, C_ETAT_RCP, C_MD_PMT...)
+    ('TY_*', 'category'),     # Types (TY_DMOD...)
+    ('NO_AVT*', 'Int32'),     # Numéros d'avenant
+    ('NO_ORD_*', 'Int32'),    # Numéros d'ordre (clauses, rangs, mouvements...)
+    ('M_*', 'float64'),       # Montants
+    ('PC_*', 'float64'),      # Pourcentages
+]
+
+# Exceptions par table : {table: {colonne: type ou None}}, prioritaires sur les motifs
+TABLE_DTYPES = {
+    # IBAN / BIC : valeurs quasi uniques par contrat, une catégorie n'apporterait rien
+    'LV.PRCTT0': {
+        'C_BIC_CP': None,
+    },
+}
+
+# Type des autres colonnes de chaînes : None (inchangé) ou 'string[pyarrow]' (chaînes Arrow,
+# plus compactes que des objets Python ; c'est déjà le type par défaut à partir de pandas 3)
+STRING_DTYPE = None
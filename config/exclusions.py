@@ -79,4 +79,22 @@ SPECIFIC_EXCLUSIONS = {
         'NO_AVT_PB',
         'NO_AVT_DCL'
     ]
-}
\ No newline at end of file
+}
+
+# CLÉS MÉTIER D'ALIGNEMENT
+
+# Utilisées pour rapprocher les lignes source/cible quand les tables diffèrent (lignes ajoutées, perdues
+# ou modifiées). Une clé peut être une colonne exclue de la comparaison des valeurs (ex: NO_AVT) :
+# elle sert uniquement à l'appariement. Les doublons de clé sont départagés par ordre d'apparition.
+# Tables absentes : pas d'alignement par clé, différentiel ligne à ligne après tri complet.
+# LV.BSPDT0 n'a pas de clé : ses colonnes d'identification (D_REF_MVT_EPA, numéros d'ordre NO_ORD_*)
+# sont renumérotées à la duplication et exclues de la comparaison ; il ne reste que des valeurs métier
+# (type, montant...), qui ne peuvent pas servir d'appariement sans masquer les écarts qu'elles portent.
+TABLE_KEYS = {
+    'LV.SAVTT0': ['NO_AVT'],
+    'LV.PRCTT0': ['D_REF_PRM'],
+    'LV.SWBGT0': ['NO_AVT', 'C_PROP'],
+    'LV.SCLST0': ['NO_AVT'],
+    'LV.SCLRT0': ['NO_AVT'],
+    'LV.BSPGT0': ['D_REF_MVT_EPA']
+}
@@ -21,6 +21,74 @@ ACTIVATION_OUTPUT_FILE = os.path.join(INPUT_DIR, 'contrats_en_attente_activation
 # C. Variable utilisée par run_comparison.py (doit pointer sur le fichier pivot)
 INPUT_FILE = ACTIVATION_OUTPUT_FILE
 
+# D. Stockage des snapshots J0 (écrits par run_activation.py, relus par run_comparison.py)
+SNAPSHOT_DIR = os.path.join(OUTPUT_DIR, 'snapshots')
+
+SNAPSHOT_CONFIG = {
+    'FORMAT': 'arrow',        # 'arrow' (fichiers Arrow IPC/Feather par table et par bloc) ou 'pickle' (ancien format, 1 fichier par contrat et par table)
+    'COMPRESSION': 'zstd',    # 'zstd', 'lz4' ou None
+    'MAX_OPEN_FILES': 64,     # Nombre de fichiers Arrow gardés ouverts (memory-map) par le lecteur
+    'FULL_ROWS': False,       # True : les snapshots gardent toutes les colonnes (SELECT *), y compris les colonnes exclues de la comparaison
+    'VERIFY_SAMPLE': 0.02     # Part des lectures dont la somme de contrôle est vérifiée (1.0 = toutes, 0 = aucune)
+}
+
+# E. Rapports de comparaison (écrits au fil de l'eau par run_comparison.py)
+REPORT_CONFIG = {
+    'FORMAT': 'csv',              # 'csv' (robuste à un arrêt brutal) ou 'parquet'
+    'FLUSH_EVERY': 100,           # Nombre de lignes de rapport mises en tampon avant écriture disque
+    'MAX_DETAILS_CHARS': 32000    # Au-delà (limite d'une cellule Excel : 32 767), le différentiel part dans un fichier annexe
+}
+
+# F. Journal de reprise de la comparaison (contrats déjà comparés, relu par run_comparison.py --resume)
+CHECKPOINT_FILE = os.path.join(OUTPUT_DIR, 'checkpoints', 'comparison_journal.sqlite')
+
+# G. Cache persistant des résultats de comparaison (réutilisés tant que source, cible et règles sont inchangées)
+RESULT_CACHE_CONFIG = {
+    'ENABLED': False,             # Optionnel (run_comparison.py --use-cache) : sinon toutes les tables sont recomparées
+    'PATH': os.path.join(OUTPUT_DIR, 'cache', 'comparison_results.sqlite'),
+    'MAX_ENTRIES': 200000         # Au-delà, les résultats les moins récemment utilisés sont évincés
+}
+
+# H. Comparaison par sommes de contrôle calculées côté serveur (lignes rapatriées seulement en cas d'écart)
+CHECKSUM_PUSHDOWN = {
+    'ENABLED': False,              # Activable aussi via run_comparison.py --pushdown
+    'STORE_WITH_SNAPSHOTS': True   # run_activation.py enregistre la somme de contrôle source dans le manifeste
+}
+
+# I. Métriques d'exécution (temps par étape, volumes, débit, ETA) pour run_activation.py et run_comparison.py
+METRICS_CONFIG = {
+    'ENABLED': True,
+    'DIR': os.path.join(OUTPUT_DIR, 'metrics'),
+    'FORMATS': ('json', 'prometheus'),   # JSON horodaté par exécution et/ou fichier texte Prometheus (textfile collector)
+    'FLUSH_INTERVAL': 60                 # Réécriture périodique des fichiers en cours d'exécution (secondes)
+}
+
+# J. Bancs d'essai hors ligne (run_benchmark.py : données synthétiques LV.* sur une base SQLite locale)
+BENCHMARK_CONFIG = {
+    'DIR': os.path.join(OUTPUT_DIR, 'benchmarks'),   # Bases synthétiques, snapshots, rapports et historique
+    'SAMPLE_CONTRACTS': 500,       # Contrats utilisés pour les mesures unitaires (lecture snapshot, compare_dataframes)
+    'COMPARE_REPEAT': 3,           # Passes de compare_dataframes sur l'échantillon
+    'REGRESSION_TOLERANCE': 0.20,  # Dégradation tolérée par rapport à la médiane des exécutions précédentes
+    'HISTORY_WINDOW': 5            # Nombre d'exécutions précédentes (mêmes paramètres) servant de référence
+}
+
+# K. Attente de la synchro ELIA -> LISA des contrats dupliqués (run_activation.py, src/visibility.py)
+VISIBILITY_CONFIG = {
+    'INITIAL_DELAY': 1.0,    # Première recherche d'un contrat dans LV.SCNTT0 après sa duplication (secondes)
+    'BACKOFF': 2.0,          # Délai multiplié à chaque recherche infructueuse...
+    'MAX_DELAY': 30.0,       # ... sans dépasser ce plafond (secondes)
+    'DEADLINE': 300.0,       # Au-delà (secondes depuis la duplication), le contrat est déclaré introuvable
+    'CHUNK_SIZE': 1000       # Contrats par requête ensembliste
+}
+
+# L. Comparaison des tables volumineuses dans des processus dédiés (run_comparison.py --compare-processes)
+COMPARE_PROCESS_CONFIG = {
+    'ENABLED': False,                        # Activable aussi via run_comparison.py --compare-processes N
+    'WORKERS': None,                         # Nombre de processus (None = nombre de cœurs du serveur)
+    'TABLES': ('LV.BSPDT0', 'LV.PRCTT0'),    # Tables confiées aux processus (historiques longs, comparaison coûteuse en CPU)
+    'MIN_ROWS': 2000                         # En dessous (lignes source + cible), la comparaison reste dans le thread : le transfert coûterait plus cher
+}
+
 # -----------------------------------------------------------------------------
 # 2. CONFIGURATION BASES DE DONNÉES
 # -----------------------------------------------------------------------------
@@ -35,6 +103,16 @@ DB_CONFIG = {
     'PWD': os.getenv('DB_PWD', '*****************') # Bonne pratique : lire depuis var d'env
 }
 
+# Pool de connexions SQLAlchemy vers LISA (dimensionné pour les traitements parallèles)
+DB_POOL_CONFIG = {
+    'POOL_SIZE': 8,           # Connexions gardées ouvertes dans le pool
+    'MAX_OVERFLOW': 4,        # Connexions supplémentaires autorisées en pic (fermées ensuite)
+    'PRE_PING': True,         # Vérifie la connexion avant usage (coupures réseau, redémarrage serveur)
+    'RECYCLE': 1800,          # Durée de vie max d'une connexion (secondes)
+    'TIMEOUT': 30,            # Attente max d'une connexion libre dans le pool (secondes)
+    'QUERY_TIMEOUT': 300      # Durée max d'une requête (secondes, 0 = illimité)
+}
+
 # B. Configuration ELIA (Pour l'injection/duplication - À ADAPTER)
 DB_CONFIG_ELIA = {
     'DRIVER': 'Oracle in OraClient19Home1', # Exemple courant pour ELIA
@@ -42,4 +120,25 @@ DB_CONFIG_ELIA = {
     'DATABASE': 'ELIA_SCHEMA',
     'UID': 'USER_ELIA',
     'PWD': 'PASSWORD_ELIA'
+}
+
+# C. Requêtes d'extraction des tables comparées
+QUERY_CONFIG = {
+    'PROJECTION': True,       # Liste explicite de colonnes (métadonnées - exclusions) au lieu de SELECT *
+    'COMPACT_DTYPES': False   # Types compacts par table à la lecture (catégories, entiers nullables...), voir config/dtypes.py.
+                              # Désactivé : ~10 % de mémoire en moins par contrat pour des lectures et des snapshots plus lents
+}
+
+# Cache en mémoire des résultats de DatabaseManager.get_data (requêtes de consultation répétées dans une exécution)
+QUERY_CACHE_CONFIG = {
+    'ENABLED': False,                 # Optionnel : un résultat en cache peut être antérieur à une écriture faite hors de ce processus
+    'MAX_BYTES': 256 * 1024 * 1024,   # Mémoire maximale des résultats gardés ; au-delà, les moins récemment utilisés sont évincés
+    'DEFAULT_TTL': 60,                # Durée de validité (secondes) des requêtes sans règle dans TTL
+    'TTL': {                          # Durée de validité par requête du registre (sql/queries.py), motifs acceptés ; 0 = jamais en cache
+        'GET_INTERNAL_ID': 900,       # Le NO_CNT d'un contrat existant ne change pas
+        'GET_INTERNAL_IDS_BULK': 900,
+        'GET_TABLE_COLUMNS': 3600,
+        'GET_FIRST_PREMIUM': 900,
+        'LV.*': 120,                  # Tables comparées (lectures unitaires, mode dégradé)
+    }
 }
\ No newline at end of file
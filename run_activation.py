@@ -2,16 +2,36 @@ import pandas as pd
 import os
 import time
 import logging
+import threading
 from datetime import datetime
+from functools import partial
 from src.database import DatabaseManager
-from sql.queries import QUERIES
-# Ajout de l'import pour le dossier de sortie
-from config.settings import OUTPUT_DIR
+from src.pipeline import StagedPipeline, DEFERRED
+from src.snapshot_store import SnapshotWriter
+from src.visibility import VisibilityWatcher
+from src.metrics import metrics
+from sql.queries import BATCH_QUERIES, get_statement
+from config.settings import SNAPSHOT_CONFIG, CHECKSUM_PUSHDOWN
 
 # --- CONFIGURATION ---
 INPUT_FILE_SOURCES = 'data/input/contrats_sources.xlsx' # Fichier contenant les ID sources si dispo
 OUTPUT_FILE_MAPPING = 'data/input/contrats_en_attente_activation.xlsx'
 DEFAULT_PREMIUM_AMOUNT = 100.00  # Montant par défaut si introuvable
+SNAPSHOT_BATCH_SIZE = 200  # Nombre de contrats sources figés par requête ensembliste
+PAYMENT_BATCH_SIZE = 200  # Nombre de paiements injectés par executemany
+PAYMENT_MAX_WAIT = 2.0  # Attente max (secondes) d'un paiement en file avant l'injection d'un lot incomplet
+
+# Limites de concurrence par étage du pipeline d'activation.
+# Budget de connexions : total des étages + AUXILIARY_CONNECTIONS <= capacité du pool
+# (DB_POOL_CONFIG POOL_SIZE + MAX_OVERFLOW), vérifié au démarrage par check_connection_budget.
+PIPELINE_WORKERS = {
+    'prime': 2,
+    'duplication': 4,
+    'visibilite': 1,  # Simple inscription auprès du surveillant de la synchro ELIA -> LISA (src/visibility.py)
+    'paiement': 1  # Simple mise en file : l'injection est faite par le thread de PaymentBatcher
+}
+# Connexions utilisées hors étages : producteur (snapshots J0), surveillant de visibilité, injection des paiements
+AUXILIARY_CONNECTIONS = 3
 
 # Liste des tables à figer (Snapshot) pour la comparaison future
 TABLES_TO_SNAPSHOT = [
@@ -24,36 +44,60 @@ TABLES_TO_SNAPSHOT = [
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def snapshot_source_contract(db, internal_id, contract_ext):
+def snapshot_source_contracts(db, sources, writer=None):
     """
-    Sauvegarde toutes les tables du contrat source dans des fichiers .pkl (Pickle).
-    Cela permet de figer l'état du contrat source à J0 pour la comparaison à J+7,
+    Sauvegarde toutes les tables d'un bloc de contrats sources dans le magasin de snapshots.
+    Cela permet de figer l'état des contrats sources à J0 pour la comparaison à J+7,
     même si la base de données source est modifiée entre temps.
-    """
-    snapshot_dir = os.path.join(OUTPUT_DIR, 'snapshots')
-    if not os.path.exists(snapshot_dir):
-        os.makedirs(snapshot_dir, exist_ok=True)
-
-    logger.info(f"   [Snapshot] 📸 Sauvegarde de l'état source pour {contract_ext} (ID: {internal_id})...")
-
-    for table in TABLES_TO_SNAPSHOT:
-        if table not in QUERIES:
-            continue
-
-        try:
-            # On utilise les mêmes requêtes que pour la comparaison
-            query = QUERIES[table].format(internal_id=internal_id)
-            df_source = db.get_data(query)
 
-            # Sauvegarde au format Pickle (garde les types exacts : dates, float...)
-            # Nom du fichier : contractExt_tableName.pkl
-            filename = f"{contract_ext}_{table}.pkl"
-            filepath = os.path.join(snapshot_dir, filename)
+    Chaque table est extraite en une seule requête pour tout le bloc (DatabaseManager.get_table_batch),
+    puis écrite en un fichier columnar compressé par table et par bloc (voir src/snapshot_store.py).
 
-            df_source.to_pickle(filepath)
-
-        except Exception as e:
-            logger.error(f"   [!] Erreur snapshot {table}: {e}")
+    Args:
+        sources (list): Liste de tuples (internal_id, contract_ext).
+        writer (SnapshotWriter): Écrivain du run en cours (un nouveau run est créé si absent).
+    """
+    if writer is None:
+        writer = SnapshotWriter()
+
+    for internal_id, contract_ext in sources:
+        logger.info(f"   [Snapshot] 📸 Sauvegarde de l'état source pour {contract_ext} (ID: {internal_id})...")
+
+    exts_by_id = {}
+    for internal_id, contract_ext in sources:
+        exts_by_id.setdefault(internal_id, []).append(contract_ext)
+
+    # Une seule connexion du pool pour toutes les tables du bloc
+    with db.session():
+        for table in TABLES_TO_SNAPSHOT:
+            if table not in BATCH_QUERIES:
+                continue
+
+            try:
+                # Somme de contrôle serveur de l'état J0 : permet à run_comparison --pushdown de ne
+                # rapatrier la table cible que si elle diffère de la source
+                server_checksums = None
+                if CHECKSUM_PUSHDOWN.get('STORE_WITH_SNAPSHOTS'):
+                    definition, checksums = db.get_table_checksums(table, [internal_id for internal_id, _ in sources])
+                    if definition is not None:
+                        server_checksums = (definition, {
+                            str(contract_ext): checksums[internal_id]
+                            for internal_id, contract_ext in sources if internal_id in checksums
+                        })
+
+                # On utilise les mêmes requêtes que pour la comparaison (variante ensembliste), lues en flux :
+                # chaque contrat est écrit dès que ses lignes sont complètes (mémoire bornée sur les gros historiques)
+                frames = db.iter_table_batch(table, [internal_id for internal_id, _ in sources],
+                                             full_rows=SNAPSHOT_CONFIG.get('FULL_ROWS', False))
+                writer.write_block(table, (
+                    (contract_ext, df) for internal_id, df in frames for contract_ext in exts_by_id[internal_id]
+                ), server_checksums)
+            except Exception as e:
+                logger.error(f"   [!] Erreur snapshot {table}: {e}")
+
+def snapshot_source_contract(db, internal_id, contract_ext, writer=None):
+    """Sauvegarde le snapshot d'un seul contrat source (voir snapshot_source_contracts)."""
+    snapshot_source_contracts(db, [(internal_id, contract_ext)], writer)
 
 def get_source_premium_amount(db, internal_id_source):
     """
@@ -61,8 +105,7 @@ def get_source_premium_amount(db, internal_id_source):
     pour le répliquer à l'identique.
     """
     try:
-        query = f"SELECT TOP 1 M_PAY FROM LV.PRCTT0 WHERE NO_CNT = {internal_id_source} ORDER BY D_REF_PRM ASC"
-        df = db.get_data(query)
+        df = db.get_data(get_statement("GET_FIRST_PREMIUM"), {'internal_id': internal_id_source})
         if not df.empty and 'M_PAY' in df.columns:
             return float(df.iloc[0]['M_PAY'])
     except Exception as e:
@@ -105,25 +148,174 @@ def duplicate_contract_in_elia(source_contract_ext, db_manager):
 
     return new_contract_ext
 
-def get_internal_id_with_retry(db, contract_ext, max_retries=3):
+def stage_premium(db, item):
     """
-    Récupère le NO_CNT (Interne) à partir du NO_CNT_EXTENDED (Externe).
-    Avec tentative de réessai si le contrat vient d'être créé et n'est pas encore visible.
+    Étage 1 du pipeline : récupération du montant de la prime source.
+    (Le snapshot J0 a déjà été pris par le producteur avant l'injection dans le pipeline.)
     """
-    for i in range(max_retries):
-        try:
-            q = QUERIES["GET_INTERNAL_ID"].format(contract_number=contract_ext)
-            df = db.get_data(q)
+    logger.info(f"--- Traitement Source : {item['Ancien_Contrat']} ---")
 
-            if not df.empty:
-                return df.iloc[0]['NO_CNT']
+    if item['Id_Source']:
+        item['Montant'] = get_source_premium_amount(db, item['Id_Source'])
+    else:
+        logger.warning("   [!] Impossible de trouver ID source. Snapshot impossible & Prime par défaut.")
+        item['Montant'] = DEFAULT_PREMIUM_AMOUNT
+    return True
 
-            logger.info(f"   ... ID interne introuvable (Essai {i+1}/{max_retries}). Attente...")
-            time.sleep(2) # Attendre 2 secondes avant de réessayer
-        except Exception:
-            pass
+def stage_duplication(db, item):
+    """Étage 2 du pipeline : duplication du contrat dans ELIA."""
+    try:
+        item['Nouveau_Contrat'] = duplicate_contract_in_elia(item['Ancien_Contrat'], db)
+        return True
+    except Exception as e:
+        logger.error(f"   [!] Erreur lors de la duplication : {e}")
+        item['Result'] = {
+            'Ancien_Contrat': item['Ancien_Contrat'], 'Statut': 'KO_DUPLICATION', 'Error': str(e)
+        }
+        return False
 
-    return None
+def stage_visibility(watcher, item):
+    """
+    Étage 3 du pipeline : attente de la visibilité du nouveau contrat dans LISA (LV.SCNTT0).
+    Le contrat est confié au surveillant (recherche groupée de tous les contrats en attente) : aucun
+    thread n'est bloqué pendant la synchro, le contrat reprend au paiement dès qu'il est visible.
+    """
+    watcher.watch(item['Nouveau_Contrat'], item)
+    return DEFERRED
+
+def on_contract_visible(pipeline, item, internal_id):
+    """Le nouveau contrat est visible dans LISA : il passe à l'étage de paiement."""
+    item['Id_New'] = internal_id
+    pipeline.resume(item, True)
+
+def on_contract_not_found(pipeline, item):
+    """Le nouveau contrat n'est pas apparu dans LISA avant l'échéance (VISIBILITY_CONFIG['DEADLINE'])."""
+    new_contract_ext = item['Nouveau_Contrat']
+    logger.error(f"   [!] Nouveau contrat {new_contract_ext} introuvable dans LISA (LV.SCNTT0).")
+    logger.error("       -> Impossible d'injecter le paiement. Vérifier la synchro ELIA->LISA.")
+    item['Result'] = {
+        'Ancien_Contrat': item['Ancien_Contrat'],
+        'Nouveau_Contrat': new_contract_ext,
+        'Statut': 'KO_NOT_FOUND_IN_LISA'
+    }
+    pipeline.resume(item, False)
+
+class PaymentBatcher:
+    """
+    Regroupe les contrats prêts à être payés et les injecte par lots (DatabaseManager.inject_payments).
+
+    Un lot part dès qu'il est complet (batch_size) ou que son plus ancien paiement attend depuis max_wait
+    secondes : les contrats sont payés au fil de l'eau, sans attendre la fin des autres étages du pipeline.
+    L'injection se fait sur le thread du regroupeur ; une fois le résultat du contrat renseigné
+    (item['Result']), on_paid(item) est appelé (ex: StagedPipeline.resume). close() injecte le reliquat.
+    """
+
+    def __init__(self, db, on_paid, batch_size=PAYMENT_BATCH_SIZE, max_wait=PAYMENT_MAX_WAIT):
+        self.db = db
+        self.on_paid = on_paid
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._pending = []   # (item, instant de mise en file)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='paiement-lots', daemon=True)
+        self._thread.start()
+
+    def add(self, item):
+        with self._condition:
+            self._pending.append((item, time.monotonic()))
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def close(self):
+        """Injecte les paiements encore en file puis arrête le regroupeur."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                batch = self._wait_for_batch()
+            if batch is None:
+                return
+            self._inject(batch)
+
+    def _wait_for_batch(self):
+        """Attend un lot complet ou trop ancien (sous verrou). Retourne None à l'arrêt, file vide."""
+        while True:
+            if self._pending:
+                deadline = self._pending[0][1] + self.max_wait
+                if self._closed or len(self._pending) >= self.batch_size or time.monotonic() >= deadline:
+                    batch = [item for item, _ in self._pending[:self.batch_size]]
+                    del self._pending[:self.batch_size]
+                    return batch
+                self._condition.wait(deadline - time.monotonic())
+            elif self._closed:
+                return None
+            else:
+                self._condition.wait()
+
+    def _inject(self, batch):
+        logger.info(f"   -> Injection en masse de {len(batch)} paiement(s)...")
+        try:
+            results = self.db.inject_payments([(item['Id_New'], item['Montant'], None) for item in batch])
+            error = None
+        except Exception as e:
+            logger.error(f"   [!] Injection de {len(batch)} paiement(s) impossible : {e}")
+            results, error = [False] * len(batch), str(e)
+        injection_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        for item, payment_success in zip(batch, results):
+            item['Result'] = {
+                'Ancien_Contrat': item['Ancien_Contrat'],
+                'Nouveau_Contrat': item['Nouveau_Contrat'],
+                'ID_Interne_New': item['Id_New'],
+                'Montant_Paye': item['Montant'],
+                'Date_Injection': injection_date,
+                'Statut': 'OK_PAID' if payment_success else 'KO_PAYMENT'
+            }
+            if error is not None:
+                item['Result']['Error'] = error
+            try:
+                self.on_paid(item)
+            except Exception as e:
+                logger.error(f"Erreur dans le traitement d'un contrat payé : {e}")
+
+def stage_payment(batcher, item):
+    """
+    Étage 4 du pipeline : mise en file du paiement d'activation (injecté par lots).
+    Le contrat reste en cours jusqu'à l'injection de son lot (PaymentBatcher.on_paid).
+    """
+    logger.info(f"   -> Paiement de {item['Montant']}€ planifié sur contrat {item['Id_New']}...")
+    batcher.add(item)
+    return DEFERRED
+
+def on_stage_error(item, stage_name, error):
+    """Un crash inattendu dans un étage termine le contrat en erreur sans arrêter le pipeline."""
+    item['Result'] = {
+        'Ancien_Contrat': item['Ancien_Contrat'],
+        'Nouveau_Contrat': item.get('Nouveau_Contrat'),
+        'Statut': f'KO_{stage_name.upper()}',
+        'Error': str(error)
+    }
+
+def check_connection_budget(db):
+    """
+    Vérifie que les threads du pipeline ne demandent pas plus de connexions que le pool ne peut en ouvrir
+    (sinon ils attendent une connexion libre, jusqu'à l'erreur au bout de DB_POOL_CONFIG['TIMEOUT']).
+
+    Returns:
+        bool: True si le budget tient dans la capacité du pool.
+    """
+    budget = sum(PIPELINE_WORKERS.values()) + AUXILIARY_CONNECTIONS
+    capacity = db.pool_capacity()
+    if budget > capacity:
+        logger.warning(f"Le pipeline peut utiliser {budget} connexions simultanées pour une capacité de pool de {capacity} : "
+                       f"augmenter DB_POOL_CONFIG (POOL_SIZE / MAX_OVERFLOW) ou réduire PIPELINE_WORKERS.")
+        return False
+    return True
 
 def main():
     logger.info("--- Démarrage du Script d'Activation (Duplication & Paiement & Snapshot) ---")
@@ -132,6 +324,7 @@ def main():
     db = DatabaseManager()
     if not db.test_connection():
         return
+    check_connection_budget(db)
 
     # 2. Liste des contrats sources
     # Option A: Depuis fichier
@@ -143,67 +336,69 @@ def main():
         logger.warning(f"Fichier {INPUT_FILE_SOURCES} non trouvé. Utilisation liste par défaut.")
         contrats_sources = ['12345678', '87654321']
 
-    mapping_resultats = []
+    # Mesures d'exécution (temps par étape, débit, ETA) : voir METRICS_CONFIG
+    metrics.start('activation', total=len(contrats_sources))
 
-    # 3. Boucle de traitement
+    # Résolution en masse des ID internes sources (une poignée de requêtes pour tout le fichier)
+    source_index = db.resolve_internal_ids(contrats_sources)
+    logger.info(f"ID internes sources résolus : {len(source_index)}/{len(contrats_sources)}")
+
+    # Un élément de pipeline par ligne du fichier source (l'ordre d'origine sert au fichier de sortie)
+    items = []
     for old_contract in contrats_sources:
         old_contract = str(old_contract).strip()
-        logger.info(f"--- Traitement Source : {old_contract} ---")
-
-        # --- ÉTAPE A : SNAPSHOT & PRÉPARATION ---
-        # On récupère l'ID interne source tout de suite pour faire le snapshot
-        id_int_source = get_internal_id_with_retry(db, old_contract, max_retries=1)
-
-        if id_int_source:
-            # CRUCIAL : On sauvegarde l'état actuel du contrat source
-            snapshot_source_contract(db, id_int_source, old_contract)
-
-            # On récupère le montant de la prime
-            montant_prime = get_source_premium_amount(db, id_int_source)
-        else:
-            logger.warning("   [!] Impossible de trouver ID source. Snapshot impossible & Prime par défaut.")
-            montant_prime = DEFAULT_PREMIUM_AMOUNT
-
-        # --- ÉTAPE B : DUPLICATION (ELIA) ---
-        try:
-            new_contract_ext = duplicate_contract_in_elia(old_contract, db)
-        except Exception as e:
-            logger.error(f"   [!] Erreur lors de la duplication : {e}")
-            mapping_resultats.append({
-                'Ancien_Contrat': old_contract, 'Statut': 'KO_DUPLICATION', 'Error': str(e)
-            })
-            continue
-
-        # --- ÉTAPE C : PAIEMENT (LISA) ---
-        # C1. Récup ID Interne NOUVEAU (Crucial pour injecter le paiement)
-        id_int_new = get_internal_id_with_retry(db, new_contract_ext, max_retries=5)
-
-        if not id_int_new:
-            logger.error(f"   [!] Nouveau contrat {new_contract_ext} introuvable dans LISA (LV.SCNTT0).")
-            logger.error("       -> Impossible d'injecter le paiement. Vérifier la synchro ELIA->LISA.")
-            mapping_resultats.append({
-                'Ancien_Contrat': old_contract,
-                'Nouveau_Contrat': new_contract_ext,
-                'Statut': 'KO_NOT_FOUND_IN_LISA'
-            })
-            continue
-
-        # C2. Injection du paiement
-        logger.info(f"   -> Injection paiement de {montant_prime}€ sur contrat {id_int_new}...")
-        payment_success = db.inject_payment(contract_internal_id=id_int_new, amount=montant_prime)
-
-        status = 'OK_PAID' if payment_success else 'KO_PAYMENT'
-
-        # --- ÉTAPE D : STOCKAGE RÉSULTAT ---
-        mapping_resultats.append({
+        source_entry = source_index.get(old_contract)
+        items.append({
             'Ancien_Contrat': old_contract,
-            'Nouveau_Contrat': new_contract_ext,
-            'ID_Interne_New': id_int_new,
-            'Montant_Paye': montant_prime,
-            'Date_Injection': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'Statut': status
+            'Id_Source': source_entry['NO_CNT'] if source_entry else None,
+            'Result': None
         })
 
+    # 3. Pipeline de traitement
+    # Prime -> Duplication ELIA -> Visibilité LISA -> Paiement, chaque étage avec sa propre concurrence.
+    # Pendant qu'un contrat attend la synchro ELIA->LISA, les suivants sont figés et dupliqués.
+    # Les contrats en attente de synchro sont recherchés ensemble par le surveillant, qui les
+    # rend au pipeline (étage paiement) dès qu'ils sont visibles. Les paiements partent par lots,
+    # complets ou au plus tard PAYMENT_MAX_WAIT secondes après leur mise en file : un contrat n'est
+    # terminé (suivi d'avancement) qu'une fois son paiement injecté.
+    payment_batcher = PaymentBatcher(db, on_paid=lambda item: pipeline.resume(item, False))
+    watcher = VisibilityWatcher(
+        db,
+        on_visible=lambda item, internal_id: on_contract_visible(pipeline, item, internal_id),
+        on_timeout=lambda item: on_contract_not_found(pipeline, item)
+    )
+    pipeline = StagedPipeline([
+        ('prime', partial(stage_premium, db), PIPELINE_WORKERS['prime']),
+        ('duplication', partial(stage_duplication, db), PIPELINE_WORKERS['duplication']),
+        ('visibilite', partial(stage_visibility, watcher), PIPELINE_WORKERS['visibilite']),
+        ('paiement', partial(stage_payment, payment_batcher), PIPELINE_WORKERS['paiement']),
+    ], on_error=on_stage_error, on_done=lambda item: metrics.advance())
+
+    snapshot_writer = SnapshotWriter()
+    logger.info(f"Snapshots J0 du run {snapshot_writer.run_id} ({snapshot_writer.file_format}) : {snapshot_writer.run_dir}")
+
+    # Producteur : snapshot J0 par blocs (une requête par table et par bloc), puis injection du bloc
+    # dans le pipeline. CRUCIAL : un contrat n'est dupliqué qu'après que son état source a été figé.
+    for start in range(0, len(items), SNAPSHOT_BATCH_SIZE):
+        block = items[start:start + SNAPSHOT_BATCH_SIZE]
+        sources_to_snapshot = list(dict.fromkeys(
+            (item['Id_Source'], item['Ancien_Contrat']) for item in block if item['Id_Source']
+        ))
+        if sources_to_snapshot:
+            snapshot_source_contracts(db, sources_to_snapshot, snapshot_writer)
+
+        for item in block:
+            pipeline.submit(item)
+
+    pipeline.join()
+    watcher.close()
+    payment_batcher.close()
+    logger.info(f"Pool de connexions : {db.get_pool_stats()}")
+    if db.query_cache is not None:
+        logger.info(f"Cache des requêtes : {db.get_cache_stats()}")
+    metrics.finish()
+    mapping_resultats = [item['Result'] for item in items if item['Result'] is not None]
+
     # 4. Sauvegarde du fichier pour le Comparateur (Script B)
     if mapping_resultats:
         os.makedirs(os.path.dirname(OUTPUT_FILE_MAPPING), exist_ok=True)
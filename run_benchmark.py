@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+import run_comparison
+from run_activation import snapshot_source_contracts, SNAPSHOT_BATCH_SIZE
+from src.comparator import compare_dataframes
+from src.snapshot_store import SnapshotWriter, SnapshotReader
+from src.sqlite_database import SQLiteDatabaseManager
+from src.synthetic_data import generate_database, contract_mapping, TABLE_SCHEMAS
+from src.metrics import metrics
+from config.settings import BENCHMARK_CONFIG, METRICS_CONFIG
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TABLES = list(TABLE_SCHEMAS)
+
+# Indicateurs suivis dans l'historique. Sens de la dégradation : True = plus haut est meilleur (débit)
+TRACKED_RESULTS = {
+    'snapshot_save_contracts_per_s': True,
+    'snapshot_load_p50_ms': False,
+    'snapshot_load_p95_ms': False,
+    'compare_p50_ms': False,
+    'compare_p95_ms': False,
+    'e2e_contracts_per_min': True,
+}
+
+# Loggers des traitements mesurés : une ligne de log par contrat fausserait les mesures à 100 000 contrats
+QUIET_LOGGERS = ['run_comparison', 'run_activation', 'src']
+
+
+def percentiles(latencies):
+    """p50 / p95 / max (millisecondes) d'une liste de durées en secondes."""
+    if not latencies:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    values = np.asarray(latencies) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+def stage_totals(snapshot):
+    """Temps cumulé (secondes) par étape, toutes tables confondues, à partir de metrics.snapshot()."""
+    return {
+        stage: round(sum(stats['total_s'] for stats in tables.values()), 3)
+        for stage, tables in snapshot['stages'].items()
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# --- BANCS D'ESSAI ---
+
+def bench_snapshot_save(db, mapping, snapshot_dir):
+    """Figeage J0 de tous les contrats sources (extraction ensembliste + écriture des snapshots)."""
+    if os.path.exists(snapshot_dir):
+        shutil.rmtree(snapshot_dir)
+    id_index = db.resolve_internal_ids(mapping['Ancien_Contrat'])
+    sources = [(id_index[c]['NO_CNT'], c) for c in mapping['Ancien_Contrat'] if c in id_index]
+    writer = SnapshotWriter(snapshot_dir, run_id='benchmark')
+
+    metrics.start('benchmark_snapshot', total=len(sources))
+    start = time.perf_counter()
+    for block_start in range(0, len(sources), SNAPSHOT_BATCH_SIZE):
+        snapshot_source_contracts(db, sources[block_start:block_start + SNAPSHOT_BATCH_SIZE], writer)
+    elapsed = time.perf_counter() - start
+
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(snapshot_dir) for f in files)
+    return {
+        'snapshot_save_s': round(elapsed, 3),
+        'snapshot_save_contracts_per_s': round(len(sources) / elapsed, 2) if elapsed else 0.0,
+        'snapshot_bytes': size,
+        'snapshot_stages_s': stage_totals(metrics.snapshot())
+    }
+
+
+def bench_snapshot_load(reader, contracts):
+    """Relecture (contrat, table) des snapshots d'un échantillon de contrats : latence unitaire."""
+    latencies, frames = [], {}
+    for contract in contracts:
+        for table in TABLES:
+            start = time.perf_counter()
+            df = reader.load(contract, table)
+            latencies.append(time.perf_counter() - start)
+            if df is not None:
+                frames[(contract, table)] = df
+    return frames, {f'snapshot_load_{key}': value for key, value in percentiles(latencies).items()}
+
+
+def bench_compare(db, ref_frames, sample, repeat):
+    """
+    compare_dataframes seul (données déjà en mémoire) sur l'échantillon, `repeat` passes.
+    Les DataFrames cibles sont extraits une fois, en dehors de la mesure.
+    """
+    id_index = db.resolve_internal_ids(sample['Nouveau_Contrat'])
+    pairs = []
+    for table in TABLES:
+        target_ids = {c: id_index[c]['NO_CNT'] for c in sample['Nouveau_Contrat'] if c in id_index}
+        target_frames = db.get_table_batch(table, list(target_ids.values()))
+        for ref_contract, new_contract in zip(sample['Ancien_Contrat'], sample['Nouveau_Contrat']):
+            if (ref_contract, table) in ref_frames and new_contract in target_ids:
+                pairs.append((table, ref_frames[(ref_contract, table)],
+                              target_frames.get(target_ids[new_contract], pd.DataFrame())))
+
+    latencies, statuses = [], {}
+    for _ in range(repeat):
+        for table, df_ref, df_new in pairs:
+            start = time.perf_counter()
+            status, _ = compare_dataframes(df_ref, df_new, table)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    results = {f'compare_{key}': value for key, value in percentiles(latencies).items()}
+    results['compare_calls'] = len(latencies)
+    results['compare_statuses'] = {status: count // repeat for status, count in statuses.items()}
+    return results
+
+
+def bench_end_to_end(db_path, mapping, work_dir, workers, bulk_compare, pushdown, compare_processes):
+    """
+    run_comparison.main sur toute la campagne synthétique : snapshots J0 relus, cibles extraites de la base
+    SQLite, comparaison et rapports. Les chemins du module sont redirigés vers le dossier du banc d'essai.
+    """
+    output_dir = os.path.join(work_dir, 'comparison')
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    input_file = os.path.join(work_dir, 'mapping.xlsx')
+    mapping.to_excel(input_file, index=False)
+
+    patched = {
+        'DatabaseManager': lambda: SQLiteDatabaseManager(db_path),
+        'INPUT_FILE': input_file,
+        'OUTPUT_DIR': output_dir,
+        'SNAPSHOT_DIR': os.path.join(work_dir, 'snapshots'),
+        'CHECKPOINT_FILE': os.path.join(work_dir, 'checkpoints', 'comparison_journal.sqlite'),
+    }
+    saved = {name: getattr(run_comparison, name) for name in patched}
+    for name, value in patched.items():
+        setattr(run_comparison, name, value)
+    try:
+        start = time.perf_counter()
+        # Cache de résultats désactivé : chaque exécution recompare réellement toutes les tables
+        run_comparison.main(workers=workers, bulk_compare=bulk_compare, use_cache=False, pushdown=pushdown,
+                            compare_processes=compare_processes)
+        elapsed = time.perf_counter() - start
+    finally:
+        for name, value in saved.items():
+            setattr(run_comparison, name, value)
+
+    reports = sorted(f for f in os.listdir(output_dir) if f.startswith('rapport_detaille_'))
+    report = pd.DataFrame()
+    if reports:
+        path = os.path.join(output_dir, reports[-1])
+        report = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path, sep=';', dtype=str)
+
+    return report, {
+        'e2e_s': round(elapsed, 3),
+        'e2e_contracts_per_min': round(len(mapping) / elapsed * 60, 1) if elapsed else 0.0,
+        'e2e_stages_s': stage_totals(metrics.snapshot())
+    }
+
+
+def check_detection(report, expected_diffs):
+    """Les écarts injectés par le générateur sont-ils tous détectés, et seulement eux ?"""
+    expected = {(f"S{contract:09d}", table) for contract, table, _ in expected_diffs}
+    detected = set()
+    if not report.empty:
+        failed = report[report['Status'].astype(str).str.startswith('KO') | (report['Status'] == 'CRITICAL_ERROR')]
+        detected = set(zip(failed['Reference_Contract'].astype(str), failed['Table']))
+    return {
+        'expected': len(expected),
+        'detected': len(detected & expected),
+        'missed': sorted(expected - detected)[:20],
+        'false_positives': sorted(detected - expected)[:20],
+        'ok': expected == detected
+    }
+
+
+# --- HISTORIQUE ET RÉGRESSIONS ---
+
+def load_history(history_file):
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(entry, history, tolerance, window):
+    """
+    Compare les indicateurs suivis à la médiane des `window` dernières exécutions de mêmes paramètres.
+
+    Returns:
+        list: [(indicateur, valeur, référence, écart relatif), ...] pour les dégradations au-delà de `tolerance`.
+    """
+    previous = [h for h in history if h['params'] == entry['params']][-window:]
+    regressions = []
+    for name, higher_is_better in TRACKED_RESULTS.items():
+        values = [h['results'][name] for h in previous if h['results'].get(name)]
+        value = entry['results'].get(name)
+        if not values or not value:
+            continue
+        baseline = float(np.median(values))
+        change = (value - baseline) / baseline
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append((name, value, baseline, change))
+    return regressions
+
+
+def run_size(n_contracts, args):
+    """Toutes les mesures pour une campagne de `n_contracts` couples source / cible."""
+    work_dir = os.path.join(args.dir, f'{n_contracts}_contracts')
+    db_path = os.path.join(args.dir, 'data', f'lv_{n_contracts}_s{args.seed}.sqlite')
+
+    logger.info(f"=== Banc d'essai : {n_contracts} contrats ===")
+    start = time.perf_counter()
+    info = generate_database(db_path, n_contracts, seed=args.seed, diff_rate=args.diff_rate)
+    generation_s = time.perf_counter() - start
+
+    mapping = contract_mapping(n_contracts)
+    db = SQLiteDatabaseManager(db_path)
+    results = {'rows': info['rows'], 'generation_s': round(generation_s, 3)}
+
+    logger.info("Mesure : snapshots J0 (écriture)...")
+    results.update(bench_snapshot_save(db, mapping, os.path.join(work_dir, 'snapshots')))
+
+    sample = mapping.sample(n=min(args.sample, n_contracts), random_state=args.seed)
+    logger.info(f"Mesure : lecture des snapshots et compare_dataframes ({len(sample)} contrats)...")
+    metrics.start('benchmark_compare')
+    reader = SnapshotReader(os.path.join(work_dir, 'snapshots'))
+    ref_frames, load_results = bench_snapshot_load(reader, sample['Ancien_Contrat'])
+    results.update(load_results)
+    results.update(bench_compare(db, ref_frames, sample, args.repeat))
+
+    logger.info("Mesure : run_comparison de bout en bout...")
+    report, e2e_results = bench_end_to_end(db_path, mapping, work_dir, args.workers, args.bulk_compare, args.pushdown,
+                                           args.compare_processes)
+    results.update(e2e_results)
+    results['detection'] = check_detection(report, info['expected_diffs'])
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'sqlalchemy': sqlalchemy.__version__,
+            'pyarrow': pa.__version__ if pa is not None else None,
+            'machine': platform.node()
+        },
+        'params': {
+            'contracts': n_contracts, 'seed': args.seed, 'diff_rate': args.diff_rate,
+            'workers': args.workers, 'bulk_compare': args.bulk_compare, 'pushdown': args.pushdown,
+            'compare_processes': args.compare_processes
+        },
+        'results': results
+    }
+
+
+def main(args):
+    """
+    Bancs d'essai hors ligne des chemins critiques (sans accès à LISA).
+
+    Pour chaque taille de campagne : génération (ou réutilisation) d'une base synthétique des 8 tables LV,
+    puis mesure du figeage J0 (snapshots), de la relecture des snapshots, de compare_dataframes et du débit
+    de run_comparison de bout en bout. Les écarts injectés doivent tous être détectés.
+
+    Chaque exécution est ajoutée à l'historique (history.jsonl) et comparée à la médiane des exécutions
+    précédentes de mêmes paramètres.
+
+    Returns:
+        int: Code de sortie (1 si un écart injecté n'est pas détecté, ou en cas de régression avec --check).
+    """
+    os.makedirs(args.dir, exist_ok=True)
+    history_file = os.path.join(args.dir, 'history.jsonl')
+    history = load_history(history_file)
+
+    if not args.verbose:
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.CRITICAL)
+    # Métriques des traitements mesurés écrites avec les résultats du banc d'essai, pas avec celles de production
+    metrics.config = dict(METRICS_CONFIG, DIR=os.path.join(args.dir, 'metrics'))
+
+    exit_code = 0
+    for n_contracts in args.contracts:
+        entry = run_size(n_contracts, args)
+        results = entry['results']
+        regressions = find_regressions(entry, history, args.tolerance, args.window)
+
+        with open(history_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+        history.append(entry)
+
+        print("\n" + "=" * 60)
+        print(f" BANC D'ESSAI : {n_contracts} CONTRATS ({entry['git_revision'] or 'révision inconnue'})")
+        print("=" * 60)
+        for name in TRACKED_RESULTS:
+            print(f" {name:<32} {results.get(name)}")
+        print(f" {'e2e_stages_s':<32} {results['e2e_stages_s']}")
+        detection = results['detection']
+        print(f" Écarts injectés détectés : {detection['detected']}/{detection['expected']}"
+              f" - faux positifs : {len(detection['false_positives'])}")
+        print("=" * 60 + "\n")
+
+        if not detection['ok']:
+            logger.error(f"Détection incorrecte : manqués {detection['missed']}, faux positifs {detection['false_positives']}")
+            exit_code = 1
+        for name, value, baseline, change in regressions:
+            logger.warning(f"   [!] Régression {name} : {value} contre {baseline:.3f} (médiane des exécutions précédentes), {change:+.0%}")
+        if regressions and args.check:
+            exit_code = 1
+
+    logger.info(f"Historique des bancs d'essai : {history_file}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bancs d'essai hors ligne Auto-Activator (données synthétiques, SQLite)")
+    parser.add_argument('--contracts', type=int, nargs='+', default=[1000],
+                        help="Taille(s) de campagne, ex: --contracts 1000 10000 100000 (défaut : 1000).")
+    parser.add_argument('--seed', type=int, default=42, help="Graine du générateur (défaut : 42).")
+    parser.add_argument('--diff-rate', type=float, default=0.05,
+                        help="Proportion de contrats cibles recevant un écart (défaut : 0.05).")
+    parser.add_argument('--workers', type=int, default=1, help="Option --workers de run_comparison (défaut : 1).")
+    parser.add_argument('--bulk-compare', action='store_true', help="Option --bulk-compare de run_comparison.")
+    parser.add_argument('--pushdown', action='store_true', help="Option --pushdown de run_comparison.")
+    parser.add_argument('--compare-processes', type=int, default=0, metavar='N',
+                        help="Option --compare-processes de run_comparison (défaut : 0, désactivé).")
+    parser.add_argument('--sample', type=int, default=BENCHMARK_CONFIG.get('SAMPLE_CONTRACTS', 500),
+                        help="Contrats utilisés pour les mesures unitaires (lecture snapshot, compare_dataframes).")
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_CONFIG.get('COMPARE_REPEAT', 3),
+                        help="Passes de compare_dataframes sur l'échantillon.")
+    parser.add_argument('--tolerance', type=float, default=BENCHMARK_CONFIG.get('REGRESSION_TOLERANCE', 0.2),
+                        help="Dégradation tolérée par rapport aux exécutions précédentes (défaut : 0.2 = 20 %%).")
+    parser.add_argument('--window', type=int, default=BENCHMARK_CONFIG.get('HISTORY_WINDOW', 5),
+                        help="Nombre d'exécutions précédentes servant de référence.")
+    parser.add_argument('--check', action='store_true', help="Code de sortie 1 en cas de régression (intégration continue).")
+    parser.add_argument('--dir', default=BENCHMARK_CONFIG['DIR'], help="Dossier de travail et d'historique.")
+    parser.add_argument('--verbose', action='store_true', help="Garde les logs détaillés des traitements mesurés.")
+    sys.exit(main(parser.parse_args()))
@@ -1,16 +1,454 @@
 import pandas as pd
 import os
+import argparse
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from src.database import DatabaseManager
-from src.comparator import compare_dataframes
-from sql.queries import QUERIES
-from config.settings import INPUT_FILE, OUTPUT_DIR
+from src.comparator import compare_dataframes, compare_tables_bulk, PLAN_VERSION
+from src.snapshot_store import SnapshotReader
+from src.reporting import ReportWriter
+from src.checkpoint import CheckpointJournal, campaign_fingerprint
+from src.result_cache import ResultCache, result_key
+from src.metrics import metrics
+from src.compare_pool import ProcessCompareBackend
+from sql.queries import BATCH_QUERIES
+from config.settings import (INPUT_FILE, OUTPUT_DIR, SNAPSHOT_DIR, CHECKPOINT_FILE, RESULT_CACHE_CONFIG,
+                             CHECKSUM_PUSHDOWN, COMPARE_PROCESS_CONFIG)
 
 # Configuration du logger pour le suivi de l'exécution
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
+# Liste exhaustive des tables définies dans le périmètre du test C01
+TABLES_TO_CHECK = [
+    "LV.SCNTT0", "LV.SAVTT0", "LV.PRCTT0",
+    "LV.SWBGT0", "LV.SCLST0", "LV.SCLRT0",
+    "LV.BSPDT0", "LV.BSPGT0"
+]
+
+# Nombre de contrats extraits par requête ensembliste (NO_CNT IN (...)) pour chaque table
+BATCH_SIZE = 200
+
+
+def build_jobs(df_input, id_index):
+    """
+    Transforme le fichier de mapping en une liste ordonnée de "jobs" de comparaison.
+
+    Chaque job porte les deux numéros de contrat, leurs ID internes et le code produit.
+    Les lignes à ne pas comparer (activation KO, ID introuvable...) sont conservées avec leur
+    statut final dans 'Skip_Status' afin que la synthèse garde l'ordre exact du fichier.
+    """
+    jobs = []
+    for index, row in df_input.iterrows():
+        ref_contract = str(row['Ancien_Contrat']).strip().replace('.0', '')
+        new_contract = str(row['Nouveau_Contrat']).strip().replace('.0', '')
+        job = {'Row': index + 1, 'Ref_Contract': ref_contract, 'New_Contract': new_contract, 'Skip_Status': None}
+
+        # Filtre métier : Exclusion des échecs d'activation
+        # Inutile de comparer un contrat cible si l'étape d'injection ou de duplication (J0) a échoué.
+        if 'Statut' in row:
+            status_activation = str(row['Statut']).strip()
+            if not status_activation.upper().startswith('OK'):
+                logger.warning(f"Skip [{index+1}] {ref_contract} : Contrat ignoré car l'activation (J0) était en échec ({status_activation}).")
+                job['Skip_Status'] = 'SKIP_ACTIVATION_KO'
+                jobs.append(job)
+                continue
+
+        # Sécurité contre les lignes vides dans Excel
+        if not ref_contract or ref_contract == 'nan' or not new_contract or new_contract == 'nan':
+            continue
+
+        # Lecture des ID internes dans l'index pré-calculé
+        if id_index is None:
+            job['Skip_Status'] = 'CRASH_ID'
+            jobs.append(job)
+            continue
+
+        ref_entry = id_index.get(ref_contract)
+        new_entry = id_index.get(new_contract)
+
+        if ref_entry is None or new_entry is None:
+            logger.warning(f"Skip [{index+1}] {ref_contract} : ID interne (NO_CNT) introuvable pour l'un des contrats.")
+            job['Skip_Status'] = 'ERROR_ID_LISA'
+            jobs.append(job)
+            continue
+
+        job['Id_Ref'] = ref_entry['NO_CNT']
+        job['Id_New'] = new_entry['NO_CNT']
+        # Le code produit (C_PROP_PRINC) sert à grouper les statistiques par produit à la fin.
+        job['Product'] = ref_entry['C_PROP_PRINC'] or "UNKNOWN"
+        jobs.append(job)
+
+    return jobs
+
+
+def checksum_pushdown(db, jobs, table, snapshots):
+    """
+    Compare source et cible par sommes de contrôle calculées côté serveur, sans rapatrier les lignes.
+
+    La somme de la source est celle enregistrée dans le manifeste au moment du snapshot (état J0) ;
+    en mode dégradé (pas de snapshot), elle est calculée en live comme celle de la cible. Un snapshot
+    sans somme de contrôle (ou calculée avec d'autres colonnes/exclusions) n'est pas éligible.
+
+    Returns:
+        dict: {Row: ((Statut, None), is_snapshot)} pour les seuls contrats dont les sommes sont égales.
+              Les autres doivent être extraits et comparés normalement.
+    """
+    definition, target_checksums = db.get_table_checksums(table, [job['Id_New'] for job in jobs])
+    if definition is None:
+        return {}
+
+    live_jobs = [job for job in jobs if not snapshots.has(job['Ref_Contract'], table)]
+    source_checksums = db.get_table_checksums(table, [job['Id_Ref'] for job in live_jobs])[1] if live_jobs else {}
+
+    matched = {}
+    for job in jobs:
+        target_value = target_checksums.get(job['Id_New'])
+        if target_value is None:
+            continue
+
+        entry = snapshots.get_entry(job['Ref_Contract'], table)
+        if entry is not None:
+            stored = entry.get('server_checksum')
+            if not stored or stored['definition'] != definition:
+                continue
+            source_value, is_snapshot = (stored['rows'], stored['value']), True
+        else:
+            source_value, is_snapshot = source_checksums.get(job['Id_Ref']), False
+
+        if source_value is not None and tuple(source_value) == tuple(target_value):
+            # Mêmes statuts que compare_dataframes : deux tables vides sont OK_EMPTY
+            matched[job['Row']] = (("OK_EMPTY" if target_value[0] == 0 else "OK", None), is_snapshot)
+    return matched
+
+
+def fetch_block_data(db, jobs, snapshots, pushdown=False):
+    """
+    Prépare toutes les données d'un bloc de contrats, table par table, en requêtes ensemblistes.
+
+    En mode `pushdown`, les tables dont la somme de contrôle serveur est identique côté source et cible
+    ne sont pas extraites : leur résultat est directement renvoyé dans `matched`.
+
+    Returns:
+        tuple: (ref_data, new_data, matched) où
+               ref_data[(Ref_Contract, table)] = (DataFrame, is_snapshot)
+               new_data[(Id_New, table)] = DataFrame
+               matched[(Row, table)] = ((Statut, Détails), is_snapshot)
+    """
+    ref_data = {}
+    new_data = {}
+    matched = {}
+
+    for table in TABLES_TO_CHECK:
+        if table not in BATCH_QUERIES:
+            continue
+
+        table_jobs = jobs
+        if pushdown:
+            try:
+                table_matched = checksum_pushdown(db, jobs, table, snapshots)
+            except Exception as e:
+                logger.error(f"  -> Échec de la comparaison par sommes de contrôle sur {table}, extraction complète : {e}")
+                table_matched = {}
+            for row, result in table_matched.items():
+                matched[(row, table)] = result
+            table_jobs = [job for job in jobs if job['Row'] not in table_matched]
+            if not table_jobs:
+                continue
+
+        # --- A. DONNÉES SOURCES (RÉFÉRENCE) ---
+        # Méthode prioritaire : Chargement depuis le magasin de snapshots (Arrow, ou Pickle pour les anciens runs).
+        # Cela garantit que l'on compare avec l'état exact du contrat au moment de son clonage (J0),
+        # évitant ainsi les faux positifs si le contrat source a été modifié entre temps.
+        missing_snapshot = []
+        for job in table_jobs:
+            df_snapshot = snapshots.load(job['Ref_Contract'], table)
+            if df_snapshot is not None:
+                ref_data[(job['Ref_Contract'], table)] = (df_snapshot, True)
+            else:
+                missing_snapshot.append(job)
+
+        # Mode dégradé (Fallback) : Si le snapshot est absent, on interroge la base de données en direct.
+        # Attention : Risque d'écarts temporels. Les contrats concernés sont extraits ensemble.
+        if missing_snapshot:
+            logger.info(f"   [Info] Snapshot introuvable pour {table} sur {len(missing_snapshot)} contrat(s). "
+                        f"Interrogation Live de la base source (Mode dégradé).")
+            live_frames = db.get_table_batch(table, [job['Id_Ref'] for job in missing_snapshot])
+            for job in missing_snapshot:
+                ref_data[(job['Ref_Contract'], table)] = (live_frames.get(job['Id_Ref'], pd.DataFrame()), False)
+
+        # --- B. DONNÉES CIBLES (NOUVEAUX CONTRATS) ---
+        # Le contrat cible est toujours interrogé en live dans la base de données LISA pour vérifier
+        # que les batchs de nuit l'ont correctement traité.
+        target_frames = db.get_table_batch(table, [job['Id_New'] for job in table_jobs])
+        for job in table_jobs:
+            new_data[(job['Id_New'], table)] = target_frames.get(job['Id_New'], pd.DataFrame())
+
+    return ref_data, new_data, matched
+
+
+def lookup_cached_results(cache, jobs, ref_data, new_data):
+    """
+    Recherche dans le cache persistant les comparaisons dont la source et la cible n'ont pas changé.
+
+    Returns:
+        tuple: (clés de cache {(Row, table): clé}, résultats trouvés {(Row, table): (Statut, Détails sérialisés)})
+    """
+    keys = {}
+    cached = {}
+    for job in jobs:
+        for table in TABLES_TO_CHECK:
+            if (job['Ref_Contract'], table) not in ref_data or (job['Id_New'], table) not in new_data:
+                continue
+            try:
+                key = result_key(table, ref_data[(job['Ref_Contract'], table)][0], new_data[(job['Id_New'], table)])
+            except TypeError:
+                # Valeurs non hachables : pas de mise en cache pour cette table
+                continue
+            keys[(job['Row'], table)] = key
+            hit = cache.get(key)
+            if hit is not None:
+                cached[(job['Row'], table)] = hit
+    return keys, cached
+
+
+def bulk_compare_block(jobs, ref_data, new_data, skip=None):
+    """
+    Compare chaque table pour tout un bloc de contrats en une passe vectorisée (compare_tables_bulk).
+    Les contrats sont identifiés par leur numéro de ligne dans le fichier de mapping.
+    Les couples (Row, table) présents dans `skip` (déjà en cache) ne sont pas recomparés.
+
+    Returns:
+        dict: {(Row, table): (Statut, Détails)}
+    """
+    skip = skip or {}
+    results = {}
+    for table in TABLES_TO_CHECK:
+        pairs = [job for job in jobs if (job['Ref_Contract'], table) in ref_data and (job['Id_New'], table) in new_data
+                 and (job['Row'], table) not in skip]
+        if not pairs:
+            continue
+
+        df_ref_all = pd.concat([ref_data[(job['Ref_Contract'], table)][0].assign(_row=job['Row']) for job in pairs], ignore_index=True)
+        df_new_all = pd.concat([new_data[(job['Id_New'], table)].assign(_row=job['Row']) for job in pairs], ignore_index=True)
+
+        with metrics.timer('compare_bulk', table) as measure:
+            measure['rows'] = len(df_ref_all) + len(df_new_all)
+            table_results = compare_tables_bulk(table, df_ref_all, df_new_all, key='_row', contracts=[job['Row'] for job in pairs])
+        for row, result in table_results.items():
+            results[(row, table)] = result
+    return results
+
+
+def offload_heavy_tables(compare_pool, jobs, ref_data, new_data, skip=None):
+    """
+    Confie au pool de processus les comparaisons volumineuses d'un bloc (voir ProcessCompareBackend.accepts).
+    Les couples (Row, table) présents dans `skip` (déjà en cache) ne sont pas recomparés.
+
+    Returns:
+        dict: {(Row, table): Future} ; les autres couples restent comparés dans le thread.
+    """
+    skip = skip or {}
+    futures = {}
+    for job in jobs:
+        for table in TABLES_TO_CHECK:
+            if (job['Row'], table) in skip or (job['Ref_Contract'], table) not in ref_data or (job['Id_New'], table) not in new_data:
+                continue
+            df_ref, df_new = ref_data[(job['Ref_Contract'], table)][0], new_data[(job['Id_New'], table)]
+            if not compare_pool.accepts(table, df_ref, df_new):
+                continue
+            try:
+                futures[(job['Row'], table)] = compare_pool.submit(table, df_ref, df_new)
+            except Exception as e:
+                logger.warning(f"  -> Transfert vers le pool de processus impossible ({table}), comparaison dans le thread : {e}")
+    return futures
+
+
+def collect_offloaded(futures, job, precomputed):
+    """Attend les comparaisons d'un contrat confiées aux processus et les range dans `precomputed`."""
+    for table in TABLES_TO_CHECK:
+        future = futures.pop((job['Row'], table), None)
+        if future is None:
+            continue
+        try:
+            status, diff_details, _ = future.result()
+            precomputed[(job['Row'], table)] = (status, diff_details)
+        except Exception as e:
+            # Processus arrêté, résultat non transférable... : compare_contract refait la comparaison dans le thread
+            logger.warning(f"  -> Échec de la comparaison en processus ({table}), repli dans le thread : {e}")
+
+
+def format_details(diff_details):
+    """Sérialisation en texte brut d'un différentiel (DataFrame) ou d'un message d'écart."""
+    if not hasattr(diff_details, 'to_string'):
+        return str(diff_details)
+    # Types nullables (entiers compacts, chaînes Arrow) : na_rep ne s'applique pas à <NA>
+    nullable = [col for col, dtype in diff_details.dtypes.items() if getattr(dtype, 'na_value', None) is pd.NA]
+    if nullable:
+        diff_details = diff_details.astype({col: object for col in nullable})
+        diff_details[nullable] = diff_details[nullable].fillna('-')
+    return diff_details.to_string(na_rep='-', max_rows=None, max_cols=None)
+
+
+def compare_contract(job, ref_data, new_data, total, precomputed=None, matched=None):
+    """
+    Compare toutes les tables d'un contrat à partir des données pré-chargées.
+    Si `precomputed` est fourni (mode bulk), les statuts déjà calculés par table sont réutilisés.
+    Les tables présentes dans `matched` (sommes de contrôle serveur identiques) sont OK sans données.
+
+    Returns:
+        tuple: (Lignes du rapport détaillé (list), Entrée de synthèse (dict))
+    """
+    ref_contract = job['Ref_Contract']
+    new_contract = job['New_Contract']
+    product_code = job['Product']
+    report_rows = []
+
+    logger.info(f"Traitement [{job['Row']}/{total}] : Réf {ref_contract} (Snapshot J0) vs Nouveau {new_contract} (Live LISA)")
+
+    contract_global_status = "OK"
+
+    for table in TABLES_TO_CHECK:
+        pushed = matched.get((job['Row'], table)) if matched else None
+        if pushed is not None:
+            is_snapshot = pushed[1]
+        elif (ref_contract, table) not in ref_data or (job['Id_New'], table) not in new_data:
+            continue
+        else:
+            df_ref_data, is_snapshot = ref_data[(ref_contract, table)]
+            df_new_data = new_data[(job['Id_New'], table)]
+
+        # --- C. EXÉCUTION DE LA COMPARAISON ---
+        try:
+            # Appel au module central de comparaison qui gère le nettoyage et le différentiel
+            if pushed is not None:
+                status, diff_details = pushed[0]
+            elif precomputed is not None and (job['Row'], table) in precomputed:
+                status, diff_details = precomputed[(job['Row'], table)]
+            else:
+                status, diff_details = compare_dataframes(df_ref_data, df_new_data, table)
+            details_str = ""
+
+            # Traitement des anomalies détectées
+            if status == "KO" or str(status).startswith("KO_"):
+                contract_global_status = "KO"
+
+                # Sérialisation du DataFrame de différences en texte brut pour sauvegarde
+                details_str = format_details(diff_details)
+
+                # Affichage restreint dans la console pour ne pas saturer les logs
+                logger.error(f" ÉCHEC SUR LE CONTRAT {ref_contract} (Table: {table})")
+                logger.error(f"DIFFÉRENCES (Aperçu) :\n{str(details_str)[:500]}...\n{'-'*50}")
+
+            # Historisation du résultat (pour le rapport détaillé)
+            report_rows.append({
+                'Reference_Contract': ref_contract,
+                'New_Contract': new_contract,
+                'Product': product_code,
+                'Table': table,
+                'Status': status,
+                'Source_Type': 'SNAPSHOT' if is_snapshot else 'LIVE_DB',
+                'Details': details_str
+            })
+
+        except Exception as e:
+            logger.error(f"  -> Crash applicatif inattendu sur la table {table} : {e}")
+            contract_global_status = "KO"
+            report_rows.append({
+                'Reference_Contract': ref_contract, 'New_Contract': new_contract,
+                'Product': product_code, 'Table': table,
+                'Status': 'CRITICAL_ERROR', 'Details': str(e)
+            })
+
+    # Mise à jour des KPIs globaux pour le contrat
+    return report_rows, {'Product': product_code, 'Contract': ref_contract, 'Status': contract_global_status}
+
+
+def map_bounded(executor, func, items, window):
+    """
+    Comme executor.map, résultats restitués dans l'ordre des éléments, mais avec au plus `window` tâches
+    soumises et non consommées à la fois : les blocs terminés en avance n'attendent pas en mémoire
+    pendant que tous les suivants sont extraits et comparés.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_block(db, block_jobs, snapshots, total, bulk_compare=False, completed=None, cache=None, pushdown=False,
+                  compare_pool=None):
+    """
+    Traite un bloc de jobs : extraction ensembliste puis comparaison contrat par contrat.
+    L'ordre des résultats suit strictement l'ordre des jobs (donc du fichier de mapping).
+
+    Les contrats présents dans `completed` (reprise sur journal) ne sont ni extraits ni comparés :
+    leurs résultats enregistrés sont réutilisés tels quels. Avec un `cache` de résultats, seules les
+    tables dont la source ou la cible a changé depuis une exécution précédente sont recomparées.
+    En mode `pushdown`, seules les tables dont les sommes de contrôle serveur diffèrent sont extraites.
+    Avec un `compare_pool`, les tables volumineuses sont comparées dans des processus pendant que ce thread
+    compare les autres.
+
+    Returns:
+        list: Un tuple (job, lignes_rapport, entrée_synthèse, déjà_journalisé) par job du bloc.
+    """
+    completed = completed or {}
+    active_jobs = [job for job in block_jobs
+                   if job['Skip_Status'] is None and (job['Ref_Contract'], job['New_Contract']) not in completed]
+    ref_data, new_data, matched = fetch_block_data(db, active_jobs, snapshots, pushdown) if active_jobs else ({}, {}, {})
+
+    # Résultats déjà connus (cache persistant) : réutilisés comme des résultats pré-calculés
+    cache_keys, cached = ({}, {})
+    if cache is not None and active_jobs:
+        cache_keys, cached = lookup_cached_results(cache, active_jobs, ref_data, new_data)
+
+    # Tables volumineuses envoyées aux processus en premier : elles sont comparées pendant le reste du bloc
+    offloaded = {}
+    if compare_pool is not None and active_jobs:
+        offloaded = offload_heavy_tables(compare_pool, active_jobs, ref_data, new_data, skip=cached)
+
+    precomputed = dict(cached) if cached else None
+    if bulk_compare and active_jobs:
+        try:
+            precomputed = {**bulk_compare_block(active_jobs, ref_data, new_data, skip={**cached, **offloaded}), **cached}
+        except Exception as e:
+            # Repli sur la comparaison contrat par contrat
+            logger.error(f"  -> Échec de la comparaison bulk du bloc, repli unitaire : {e}")
+    if offloaded and precomputed is None:
+        precomputed = {}
+
+    results = []
+    for job in block_jobs:
+        if job['Skip_Status'] is not None:
+            results.append((job, [], {'Product': 'UNKNOWN', 'Contract': job['Ref_Contract'], 'Status': job['Skip_Status']}, False))
+            continue
+
+        stored = completed.get((job['Ref_Contract'], job['New_Contract']))
+        if stored is not None:
+            results.append((job, stored[0], stored[1], True))
+            continue
+
+        if offloaded:
+            collect_offloaded(offloaded, job, precomputed)
+        contract_rows, contract_stats = compare_contract(job, ref_data, new_data, total, precomputed, matched)
+        results.append((job, contract_rows, contract_stats, False))
+
+        # Mise en cache des nouveaux résultats (statut + différentiel sérialisé, tel qu'écrit dans le rapport)
+        if cache is not None:
+            for row in contract_rows:
+                key = cache_keys.get((job['Row'], row['Table']))
+                if key is not None and (job['Row'], row['Table']) not in cached and row['Status'] != 'CRITICAL_ERROR':
+                    cache.put(key, row['Status'], row['Details'])
+
+    return results
+
+
+def main(workers=1, bulk_compare=False, resume=False, use_cache=None, pushdown=None, compare_processes=None):
     """
     Script principal de comparaison (Phase 2 du processus Auto-Activator).
 
@@ -18,6 +456,20 @@ def main():
     Comparer les données d'un contrat cible (nouvellement activé via batch) avec
     les données de son contrat source (figées lors de la phase d'activation).
     Ce script est conçu pour tourner de manière asynchrone (ex: J+7 après l'activation).
+
+    Args:
+        workers (int): Nombre de blocs de contrats traités en parallèle (1 = mode séquentiel).
+                       Plafonné à la capacité du pool de connexions SQLAlchemy.
+        bulk_compare (bool): Compare chaque table pour tout un bloc en une passe vectorisée
+                             (compare_tables_bulk) au lieu d'un appel par contrat.
+        resume (bool): Reprend une campagne interrompue : les contrats déjà présents dans le journal
+                       (CHECKPOINT_FILE) ne sont pas recomparés, leurs résultats sont fusionnés dans les rapports.
+        use_cache (bool): Réutilise les résultats des exécutions précédentes pour les couples source/cible
+                          inchangés (défaut : RESULT_CACHE_CONFIG['ENABLED']).
+        pushdown (bool): Compare d'abord les sommes de contrôle calculées côté serveur et n'extrait que
+                         les tables en écart (défaut : CHECKSUM_PUSHDOWN['ENABLED']).
+        compare_processes (int): Nombre de processus comparant les tables volumineuses (COMPARE_PROCESS_CONFIG),
+                                 0 = tout est comparé dans les threads (défaut : selon COMPARE_PROCESS_CONFIG).
     """
     logger.info("--- Démarrage du Comparateur Auto-Activator (Mode Snapshot) ---")
 
@@ -25,7 +477,7 @@ def main():
     # Création du dossier de sortie s'il n'existe pas, et ciblage du dossier contenant les sauvegardes (snapshots)
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
-    snapshot_dir = os.path.join(OUTPUT_DIR, 'snapshots')
+    snapshots = SnapshotReader(SNAPSHOT_DIR)
 
     # ÉTAPE 2 : Initialisation des connexions
     try:
@@ -56,199 +508,148 @@ def main():
         logger.error(f"Structure invalide. Le fichier Excel doit contenir au minimum les colonnes : {required_cols}")
         return
 
-    # Initialisation des structures de stockage pour le reporting
-    report_data = [] # Détail des erreurs par table
-    stats_list = []  # Statut global par contrat pour la synthèse
-
-    # ÉTAPE 4 : Boucle d'analyse des contrats
-    for index, row in df_input.iterrows():
-        ref_contract = str(row['Ancien_Contrat']).strip().replace('.0', '')
-        new_contract = str(row['Nouveau_Contrat']).strip().replace('.0', '')
-
-        # Filtre métier : Exclusion des échecs d'activation
-        # Inutile de comparer un contrat cible si l'étape d'injection ou de duplication (J0) a échoué.
-        if 'Statut' in row:
-            status_activation = str(row['Statut']).strip()
-            if not status_activation.upper().startswith('OK'):
-                logger.warning(f"Skip [{index+1}] {ref_contract} : Contrat ignoré car l'activation (J0) était en échec ({status_activation}).")
-                stats_list.append({'Product': 'UNKNOWN', 'Contract': ref_contract, 'Status': 'SKIP_ACTIVATION_KO'})
-                continue
+    # Journal de reprise : chaque bloc terminé y est enregistré. Hors reprise, il est remis à zéro.
+    # Une reprise n'est acceptée que pour la même campagne (mapping, snapshots J0, règles de comparaison).
+    try:
+        journal = CheckpointJournal(CHECKPOINT_FILE, resume=resume,
+                                    fingerprint=campaign_fingerprint(INPUT_FILE, snapshots.fingerprint(), PLAN_VERSION))
+    except RuntimeError as e:
+        logger.error(f"Reprise impossible : {e}")
+        return
 
-        # Sécurité contre les lignes vides dans Excel
-        if not ref_contract or ref_contract == 'nan' or not new_contract or new_contract == 'nan':
+    # Initialisation du rapport : les résultats sont écrits au fil de l'eau (mémoire bornée, rien de perdu
+    # en cas d'arrêt brutal) et la synthèse par produit est tenue par des compteurs.
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report = ReportWriter(OUTPUT_DIR, timestamp)
+    metrics.start('comparison', timestamp=timestamp)
+
+    # ÉTAPE 3 bis : Traduction en masse des ID (Externe -> Interne)
+    # LISA utilise un identifiant interne (NO_CNT) différent du numéro de police (NO_CNT_EXTENDED).
+    # Plutôt que 3 allers-retours par ligne (ID source, ID cible, code produit), on résout
+    # l'ensemble du fichier en quelques requêtes ensemblistes et on travaille ensuite sur l'index en mémoire.
+    contracts_to_resolve = []
+    for _, row in df_input.iterrows():
+        if 'Statut' in row and not str(row['Statut']).strip().upper().startswith('OK'):
             continue
+        contracts_to_resolve.append(str(row['Ancien_Contrat']).strip().replace('.0', ''))
+        contracts_to_resolve.append(str(row['Nouveau_Contrat']).strip().replace('.0', ''))
 
-        logger.info(f"Traitement [{index+1}/{len(df_input)}] : Réf {ref_contract} (Snapshot J0) vs Nouveau {new_contract} (Live LISA)")
-
-        # ÉTAPE 4.1 : Traduction des ID (Externe -> Interne)
-        # LISA utilise un identifiant interne (NO_CNT) différent du numéro de police (NO_CNT_EXTENDED).
+    try:
+        id_index = db.resolve_internal_ids(c for c in contracts_to_resolve if c != 'nan')
+        logger.info(f"Index des ID internes chargé : {len(id_index)} contrats résolus.")
+    except Exception as e:
+        logger.error(f"Erreur technique lors de la résolution en masse des identifiants : {e}")
+        id_index = None
+
+    # ÉTAPE 4 : Analyse des contrats par blocs
+    # Chaque bloc est extrait en une requête par table (au lieu de 8 requêtes par contrat),
+    # puis comparé contrat par contrat dans l'ordre du fichier de mapping.
+    jobs = build_jobs(df_input, id_index)
+    metrics.set_total(len(jobs))
+
+    if pushdown is None:
+        pushdown = CHECKSUM_PUSHDOWN.get('ENABLED', False)
+    if use_cache is None:
+        use_cache = RESULT_CACHE_CONFIG.get('ENABLED', False)
+    cache = ResultCache() if use_cache else None
+
+    # Comparaison des tables volumineuses dans des processus (calcul pandas limité par le GIL dans les threads)
+    if compare_processes is None:
+        compare_processes = (COMPARE_PROCESS_CONFIG.get('WORKERS') or os.cpu_count() or 1) if COMPARE_PROCESS_CONFIG.get('ENABLED') else 0
+    compare_pool = None
+    if compare_processes > 0:
         try:
-            q_id_ref = QUERIES["GET_INTERNAL_ID"].format(contract_number=ref_contract)
-            df_id_ref = db.get_data(q_id_ref)
-
-            q_id_new = QUERIES["GET_INTERNAL_ID"].format(contract_number=new_contract)
-            df_id_new = db.get_data(q_id_new)
-
-            if df_id_ref.empty or df_id_new.empty:
-                logger.warning(f"  -> ID interne (NO_CNT) introuvable pour l'un des contrats. Contrat ignoré.")
-                stats_list.append({'Product': 'UNKNOWN', 'Contract': ref_contract, 'Status': 'ERROR_ID_LISA'})
-                continue
-
-            id_ref = df_id_ref.iloc[0]['NO_CNT']
-            id_new = df_id_new.iloc[0]['NO_CNT']
-
-            # Récupération du code produit (C_PROP_PRINC) pour pouvoir grouper les statistiques par produit à la fin.
-            try:
-                if hasattr(db, 'get_product_code'):
-                    product_code = db.get_product_code(id_ref)
-                else:
-                    q_prod = f"SELECT TOP 1 C_PROP_PRINC FROM LV.SCNTT0 WHERE NO_CNT = {id_ref}"
-                    df_prod = db.get_data(q_prod)
-                    product_code = str(df_prod.iloc[0]['C_PROP_PRINC']).strip() if not df_prod.empty else "UNKNOWN"
-            except:
-                product_code = "ERROR_PROD"
-
-        except Exception as e:
-            logger.error(f"  -> Erreur technique lors de la récupération des identifiants : {e}")
-            stats_list.append({'Product': 'UNKNOWN', 'Contract': ref_contract, 'Status': 'CRASH_ID'})
-            continue
-
-        # ÉTAPE 4.2 : Analyse comparative table par table
-        # Liste exhaustive des tables définies dans le périmètre du test C01
-        tables_to_check = [
-            "LV.SCNTT0", "LV.SAVTT0", "LV.PRCTT0",
-            "LV.SWBGT0", "LV.SCLST0", "LV.SCLRT0",
-            "LV.BSPDT0", "LV.BSPGT0"
-        ]
-
-        contract_global_status = "OK"
-
-        for table in tables_to_check:
-            if table not in QUERIES:
-                continue
-
-            # --- A. CHARGEMENT DES DONNÉES SOURCES (RÉFÉRENCE) ---
-            # Méthode prioritaire : Chargement depuis le fichier Pickle (.pkl).
-            # Cela garantit que l'on compare avec l'état exact du contrat au moment de son clonage (J0),
-            # évitant ainsi les faux positifs si le contrat source a été modifié entre temps.
-            df_ref_data = pd.DataFrame()
-            snapshot_path = os.path.join(snapshot_dir, f"{ref_contract}_{table}.pkl")
-            is_snapshot = False
-
-            if os.path.exists(snapshot_path):
-                try:
-                    df_ref_data = pd.read_pickle(snapshot_path)
-                    is_snapshot = True
-                except Exception as e:
-                    logger.warning(f"   [!] Erreur de lecture du snapshot {snapshot_path} : {e}")
-
-            # Mode dégradé (Fallback) : Si le snapshot est absent, on interroge la base de données en direct.
-            # Attention : Risque d'écarts temporels.
-            if not is_snapshot:
-                logger.info(f"   [Info] Snapshot introuvable pour {table}. Interrogation Live de la base source (Mode dégradé).")
-                query_template = QUERIES[table]
-                if "{internal_id}" in query_template:
-                    q_ref = query_template.format(internal_id=id_ref)
-                elif "{contract_number}" in query_template:
-                    q_ref = query_template.format(contract_number=ref_contract)
-                else:
-                    q_ref = None
-
-                if q_ref:
-                    df_ref_data = db.get_data(q_ref)
-
-            # --- B. CHARGEMENT DES DONNÉES CIBLES (NOUVEAU CONTRAT) ---
-            # Le contrat cible est toujours interrogé en live dans la base de données LISA pour vérifier
-            # que les batchs de nuit l'ont correctement traité.
-            query_template = QUERIES[table]
-            if "{internal_id}" in query_template:
-                q_new = query_template.format(internal_id=id_new)
-            elif "{contract_number}" in query_template:
-                q_new = query_template.format(contract_number=new_contract)
-            else:
-                continue
-
-            df_new_data = db.get_data(q_new)
-
-            # --- C. EXÉCUTION DE LA COMPARAISON ---
-            try:
-                # Appel au module central de comparaison qui gère le nettoyage et le différentiel
-                status, diff_details = compare_dataframes(df_ref_data, df_new_data, table)
-                details_str = ""
-
-                # Traitement des anomalies détectées
-                if status == "KO" or str(status).startswith("KO_"):
-                    contract_global_status = "KO"
-
-                    # Sérialisation du DataFrame de différences en texte brut pour sauvegarde
-                    if hasattr(diff_details, 'to_string'):
-                        details_str = diff_details.to_string(na_rep='-', max_rows=None, max_cols=None)
-                    else:
-                        details_str = str(diff_details)
-
-                    # Affichage restreint dans la console pour ne pas saturer les logs
-                    logger.error(f" ÉCHEC SUR LE CONTRAT {ref_contract} (Table: {table})")
-                    logger.error(f"DIFFÉRENCES (Aperçu) :\n{str(details_str)[:500]}...\n{'-'*50}")
-
-                # Historisation du résultat (pour le rapport détaillé)
-                report_data.append({
-                    'Reference_Contract': ref_contract,
-                    'New_Contract': new_contract,
-                    'Product': product_code,
-                    'Table': table,
-                    'Status': status,
-                    'Source_Type': 'SNAPSHOT' if is_snapshot else 'LIVE_DB',
-                    'Details': details_str
-                })
-
-            except Exception as e:
-                logger.error(f"  -> Crash applicatif inattendu sur la table {table} : {e}")
-                contract_global_status = "KO"
-                report_data.append({
-                    'Reference_Contract': ref_contract, 'New_Contract': new_contract,
-                    'Product': product_code, 'Table': table,
-                    'Status': 'CRITICAL_ERROR', 'Details': str(e)
-                })
-
-        # Mise à jour des KPIs globaux pour le contrat
-        stats_list.append({
-            'Product': product_code,
-            'Contract': ref_contract,
-            'Status': contract_global_status
-        })
-
-    # ÉTAPE 5 : Génération des résultats (Fichiers CSV)
-    if report_data or stats_list:
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            compare_pool = ProcessCompareBackend(compare_processes)
+        except RuntimeError as e:
+            logger.warning(f"Comparaison multi-processus indisponible, comparaison dans les threads : {e}")
+
+    completed = journal.load() if resume else {}
+    if resume:
+        already_done = sum(1 for job in jobs if (job['Ref_Contract'], job['New_Contract']) in completed)
+        logger.info(f"Reprise sur journal ({CHECKPOINT_FILE}) : {already_done} contrat(s) déjà comparé(s) seront réutilisés.")
+
+    # Planification à partir du manifeste des snapshots, avant toute requête sur les tables :
+    # volumétrie attendue, contrats qui basculeront en mode dégradé, snapshots corrompus détectés en amont.
+    plan = snapshots.plan([job['Ref_Contract'] for job in jobs
+                           if job['Skip_Status'] is None and (job['Ref_Contract'], job['New_Contract']) not in completed],
+                          TABLES_TO_CHECK)
+    logger.info(f"Plan de comparaison : {plan['available']} snapshot(s) disponible(s) "
+                f"({plan['rows']} lignes, {plan['bytes'] / 1e6:.1f} Mo), "
+                f"{plan['missing']} absent(s) (mode dégradé Live), {len(plan['corrupt'])} corrompu(s).")
+    for contract, table, reason in plan['corrupt']:
+        logger.warning(f"   [!] Snapshot inutilisable ({contract}, {table}) : {reason}. Bascule en mode dégradé.")
+
+    # Le temps est dominé par l'attente réseau vers SQL Server : en mode parallèle, plusieurs blocs
+    # sont traités simultanément, chaque thread occupant au plus une connexion du pool.
+    workers = max(1, min(workers, db.pool_capacity()))
+    if compare_pool is not None and workers == 1:
+        # Un second thread extrait le bloc suivant pendant que les processus comparent le bloc courant
+        workers = min(2, db.pool_capacity())
+    block_size = BATCH_SIZE
+    if workers > 1:
+        # On réduit la taille des blocs pour que chaque thread ait du travail sur les petites campagnes
+        block_size = max(1, min(BATCH_SIZE, (len(jobs) + workers - 1) // workers))
+    blocks = [jobs[start:start + block_size] for start in range(0, len(jobs), block_size)]
+
+    def run_block(block_jobs):
+        # Toutes les requêtes du bloc passent par une seule connexion empruntée au pool
+        with db.session():
+            return process_block(db, block_jobs, snapshots, len(df_input), bulk_compare, completed, cache, pushdown,
+                                 compare_pool)
+
+    if workers == 1:
+        results = map(run_block, blocks)
+    else:
+        logger.info(f"Mode parallèle : {workers} threads pour {len(blocks)} bloc(s) de {block_size} contrat(s) max.")
+        executor = ThreadPoolExecutor(max_workers=workers)
+        # Résultats restitués dans l'ordre des blocs : les rapports sont identiques au mode séquentiel.
+        # Fenêtre de 2 blocs par thread : la mémoire reste bornée quelle que soit la taille de la campagne.
+        results = map_bounded(executor, run_block, blocks, workers * 2)
 
+    # Seul le thread principal écrit le rapport et le journal, dans l'ordre des blocs
+    try:
+        for block_results in results:
+            to_record = []
+            for job, contract_rows, contract_stats, from_journal in block_results:
+                report.write_rows(contract_rows)
+                report.add_stats(contract_stats)
+                if job['Skip_Status'] is None and not from_journal:
+                    to_record.append((job['Ref_Contract'], job['New_Contract'], contract_rows, contract_stats))
+            # Débit et ETA (métriques réécrites périodiquement, voir METRICS_CONFIG)
+            metrics.advance(len(block_results))
+            # Le rapport est vidé avant le commit du journal : un contrat journalisé est toujours sur disque
+            report.flush()
+            journal.record(to_record)
+            if cache is not None:
+                cache.commit()
+    finally:
+        if workers > 1:
+            # Arrêt sur erreur : les blocs de la fenêtre pas encore commencés sont abandonnés
+            executor.shutdown(cancel_futures=True)
+        if compare_pool is not None:
+            compare_pool.close()
+        journal.close()
+        if cache is not None:
+            logger.info(f"Cache de résultats : {cache.hits} comparaison(s) réutilisée(s), {cache.misses} recalculée(s).")
+            cache.close()
+
+    # Attente et occupation des connexions : aide au dimensionnement de DB_POOL_CONFIG pour --workers
+    logger.info(f"Pool de connexions : {db.get_pool_stats()}")
+    if db.query_cache is not None:
+        logger.info(f"Cache des requêtes : {db.get_cache_stats()}")
+
+    # ÉTAPE 5 : Clôture du rapport détaillé et synthèse par produit
+    report.close()
+    metrics.finish()
+
+    if report.rows_written or report.contracts_counted:
         # Résultat 1 : Rapport technique détaillé (utile pour l'investigation des bugs par les développeurs)
-        if report_data:
-            df_report = pd.DataFrame(report_data)
-            output_filename = f'rapport_detaille_{timestamp}.csv'
-            output_path = os.path.join(OUTPUT_DIR, output_filename)
-            # Encodage utf-8-sig pour une ouverture native sans problème d'accents dans MS Excel
-            df_report.to_csv(output_path, index=False, sep=';', encoding='utf-8-sig')
-            logger.info(f"Rapport technique détaillé généré avec succès : {output_path}")
+        if report.rows_written:
+            logger.info(f"Rapport technique détaillé généré avec succès : {report.report_path}")
 
         # Résultat 2 : Rapport de synthèse croisé (utile pour le suivi de la Qualité et la validation des versions)
-        if stats_list:
-            df_stats = pd.DataFrame(stats_list)
-            # Agrégation des statuts OK/KO par produit
-            summary = df_stats.groupby(['Product', 'Status']).size().unstack(fill_value=0)
-
-            # Normalisation des colonnes pour éviter les KeyError si un statut manque
-            for col in ['OK', 'KO']:
-                if col not in summary.columns:
-                    summary[col] = 0
-
-            # Calcul des indicateurs de performance (Total et Taux de succès)
-            summary['Total'] = summary.sum(axis=1)
-            if 'Total' in summary.columns and (summary['Total'] > 0).any():
-                summary['Success_Rate (%)'] = (summary['OK'] / summary['Total'] * 100).round(1)
-            else:
-                summary['Success_Rate (%)'] = 0.0
-
+        summary = report.summary()
+        if summary is not None:
             # Affichage console pour retour immédiat à l'opérateur
             print("\n" + "="*60)
             print(" SYNTHÈSE DES RÉSULTATS PAR PRODUIT (KPIs)")
@@ -265,4 +666,23 @@ def main():
         logger.warning("Aucune donnée n'a été traitée (fichier source vide ou ne contenant que des lignes ignorées).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Comparateur Auto-Activator (Snapshot J0 vs Live LISA)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Nombre de blocs de contrats traités en parallèle (défaut : 1, séquentiel).")
+    parser.add_argument('--bulk-compare', action='store_true',
+                        help="Compare chaque table pour tout un bloc de contrats en une passe vectorisée.")
+    parser.add_argument('--pushdown', action='store_true',
+                        help="Compare d'abord les sommes de contrôle côté serveur, n'extrait que les tables en écart.")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--use-cache', action='store_true',
+                             help="Réutilise les résultats des exécutions précédentes pour les couples source/cible inchangés.")
+    cache_group.add_argument('--no-cache', action='store_true',
+                             help="Ignore le cache des résultats même s'il est activé dans RESULT_CACHE_CONFIG.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprend une campagne interrompue à partir du journal des contrats déjà comparés.")
+    parser.add_argument('--compare-processes', type=int, default=None, metavar='N',
+                        help="Compare les tables volumineuses (LV.BSPDT0, LV.PRCTT0) dans N processus (0 = désactivé).")
+    args = parser.parse_args()
+    main(workers=args.workers, bulk_compare=args.bulk_compare, resume=args.resume,
+         use_cache=True if args.use_cache else (False if args.no_cache else None), pushdown=True if args.pushdown else None,
+         compare_processes=args.compare_processes)
\ No newline at end of file
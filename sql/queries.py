@@ -1,3 +1,10 @@
+from functools import lru_cache
+
+from sqlalchemy import text, bindparam
+
+# Paramètres de type liste (NO_CNT IN :internal_ids) : liés valeur par valeur ("expanding")
+EXPANDING_PARAMS = ('internal_ids', 'contract_numbers')
+
 QUERIES = {
     # RÉCUPÉRATION ID
 
@@ -5,20 +12,48 @@ QUERIES = {
     "GET_INTERNAL_ID": """
                        SELECT TOP 1 NO_CNT
                        FROM LV.SCNTT0 WITH (NOLOCK)
-                       WHERE NO_CNT_EXTENDED = '{contract_number}'
+                       WHERE NO_CNT_EXTENDED = :contract_number
                        """,
 
+    # Résolution en masse (Externe -> Interne + Produit) pour tout un fichier de mapping.
+    # :contract_numbers est un paramètre "expanding" : la liste est liée valeur par valeur, sans concaténation SQL.
+    "GET_INTERNAL_IDS_BULK": """
+                             SELECT NO_CNT_EXTENDED, NO_CNT, C_PROP_PRINC
+                             FROM LV.SCNTT0 WITH (NOLOCK)
+                             WHERE NO_CNT_EXTENDED IN :contract_numbers
+                             """,
+
+
+    # MÉTADONNÉES
+
+    # Colonnes et types d'une table (mis en cache par DatabaseManager.get_table_columns).
+    "GET_TABLE_COLUMNS": """
+                         SELECT COLUMN_NAME, DATA_TYPE
+                         FROM INFORMATION_SCHEMA.COLUMNS
+                         WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table
+                         ORDER BY ORDINAL_POSITION
+                         """,
+
+
+    # Montant du premier paiement d'un contrat source (répliqué sur le contrat dupliqué).
+    "GET_FIRST_PREMIUM": """
+                         SELECT TOP 1 M_PAY
+                         FROM LV.PRCTT0
+                         WHERE NO_CNT = :internal_id
+                         ORDER BY D_REF_PRM ASC
+                         """,
+
 
     # DONNÉES CONTRAT & AVENANTS
 
     "LV.SCNTT0": """
                  SELECT * FROM LV.SCNTT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  """,
 
     "LV.SAVTT0": """
                  SELECT * FROM LV.SAVTT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY NO_AVT ASC
                  """,
 
@@ -29,7 +64,7 @@ QUERIES = {
     # On trie par date de référence et timestamp pour comparer l'historique comptable.
     "LV.PRCTT0": """
                  SELECT * FROM LV.PRCTT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY D_REF_PRM ASC, TSTAMP_CRT_RCT ASC
                  """,
 
@@ -37,7 +72,7 @@ QUERIES = {
 
     "LV.SWBGT0": """
                  SELECT * FROM LV.SWBGT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY NO_AVT ASC, C_PROP ASC
                  """,
 
@@ -46,13 +81,13 @@ QUERIES = {
 
     "LV.SCLST0": """
                  SELECT * FROM LV.SCLST0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY NO_AVT ASC, NO_ORD_CLS ASC
                  """,
 
     "LV.SCLRT0": """
                  SELECT * FROM LV.SCLRT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY NO_AVT ASC, NO_ORD_CLS ASC, NO_ORD_RNG ASC
                  """,
 
@@ -63,13 +98,87 @@ QUERIES = {
     # Cela stabilise la comparaison si les séquences techniques changent mais pas la chronologie métier.
     "LV.BSPDT0": """
                  SELECT * FROM LV.BSPDT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY D_REF_MVT_EPA ASC, NO_ORD_TRF_EPA ASC, NO_ORD_MVT_EPA ASC
                  """,
 
     "LV.BSPGT0": """
                  SELECT * FROM LV.BSPGT0 WITH (NOLOCK)
-                 WHERE NO_CNT = {internal_id}
+                 WHERE NO_CNT = :internal_id
                  ORDER BY D_REF_MVT_EPA ASC, NO_ORD_TRF_EPA ASC
                  """
-}
\ No newline at end of file
+}
+
+# VARIANTES ENSEMBLISTES (EXTRACTION PAR LOT)
+
+# Mêmes requêtes que ci-dessus, mais pour un bloc de contrats en une seule instruction.
+# Le tri est préfixé par NO_CNT : les lignes d'un contrat sont contiguës (lecture en flux, un contrat
+# est complet dès que le suivant commence) et restent triées selon le ORDER BY du modèle unitaire.
+def _batch_variant(query):
+    query = query.replace("NO_CNT = :internal_id", "NO_CNT IN :internal_ids")
+    if "ORDER BY " in query:
+        return query.replace("ORDER BY ", "ORDER BY NO_CNT ASC, ", 1)
+    return query.rstrip() + "\n                 ORDER BY NO_CNT ASC\n                 "
+
+
+BATCH_QUERIES = {
+    name: _batch_variant(query)
+    for name, query in QUERIES.items()
+    if name.startswith("LV.")
+}
+
+
+def project_query(query, columns):
+    """
+    Remplace le SELECT * d'un modèle par une liste explicite de colonnes (projection).
+    Le reste de la requête (filtre, ORDER BY) est inchangé : le tri peut porter sur une colonne non projetée.
+    """
+    return query.replace("SELECT *", "SELECT " + ", ".join(columns), 1)
+
+
+# REGISTRE DES REQUÊTES PRÉPARÉES
+
+@lru_cache(maxsize=256)
+def prepared(query):
+    """
+    Instruction SQLAlchemy paramétrée (text + bindparam) d'un texte SQL, construite une seule fois.
+
+    Le même objet est réutilisé à chaque exécution : SQLAlchemy ne recompile pas l'instruction et
+    SQL Server reçoit toujours le même texte paramétré (un seul plan d'exécution en cache, au lieu
+    d'un texte ad hoc par contrat). Les valeurs ne sont jamais concaténées au SQL (pas d'injection).
+    """
+    statement = text(query)
+    expanding = [bindparam(name, expanding=True) for name in EXPANDING_PARAMS if f":{name}" in query]
+    return statement.bindparams(*expanding) if expanding else statement
+
+
+def get_statement(name, batch=False):
+    """Instruction préparée d'une requête du registre (QUERIES, ou BATCH_QUERIES si `batch`)."""
+    return prepared((BATCH_QUERIES if batch else QUERIES)[name])
+
+
+def padded_list(values, max_size):
+    """
+    Complète une liste IN en répétant sa dernière valeur jusqu'à la puissance de deux supérieure
+    (bornée par `max_size`). Un paramètre "expanding" produit un texte SQL par longueur de liste :
+    on limite ainsi le nombre de variantes (et de plans) à quelques tailles fixes, les doublons
+    étant sans effet dans une clause IN.
+    """
+    # Scalaires numpy (ex: NO_CNT lus par pandas) convertis en types Python, seuls acceptés par pyodbc
+    values = [value.item() if hasattr(value, 'item') else value for value in values]
+    if not values:
+        return values
+    size = 1
+    while size < len(values):
+        size *= 2
+    size = max(len(values), min(size, max_size))
+    return values + [values[-1]] * (size - len(values))
+
+
+# Texte SQL -> nom dans le registre (les variantes ensemblistes portent le nom de leur table)
+_QUERY_NAMES = {" ".join(query.split()): name for registry in (QUERIES, BATCH_QUERIES) for name, query in registry.items()}
+
+
+def query_name(query):
+    """Nom dans le registre d'un texte SQL (ex: 'GET_FIRST_PREMIUM', 'LV.PRCTT0'), ou None s'il n'en fait pas partie."""
+    return _QUERY_NAMES.get(" ".join(query.split()))
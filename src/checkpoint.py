@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+import sqlite3
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def campaign_fingerprint(mapping_file, snapshot_fingerprint, plan_version):
+    """
+    Identité d'une campagne de comparaison : contenu du fichier de mapping, snapshots J0 utilisés
+    (voir SnapshotReader.fingerprint) et version des règles de comparaison (PLAN_VERSION).
+    """
+    digest = hashlib.sha1()
+    with open(mapping_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(f"|{snapshot_fingerprint}|{plan_version}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CheckpointJournal:
+    """
+    Journal local (SQLite) des contrats déjà comparés lors d'une campagne.
+
+    Chaque paire (Ancien_Contrat, Nouveau_Contrat) terminée y est enregistrée avec ses lignes de
+    rapport détaillé et son statut global. En cas d'arrêt brutal, une reprise (--resume) relit ce
+    journal : les contrats terminés ne sont pas ré-interrogés et leurs résultats sont fusionnés
+    dans les rapports finaux.
+
+    Le journal retient l'identité de sa campagne (voir campaign_fingerprint) : une reprise avec un autre
+    fichier de mapping, d'autres snapshots ou d'autres règles de comparaison est refusée, au lieu de
+    réutiliser en silence des résultats qui ne la concernent pas.
+    """
+
+    def __init__(self, path, resume=False, fingerprint=None):
+        """
+        Args:
+            path (str): Chemin du fichier SQLite.
+            resume (bool): Conserve les résultats existants. Sinon, le journal est remis à zéro.
+            fingerprint (str): Identité de la campagne (campaign_fingerprint).
+
+        Raises:
+            RuntimeError: Reprise demandée sur le journal d'une autre campagne (ou d'identité inconnue).
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        # WAL + synchronous NORMAL : un commit par bloc reste durable sans fsync à chaque ligne
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                ref_contract TEXT NOT NULL,
+                new_contract TEXT NOT NULL,
+                product TEXT,
+                status TEXT,
+                report_rows TEXT NOT NULL,
+                completed_at TEXT NOT NULL,
+                PRIMARY KEY (ref_contract, new_contract)
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS campaign (fingerprint TEXT)")
+
+        if resume:
+            stored = self.conn.execute("SELECT fingerprint FROM campaign").fetchone()
+            has_results = self.conn.execute("SELECT 1 FROM results LIMIT 1").fetchone() is not None
+            if has_results and (stored is None or stored[0] != fingerprint):
+                self.conn.close()
+                raise RuntimeError(
+                    f"Le journal {path} a été écrit pour une autre campagne (fichier de mapping, snapshots "
+                    f"ou règles de comparaison différents). Relancez sans --resume pour repartir de zéro."
+                )
+        else:
+            self.conn.execute("DELETE FROM results")
+        self.conn.execute("DELETE FROM campaign")
+        self.conn.execute("INSERT INTO campaign VALUES (?)", (fingerprint,))
+        self.conn.commit()
+
+    def load(self):
+        """
+        Returns:
+            dict: {(ref_contract, new_contract): (lignes_rapport (list), entrée_synthèse (dict))}
+        """
+        completed = {}
+        cursor = self.conn.execute(
+            "SELECT ref_contract, new_contract, product, status, report_rows FROM results"
+        )
+        for ref_contract, new_contract, product, status, report_rows in cursor:
+            stats = {'Product': product, 'Contract': ref_contract, 'Status': status}
+            completed[(ref_contract, new_contract)] = (json.loads(report_rows), stats)
+        return completed
+
+    def record(self, results):
+        """
+        Enregistre un lot de contrats terminés (une transaction par lot).
+
+        Args:
+            results (list): Liste de tuples (ref_contract, new_contract, lignes_rapport, entrée_synthèse).
+        """
+        if not results:
+            return
+        completed_at = datetime.now().isoformat(timespec='seconds')
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (ref, new, str(stats['Product']), str(stats['Status']),
+                 json.dumps(rows, default=str, ensure_ascii=False), completed_at)
+                for ref, new, rows, stats in results
+            ]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
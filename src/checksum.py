@@ -0,0 +1,148 @@
+import hashlib
+
+from config.exclusions import IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS
+
+# Types SQL Server normalisés comme le fait compare_dataframes côté pandas
+STRING_TYPES = {'char', 'varchar', 'nchar', 'nvarchar'}
+# Types LOB : LTRIM/RTRIM ne les acceptent pas, ils sont d'abord convertis en NVARCHAR(MAX)
+LOB_TYPES = {'text', 'ntext', 'xml'}
+FLOAT_TYPES = {'float', 'real', 'decimal', 'numeric', 'money', 'smallmoney'}
+# Conversion implicite en chaîne au style 0 (minutes seulement) : passage par DATETIME2 (style 121)
+DATETIME_TYPES = {'datetime', 'smalldatetime'}
+
+# Empreinte de chaque ligne : SHA-256 des valeurs normalisées, converties en texte et séparées par CHAR(31).
+# Les NULL sont remplacés par CHAR(0) (CONCAT_WS les ignorerait : (NULL, 'a') et ('a', NULL) seraient confondus).
+# BINARY_CHECKSUM/CHECKSUM ne conviennent pas : hachage 32 bits par rotation et OU exclusif, qui ignore les
+# colonnes text/ntext/xml et ne voit pas, entre autres, l'échange de deux caractères distants de 8 positions.
+ROW_HASH = "HASHBYTES('SHA2_256', {concatenation})"
+ROW_HASH_SEPARATOR = "CHAR(31)"
+NULL_MARKER = "CHAR(0)"
+# CONCAT_WS accepte au plus 254 arguments : au-delà, les expressions sont concaténées par paquets
+CONCAT_WS_MAX_ARGS = 200
+
+# Agrégat par contrat : nombre de lignes + somme des empreintes, indépendante de l'ordre des lignes.
+# Somme (et non OU exclusif) : deux lignes identiques ne s'annulent pas, or les doublons sont courants une
+# fois les colonnes de séquence exclues (LV.BSPDT0, LV.PRCTT0). L'empreinte est découpée en 4 tranches de
+# 32 bits sommées en BIGINT : pas de dépassement, et 128 bits de somme au lieu de 32.
+ROW_HASH_SLICES = 4
+SLICE_SUM = "SUM(CAST(CAST(SUBSTRING(ROW_HASH, {start}, 4) AS INT) AS BIGINT))"
+CHECKSUM_AGGREGATE = "CONCAT_WS(':', {slice_sums})"
+# :internal_ids reçoit la liste IN des NO_CNT (paramètre "expanding"), comme les requêtes de BATCH_QUERIES.
+CHECKSUM_QUERY_TEMPLATE = """
+    SELECT NO_CNT, COUNT(*) AS NB_ROWS, {aggregate} AS CHECKSUM_VALUE
+    FROM (
+        SELECT NO_CNT, {row_hash} AS ROW_HASH
+        FROM {table_name} WITH (NOLOCK)
+        WHERE NO_CNT IN :internal_ids
+    ) AS HASHED_ROWS
+    GROUP BY NO_CNT
+"""
+
+
+def checksum_expressions(table_name, columns):
+    """
+    Expressions SQL normalisées des colonnes comparées d'une table.
+
+    Reprend les règles de compare_dataframes : colonnes exclues (IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS)
+    retirées, chaînes sans espaces de début/fin, nombres décimaux arrondis à 4 décimales. Chaque
+    expression est convertie en texte sans perte (DECIMAL(38, 4), DATETIME2) et ses NULL marqués.
+
+    Args:
+        table_name (str): Nom de la table (ex: 'LV.SCNTT0').
+        columns (list): Métadonnées [(COLUMN_NAME, DATA_TYPE), ...] dans l'ordre de la table.
+
+    Returns:
+        list: Expressions SQL, triées par nom de colonne (même ordre que le plan de comparaison).
+    """
+    excluded = set(IGNORE_COLUMNS) | set(SPECIFIC_EXCLUSIONS.get(table_name, []))
+    expressions = []
+    for name, data_type in sorted(columns):
+        if name in excluded:
+            continue
+        data_type = str(data_type).lower()
+        if data_type in STRING_TYPES:
+            expression = f"LTRIM(RTRIM({name}))"
+        elif data_type in LOB_TYPES:
+            expression = f"LTRIM(RTRIM(CAST({name} AS NVARCHAR(MAX))))"
+        elif data_type in FLOAT_TYPES:
+            # float et money convertis implicitement perdent des chiffres (6 significatifs, 2 décimales)
+            expression = f"CAST(ROUND({name}, 4) AS DECIMAL(38, 4))"
+        elif data_type in DATETIME_TYPES:
+            expression = f"CAST({name} AS DATETIME2)"
+        else:
+            expression = name
+        expressions.append(f"COALESCE(CAST({expression} AS NVARCHAR(MAX)), {NULL_MARKER})")
+    return expressions
+
+
+def _concatenation(expressions):
+    if len(expressions) == 1:
+        return expressions[0]
+    if len(expressions) > CONCAT_WS_MAX_ARGS:
+        # Aucun argument n'est NULL : la concaténation par paquets donne la même chaîne
+        expressions = [
+            _concatenation(expressions[start:start + CONCAT_WS_MAX_ARGS])
+            for start in range(0, len(expressions), CONCAT_WS_MAX_ARGS)
+        ]
+    return f"CONCAT_WS({ROW_HASH_SEPARATOR}, {', '.join(expressions)})"
+
+
+def build_checksum_query(table_name, columns):
+    """
+    Requête d'agrégat de sommes de contrôle d'une table pour un lot de contrats.
+
+    Returns:
+        tuple: (requête avec le paramètre :internal_ids, empreinte de la définition) ou (None, None)
+               si aucune colonne n'est comparée. L'empreinte identifie les colonnes et normalisations
+               utilisées : deux sommes de contrôle ne sont comparables que si leurs empreintes sont égales.
+    """
+    expressions = checksum_expressions(table_name, columns)
+    if not expressions:
+        return None, None
+
+    row_hash = ROW_HASH.format(concatenation=_concatenation(expressions))
+    aggregate = CHECKSUM_AGGREGATE.format(slice_sums=", ".join(
+        SLICE_SUM.format(start=1 + 4 * index) for index in range(ROW_HASH_SLICES)
+    ))
+    # Empreinte et agrégat font partie de la définition : une somme calculée autrement n'est pas comparable
+    definition = hashlib.sha1("|".join([table_name, row_hash, aggregate]).encode('utf-8')).hexdigest()[:16]
+    query = CHECKSUM_QUERY_TEMPLATE.format(aggregate=aggregate, row_hash=row_hash, table_name=table_name)
+    return query, definition
+
+
+# ÉQUIVALENTS SQLITE (BASE LOCALE DE TEST)
+
+def _hashbytes(algorithm, value):
+    """Équivalent de HASHBYTES sur une chaîne NVARCHAR (encodée en UTF-16LE, comme SQL Server)."""
+    if value is None:
+        return None
+    if algorithm.upper() != 'SHA2_256':
+        raise ValueError(f"Algorithme HASHBYTES non émulé : {algorithm}")
+    return hashlib.sha256(str(value).encode('utf-16-le')).digest()
+
+
+def _concat_ws(separator, *values):
+    """Équivalent de CONCAT_WS : les arguments NULL sont ignorés."""
+    return separator.join(str(value) for value in values if value is not None)
+
+
+def _binary_to_int(value):
+    """Équivalent de CAST(<varbinary(4)> AS INT) : entier 32 bits signé, gros-boutiste."""
+    if value is None:
+        return None
+    return int.from_bytes(value, 'big', signed=True)
+
+
+def register_sqlite_functions(connection):
+    """
+    Déclare HASHBYTES, CONCAT_WS et BINARY_TO_INT sur une connexion sqlite3 afin d'exécuter les requêtes de
+    build_checksum_query sur une base locale (LTRIM, RTRIM, ROUND, COALESCE, CHAR, SUBSTRING et SUM existent
+    nativement ; CAST(SUBSTRING(...) AS INT) et NVARCHAR(MAX) sont traduits par to_sqlite_sql).
+
+    Les valeurs obtenues ne sont pas celles de SQL Server (conversions en texte propres à SQLite) : seules
+    des sommes calculées par le même moteur sont comparées entre elles. Ce qui est testable localement,
+    c'est la définition (colonnes retenues, normalisation, agrégation indépendante de l'ordre).
+    """
+    connection.create_function("HASHBYTES", 2, _hashbytes, deterministic=True)
+    connection.create_function("CONCAT_WS", -1, _concat_ws, deterministic=True)
+    connection.create_function("BINARY_TO_INT", 1, _binary_to_int, deterministic=True)
@@ -1,6 +1,241 @@
+import logging
 import pandas as pd
 import numpy as np
-from config.exclusions import IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS
+from functools import lru_cache
+from config.exclusions import IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS, TABLE_KEYS
+from src.fingerprint import same_row_multiset, row_hashes
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _is_string_like(dtype):
+    """Colonne de chaînes : objets Python, StringDtype (chaînes Arrow) ou catégories (types compacts)."""
+    return dtype == object or dtype == 'category' or isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype))
+
+
+# Représentations textuelles des valeurs nulles (astype(str) d'un None ou d'un NaN)
+NULL_STRINGS = {'nan': np.nan, 'None': np.nan}
+
+
+def _normalize_strings(series):
+    """Supprime les espaces superflus et uniformise les représentations des valeurs nulles."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return _normalize_categorical(series)
+    if isinstance(series.dtype, pd.StringDtype):
+        # Déjà des chaînes : pas de conversion, les valeurs nulles restent nulles
+        stripped = series.str.strip()
+    else:
+        stripped = series.astype(str).str.strip()
+    # replace() coûte plusieurs fois le strip() : on ne l'appelle que si une représentation de NULL est présente
+    if NULL_STRINGS.keys().isdisjoint(stripped.unique()):
+        return stripped
+    return stripped.replace(NULL_STRINGS)
+
+
+def _normalize_categorical(series):
+    """
+    Normalisation d'une colonne catégorielle sans la décompresser : seules les catégories (une par valeur
+    distincte) sont normalisées, puis les codes sont renumérotés vers les catégories normalisées, triées.
+    """
+    values = _normalize_strings(pd.Series(series.cat.categories))
+    categories = pd.Index(values.dropna().unique()).sort_values()
+    mapping = categories.get_indexer(values)
+    codes = series.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, mapping[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=categories), index=series.index, name=series.name)
+
+
+def _align_dtypes(df1, df2):
+    """
+    Harmonise, colonne par colonne, les types pandas "étendus" qui diffèrent entre source et cible
+    (catégories différentes d'un contrat à l'autre, entier nullable d'un côté et float de l'autre
+    pour un ancien snapshot...). Les colonnes de types numpy classiques sont laissées telles quelles.
+    """
+    for col in df1.columns:
+        dtype1, dtype2 = df1[col].dtype, df2[col].dtype
+        if dtype1 == dtype2:
+            continue
+        if not (isinstance(dtype1, pd.api.extensions.ExtensionDtype) or isinstance(dtype2, pd.api.extensions.ExtensionDtype)):
+            continue
+
+        if isinstance(dtype1, pd.CategoricalDtype) and isinstance(dtype2, pd.CategoricalDtype):
+            categories = dtype1.categories.union(dtype2.categories).sort_values()
+            df1[col] = df1[col].cat.set_categories(categories)
+            df2[col] = df2[col].cat.set_categories(categories)
+        elif isinstance(dtype1, pd.CategoricalDtype) and _is_string_like(dtype2):
+            df1[col] = df1[col].astype(dtype2)
+        elif isinstance(dtype2, pd.CategoricalDtype) and _is_string_like(dtype1):
+            df2[col] = df2[col].astype(dtype1)
+        elif pd.api.types.is_integer_dtype(dtype1) and pd.api.types.is_integer_dtype(dtype2):
+            df1[col] = df1[col].astype('Int64')
+            df2[col] = df2[col].astype('Int64')
+        elif pd.api.types.is_numeric_dtype(dtype1) and pd.api.types.is_numeric_dtype(dtype2):
+            df1[col] = df1[col].astype('float64')
+            df2[col] = df2[col].astype('float64')
+        else:
+            df1[col] = df1[col].astype(object)
+            df2[col] = df2[col].astype(object)
+
+
+def _round_floats(series):
+    """Arrondi à 4 décimales des nombres à virgule flottante."""
+    return series.round(4)
+
+
+# Version des règles de comparaison (exclusions, normalisations, clés).
+# À incrémenter à chaque changement de logique : elle invalide les résultats mis en cache.
+PLAN_VERSION = 2
+
+
+class ComparisonPlan:
+    """
+    Plan de comparaison compilé pour une table et un couple de schémas (source, cible).
+
+    Attributes:
+        common_cols (list): Colonnes comparées (intersection triée, hors exclusions).
+        normalizers (list): Couples (colonne, fonction de normalisation) à appliquer avant comparaison.
+        sort_cols (list): Ordre de tri des lignes pour le différentiel ligne à ligne.
+        key_cols (list): Clés métier d'alignement présentes des deux côtés (vide si non applicable).
+    """
+
+    __slots__ = ('table_name', 'common_cols', 'normalizers', 'sort_cols', 'key_cols')
+
+    def __init__(self, table_name, common_cols, normalizers, sort_cols, key_cols):
+        self.table_name = table_name
+        self.common_cols = common_cols
+        self.normalizers = normalizers
+        self.sort_cols = sort_cols
+        self.key_cols = key_cols
+
+
+def schema_signature(df):
+    """
+    Signature hachable du schéma d'un DataFrame : ((colonne, type), ...).
+    Les colonnes catégorielles sont notées 'category', quelles que soient leurs catégories (propres à chaque contrat).
+    """
+    return tuple(
+        (col, 'category' if isinstance(dtype, pd.CategoricalDtype) else dtype)
+        for col, dtype in zip(df.columns, df.dtypes)
+    )
+
+
+@lru_cache(maxsize=512)
+def get_comparison_plan(table_name, ref_signature, new_signature, extra_exclusions=()):
+    """
+    Construit (ou retrouve en cache) le plan de comparaison d'une table pour deux schémas donnés.
+
+    Le cache est borné (LRU) et indexé par les signatures de schéma : si une colonne apparaît,
+    disparaît ou change de type (dérive de schéma), un nouveau plan est compilé automatiquement.
+
+    Args:
+        table_name (str): Le nom de la table (règles d'exclusion et clés métier).
+        ref_signature, new_signature (tuple): Signatures de schéma (voir schema_signature).
+        extra_exclusions (tuple): Colonnes supplémentaires à ignorer (ex: colonne d'identification en mode bulk).
+    """
+    # ÉTAPE 3 : Application des règles d'exclusion
+    # Certaines colonnes sont purement techniques (clés primaires, timestamps de mise à jour, auteurs)
+    # et seront TOUJOURS différentes d'un contrat à l'autre. On doit les exclure avant la comparaison.
+    cols_to_drop = set(IGNORE_COLUMNS) | set(SPECIFIC_EXCLUSIONS.get(table_name, [])) | set(extra_exclusions)
+
+    # ÉTAPE 4 : Alignement des schémas de données
+    # On détermine l'intersection exacte des colonnes entre les deux DataFrames.
+    # Cela permet d'éviter les erreurs si une nouvelle colonne a été ajoutée dans l'environnement cible
+    # entre le moment de la création du snapshot (source) et le moment de la comparaison.
+    ref_dtypes = dict(ref_signature)
+    new_columns = {col for col, _ in new_signature}
+    common_cols = sorted(col for col in ref_dtypes if col in new_columns and col not in cols_to_drop)
+
+    # ÉTAPE 5 : Choix des normalisations
+    # Les systèmes peuvent renvoyer des données équivalentes sous des formats légèrement différents.
+    normalizers = []
+    for col in common_cols:
+        dtype = ref_dtypes[col]
+        # Chaînes de caractères (y compris catégories) : suppression des espaces superflus et uniformisation des valeurs nulles.
+        if _is_string_like(dtype):
+            normalizers.append((col, _normalize_strings))
+        # Nombres à virgule flottante : arrondi à 4 décimales pour éviter les faux positifs liés à
+        # l'imprécision des bases de données (ex: 12.00000001 n'est pas vu comme égal à 12.00000000 sans arrondi).
+        elif pd.api.types.is_float_dtype(dtype):
+            normalizers.append((col, _round_floats))
+
+    keys = TABLE_KEYS.get(table_name, [])
+    key_cols = list(keys) if keys and all(k in ref_dtypes and k in new_columns for k in keys) else []
+
+    return ComparisonPlan(table_name, common_cols, normalizers, list(common_cols), key_cols)
+
+
+def _compare_by_keys(df1, df2, keys1, keys2):
+    """
+    Différentiel par appariement sur clés métier (jointure par hachage, temps linéaire).
+
+    Args:
+        df1, df2 (pd.DataFrame): Données source / cible normalisées (mêmes colonnes), dans l'ordre d'origine.
+        keys1, keys2 (pd.DataFrame): Colonnes clés correspondantes (mêmes lignes, même ordre).
+
+    Returns:
+        pd.DataFrame ou None: Les écarts, indexés par (Ecart, clés..., Occurrence, Côté) avec
+        Ecart = 'MODIFIE' (seules les cellules différentes sont renseignées), 'SOURCE_SEULE' ou 'CIBLE_SEULE'.
+        None si l'appariement ne révèle aucun écart de valeur.
+    """
+    value_cols = list(df1.columns)
+    key_cols = [f"[{k}]" for k in keys1.columns]
+
+    def prepare(df, keys):
+        keyed = df.reset_index(drop=True)
+        for key_col, key in zip(key_cols, keys.columns):
+            values = keys[key].reset_index(drop=True)
+            if _is_string_like(values.dtype):
+                values = _normalize_strings(values)
+                # Catégories propres à chaque côté : la jointure se fait sur les valeurs
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype(values.cat.categories.dtype)
+            keyed[key_col] = values
+        # Les doublons de clé sont numérotés par ordre d'apparition après tri : appariement 1 pour 1
+        keyed = keyed.sort_values(by=key_cols + value_cols, na_position='last', kind='stable')
+        keyed['Occurrence'] = keyed.groupby(key_cols, dropna=False, sort=False).cumcount()
+        return keyed
+
+    merged = prepare(df1, keys1).merge(
+        prepare(df2, keys2), on=key_cols + ['Occurrence'], how='outer',
+        suffixes=('|Source', '|Cible'), indicator=True, sort=True
+    )
+    index_cols = key_cols + ['Occurrence']
+
+    src = merged[[f"{c}|Source" for c in value_cols]].set_axis(value_cols, axis=1)
+    cib = merged[[f"{c}|Cible" for c in value_cols]].set_axis(value_cols, axis=1)
+
+    both = (merged['_merge'] == 'both').to_numpy()
+    # Types nullables (Int32...) : une comparaison avec NULL donne <NA>, traité comme "différent" sauf NULL des deux côtés
+    cell_diff = ~(src.eq(cib).fillna(False).astype(bool) | (src.isna() & cib.isna()))
+    modified = both & cell_diff.any(axis=1).to_numpy()
+    source_only = (merged['_merge'] == 'left_only').to_numpy()
+    target_only = (merged['_merge'] == 'right_only').to_numpy()
+
+    if not (modified.any() or source_only.any() or target_only.any()):
+        return None
+
+    parts = []
+    for label, mask, side_frames in (
+        ('MODIFIE', modified, (('Source', src.where(cell_diff)), ('Cible', cib.where(cell_diff)))),
+        ('SOURCE_SEULE', source_only, (('Source', src),)),
+        ('CIBLE_SEULE', target_only, (('Cible', cib),)),
+    ):
+        if not mask.any():
+            continue
+        for side, frame in side_frames:
+            part = pd.concat([merged.loc[mask, index_cols], frame[mask]], axis=1)
+            part.insert(0, 'Ecart', label)
+            part['Côté'] = side
+            parts.append(part)
+
+    diff = pd.concat(parts, ignore_index=True)
+    diff = diff.sort_values(by=['Ecart'] + index_cols + ['Côté'], ascending=[True] * (len(index_cols) + 1) + [False], kind='stable')
+    diff = diff.set_index(['Ecart'] + index_cols + ['Côté'])
+
+    # Comme compare(), on ne garde que les colonnes présentant au moins un écart
+    return diff.loc[:, diff.notna().any(axis=0)]
+
 
 def compare_dataframes(df_ref, df_new, table_name):
     """
@@ -19,6 +254,13 @@ def compare_dataframes(df_ref, df_new, table_name):
     Returns:
         tuple: (Statut de la comparaison (str), Détails des différences (pd.DataFrame ou str))
     """
+    with metrics.timer('compare', table_name) as measure:
+        measure['rows'] = len(df_ref) + len(df_new)
+        return _compare_dataframes(df_ref, df_new, table_name)
+
+
+def _compare_dataframes(df_ref, df_new, table_name):
+    """Implémentation de compare_dataframes (hors instrumentation)."""
 
     # ÉTAPE 1 : Contrôles de validité initiaux
     # On vérifie d'abord si les jeux de données sont vides pour éviter des traitements inutiles et des plantages.
@@ -28,70 +270,64 @@ def compare_dataframes(df_ref, df_new, table_name):
     if df_ref.empty or df_new.empty:
         return "KO_MISSING_DATA", f"L'un des deux DataFrames est vide pour la table {table_name}."
 
-    # ÉTAPE 2 : Isolation des données
-    # On travaille systématiquement sur des copies pour éviter que nos transformations
-    # (arrondis, suppressions de colonnes) n'altèrent les DataFrames originaux passés en paramètre.
-    df1 = df_ref.copy()
-    df2 = df_new.copy()
-
-    # ÉTAPE 3 : Application des règles d'exclusion
-    # Certaines colonnes sont purement techniques (clés primaires, timestamps de mise à jour, auteurs)
-    # et seront TOUJOURS différentes d'un contrat à l'autre. On doit les exclure avant la comparaison.
-    cols_to_drop = list(IGNORE_COLUMNS)
-
-    if table_name in SPECIFIC_EXCLUSIONS:
-        cols_to_drop.extend(SPECIFIC_EXCLUSIONS[table_name])
+    # ÉTAPES 2 à 4 : Plan de comparaison (exclusions, colonnes communes, normalisations, clés)
+    # Le plan ne dépend que de la table et des schémas des deux DataFrames : il est construit une seule fois
+    # puis réutilisé pour tous les contrats (voir get_comparison_plan).
+    plan = get_comparison_plan(table_name, schema_signature(df_ref), schema_signature(df_new))
 
-    # On s'assure de ne tenter de supprimer que les colonnes qui existent réellement dans le dataset
-    existing_cols_to_drop = [col for col in cols_to_drop if col in df1.columns]
-
-    df1 = df1.drop(columns=existing_cols_to_drop, errors='ignore')
-    df2 = df2.drop(columns=existing_cols_to_drop, errors='ignore')
-
-    # ÉTAPE 4 : Alignement des schémas de données
-    # On détermine l'intersection exacte des colonnes entre les deux DataFrames.
-    # Cela permet d'éviter les erreurs si une nouvelle colonne a été ajoutée dans l'environnement cible
-    # entre le moment de la création du snapshot (source) et le moment de la comparaison.
-    common_cols = sorted(list(df1.columns.intersection(df2.columns)))
-
-    if not common_cols:
+    if not plan.common_cols:
         return "KO_NO_COMMON_COLS", "Aucune colonne commune trouvée après l'application des filtres d'exclusion."
 
-    df1 = df1[common_cols]
-    df2 = df2[common_cols]
+    # On ne copie que les colonnes projetées : les DataFrames originaux passés en paramètre restent intacts.
+    df1 = df_ref[plan.common_cols].copy()
+    df2 = df_new[plan.common_cols].copy()
 
-    # ÉTAPE 5 : Normalisation et formatage des données
-    # Les systèmes peuvent renvoyer des données équivalentes sous des formats légèrement différents.
-    # Il faut nettoyer ces données pour éviter de lever des erreurs sur des détails non métiers.
-    for col in common_cols:
+    # ÉTAPE 5 : Normalisation et formatage des données (fonctions pré-sélectionnées par le plan)
+    for col, normalize in plan.normalizers:
+        df1[col] = normalize(df1[col])
+        df2[col] = normalize(df2[col])
+    _align_dtypes(df1, df2)
 
-        # Traitement des chaînes de caractères (Varchar/String)
-        # On supprime les espaces superflus (strip) et on uniformise les représentations des valeurs nulles.
-        if df1[col].dtype == object:
-            df1[col] = df1[col].astype(str).str.strip().replace({'nan': np.nan, 'None': np.nan})
-            df2[col] = df2[col].astype(str).str.strip().replace({'nan': np.nan, 'None': np.nan})
+    # ÉTAPE 5 bis : Chemin rapide par empreintes de lignes
+    # Dans la très grande majorité des cas les données sont identiques : on compare les deux tables comme
+    # des multi-ensembles d'empreintes de lignes (hash vectorisé), sans trier les DataFrames ni construire
+    # de différentiel. En cas de non-correspondance, on poursuit avec la comparaison détaillée ci-dessous.
+    try:
+        if same_row_multiset(df1, df2):
+            return "OK", None
+    except TypeError:
+        # Valeurs non hachables (objets exotiques) : on laisse la comparaison détaillée trancher
+        pass
 
-        # Traitement des valeurs numériques (Float)
-        # On arrondit à 4 décimales pour éviter les faux positifs liés à l'imprécision des bases de données
-        # sur les nombres à virgule flottante (ex: 12.00000001 n'est pas vu comme égal à 12.00000000 sans arrondi).
-        elif pd.api.types.is_float_dtype(df1[col]):
-            df1[col] = df1[col].round(4)
-            df2[col] = df2[col].round(4)
+    # On conserve l'ordre d'origine des lignes pour un éventuel alignement par clés métier (ÉTAPE 7 bis)
+    df1_unsorted, df2_unsorted = df1, df2
 
     # ÉTAPE 6 : Alignement des enregistrements (Tri)
     # Pour que la comparaison croisée fonctionne, l'ordre des lignes doit être parfaitement identique.
     # On trie l'intégralité du dataset en se basant sur toutes les colonnes restantes.
     try:
-        df1 = df1.sort_values(by=common_cols).reset_index(drop=True)
-        df2 = df2.sort_values(by=common_cols).reset_index(drop=True)
+        df1 = df1.sort_values(by=plan.sort_cols).reset_index(drop=True)
+        df2 = df2.sort_values(by=plan.sort_cols).reset_index(drop=True)
     except Exception as e:
-        print(f"Attention: Le tri technique a échoué sur la table {table_name}. Raison : {e}")
+        logger.warning(f"Attention: Le tri technique a échoué sur la table {table_name}. Raison : {e}")
 
     # ÉTAPE 7 : Comparaison finale et génération du rapport d'écarts
     # La méthode equals() vérifie si les valeurs sont strictement identiques après le nettoyage.
     if df1.equals(df2):
         return "OK", None
 
+    # ÉTAPE 7 bis : Différentiel aligné sur les clés métier de la table (si configurées)
+    # Le tri complet décale toutes les lignes suivantes dès qu'une ligne est ajoutée ou perdue, et compare()
+    # échoue si les volumes diffèrent. L'appariement par clé isole précisément les lignes modifiées,
+    # les lignes présentes uniquement dans la source et celles présentes uniquement dans la cible.
+    if plan.key_cols:
+        try:
+            diff = _compare_by_keys(df1_unsorted, df2_unsorted, df_ref[plan.key_cols], df_new[plan.key_cols])
+            if diff is not None:
+                return ("KO" if len(df1) == len(df2) else "KO_ROW_COUNT"), diff
+        except Exception as e:
+            logger.warning(f"Attention: L'alignement par clés a échoué sur la table {table_name}. Raison : {e}")
+
     # S'il y a des différences, on tente de générer un rapport détaillé des écarts.
     try:
         # La fonction compare() de pandas extrait uniquement les cellules présentant des différences.
@@ -110,4 +346,102 @@ def compare_dataframes(df_ref, df_new, table_name):
 
     except Exception as e:
         # Catch global pour s'assurer que le script global ne crashe pas si une table a des données corrompues.
-        return "KO_ERROR", f"Erreur technique lors de la génération du différentiel : {str(e)}"
\ No newline at end of file
+        return "KO_ERROR", f"Erreur technique lors de la génération du différentiel : {str(e)}"
+
+def compare_tables_bulk(table_name, df_ref_all, df_new_all, key='contract', contracts=None):
+    """
+    Comparaison vectorisée d'une table pour de nombreux contrats à la fois.
+
+    Les données de tous les contrats sont concaténées (une colonne `key` identifie le contrat, ou la paire
+    source/cible). Exclusions, normalisation et empreintes de lignes sont calculées en une seule passe sur
+    l'ensemble, puis chaque contrat est comparé comme un multi-ensemble d'empreintes. Seuls les contrats en
+    écart repassent par compare_dataframes, qui produit le différentiel détaillé.
+
+    Les statuts sont ceux de compare_dataframes ("OK", "OK_EMPTY", "KO", "KO_MISSING_DATA", ...).
+    Seule nuance : la concaténation harmonise les types entre contrats (ex: entier -> float), un écart
+    portant uniquement sur le type d'une colonne n'est donc pas détecté en mode bulk.
+
+    Args:
+        table_name (str): Le nom de la table analysée (règles d'exclusion).
+        df_ref_all (pd.DataFrame): Données source de tous les contrats, avec la colonne `key`.
+        df_new_all (pd.DataFrame): Données cible de tous les contrats, avec la colonne `key`.
+        key (str): Nom de la colonne identifiant le contrat.
+        contracts (iterable): Contrats attendus (par défaut : ceux présents dans l'une des deux tables).
+
+    Returns:
+        dict: {contrat: (Statut (str), Détails (pd.DataFrame, str ou None))}
+    """
+    ref_keys = df_ref_all[key] if key in df_ref_all.columns else pd.Series(dtype=object)
+    new_keys = df_new_all[key] if key in df_new_all.columns else pd.Series(dtype=object)
+
+    if contracts is None:
+        contracts = pd.concat([ref_keys, new_keys]).unique()
+    ref_counts = ref_keys.value_counts()
+    new_counts = new_keys.value_counts()
+
+    results = {}
+    to_compare = []
+
+    # ÉTAPE 1 : Contrôles de validité (mêmes règles que compare_dataframes)
+    for contract in contracts:
+        has_ref = ref_counts.get(contract, 0) > 0
+        has_new = new_counts.get(contract, 0) > 0
+        if not has_ref and not has_new:
+            results[contract] = ("OK_EMPTY", None)
+        elif not has_ref or not has_new:
+            results[contract] = ("KO_MISSING_DATA", f"L'un des deux DataFrames est vide pour la table {table_name}.")
+        else:
+            to_compare.append(contract)
+
+    if not to_compare:
+        return results
+
+    # ÉTAPES 2 à 5 : Plan de comparaison (le même que compare_dataframes) et normalisation vectorisée
+    plan = get_comparison_plan(table_name, schema_signature(df_ref_all), schema_signature(df_new_all), (key,))
+
+    if not plan.common_cols:
+        for contract in to_compare:
+            results[contract] = ("KO_NO_COMMON_COLS", "Aucune colonne commune trouvée après l'application des filtres d'exclusion.")
+        return results
+
+    ref_mask = ref_keys.isin(to_compare)
+    new_mask = new_keys.isin(to_compare)
+    df1 = df_ref_all.loc[ref_mask, plan.common_cols].copy()
+    df2 = df_new_all.loc[new_mask, plan.common_cols].copy()
+
+    for col, normalize in plan.normalizers:
+        df1[col] = normalize(df1[col])
+        df2[col] = normalize(df2[col])
+    _align_dtypes(df1, df2)
+
+    # ÉTAPE 5 bis : Multi-ensembles d'empreintes par contrat
+    # Un contrat est OK si chaque empreinte de ligne apparaît le même nombre de fois des deux côtés.
+    mismatched = set(to_compare)
+    if df1.dtypes.equals(df2.dtypes):
+        try:
+            ref_hashes = pd.DataFrame({'key': ref_keys[ref_mask].to_numpy(), 'hash': row_hashes(df1)})
+            new_hashes = pd.DataFrame({'key': new_keys[new_mask].to_numpy(), 'hash': row_hashes(df2)})
+            counts = pd.concat([
+                ref_hashes.groupby(['key', 'hash']).size().rename('ref'),
+                new_hashes.groupby(['key', 'hash']).size().rename('new')
+            ], axis=1).fillna(0)
+            differing = counts['ref'] != counts['new']
+            mismatched = set(counts.index.get_level_values('key')[differing.to_numpy()])
+        except TypeError:
+            # Valeurs non hachables : tous les contrats passent par la comparaison détaillée
+            pass
+
+    # ÉTAPE 6 : Différentiel détaillé pour les seuls contrats en écart
+    if mismatched:
+        ref_positions = ref_keys.groupby(ref_keys, sort=False).indices
+        new_positions = new_keys.groupby(new_keys, sort=False).indices
+
+    for contract in to_compare:
+        if contract not in mismatched:
+            results[contract] = ("OK", None)
+            continue
+        ref_slice = df_ref_all.iloc[ref_positions[contract]].drop(columns=[key]).reset_index(drop=True)
+        new_slice = df_new_all.iloc[new_positions[contract]].drop(columns=[key]).reset_index(drop=True)
+        results[contract] = compare_dataframes(ref_slice, new_slice, table_name)
+
+    return results
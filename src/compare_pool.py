@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from config.settings import COMPARE_PROCESS_CONFIG
+from src.comparator import compare_dataframes
+from src.metrics import metrics
+from src.snapshot_store import frame_to_record_batch, record_batch_to_frame
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow absent : pas de comparaison multi-processus
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+
+def _ipc_stream(df):
+    """Flux Arrow IPC (un record batch) d'un DataFrame, types compacts compris (voir snapshot_store)."""
+    batch = frame_to_record_batch(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue()
+
+
+def _compare_in_worker(table_name, segment_name, sizes):
+    """
+    Exécuté dans un processus de comparaison : lit les DataFrames source et cible directement dans le
+    segment de mémoire partagée (flux Arrow IPC successifs, sans copie préalable) et les compare.
+
+    Returns:
+        tuple: (Statut, Détails, durée de la comparaison en secondes)
+    """
+    segment = SharedMemory(name=segment_name)
+    view = segment.buf[:sum(sizes)]
+    try:
+        data = pa.py_buffer(view)
+        frames, offset = [], 0
+        for size in sizes:
+            frames.append(record_batch_to_frame(pa.ipc.open_stream(data.slice(offset, size)).read_next_batch()))
+            offset += size
+
+        start = time.perf_counter()
+        status, details = compare_dataframes(frames[0], frames[1], table_name)
+        seconds = time.perf_counter() - start
+        # Plus aucune référence aux tampons Arrow du segment : la vue peut être libérée, puis le segment fermé
+        del frames, data
+    finally:
+        view.release()
+        segment.close()
+    return status, details, seconds
+
+
+class ProcessCompareBackend:
+    """
+    Comparaison des tables volumineuses (LV.BSPDT0, LV.PRCTT0...) dans un pool de processus.
+
+    La normalisation, le tri et le différentiel de compare_dataframes sont du calcul pandas limité par le GIL :
+    des threads n'occupent qu'un cœur. Les couples (source, cible) des tables de COMPARE_PROCESS_CONFIG
+    dépassant MIN_ROWS lignes sont confiés à des processus, pendant que les threads de run_comparison
+    continuent d'extraire les blocs suivants.
+
+    Les DataFrames comparés ne sont pas sérialisés avec pickle (un objet Python par cellule) : ils sont écrits
+    en flux Arrow IPC dans un segment de mémoire partagée, que le processus lit sur place. Seuls le nom du
+    segment et le résultat transitent par pickle ; le différentiel d'un contrat en écart, de quelques lignes,
+    est donc bien renvoyé sous forme d'objets pickle. Le segment est libéré dès la fin de la tâche.
+
+    Utilisation :
+        backend = ProcessCompareBackend(workers=8)
+        if backend.accepts(table, df_ref, df_new):
+            future = backend.submit(table, df_ref, df_new)
+            status, details, seconds = future.result()
+        backend.close()
+    """
+
+    def __init__(self, workers=None, config=None):
+        if pa is None:
+            raise RuntimeError("pyarrow est requis pour la comparaison multi-processus.")
+
+        self.config = config or COMPARE_PROCESS_CONFIG
+        self.tables = set(self.config.get('TABLES', ()))
+        self.min_rows = self.config.get('MIN_ROWS', 0)
+        self.workers = workers or self.config.get('WORKERS') or os.cpu_count() or 1
+        # 'spawn' : le processus principal est multi-thread (pool SQLAlchemy, threads d'extraction),
+        # un fork pourrait hériter d'un verrou pris ; c'est aussi le seul mode disponible sous Windows
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.shipped_bytes = 0
+
+    def accepts(self, table_name, df_ref, df_new):
+        """Le couple vaut-il un transfert vers un processus (table concernée, volume suffisant) ?"""
+        return table_name in self.tables and len(df_ref) + len(df_new) >= self.min_rows
+
+    def submit(self, table_name, df_ref, df_new):
+        """
+        Confie une comparaison à un processus.
+
+        Returns:
+            Future: Résultat (Statut, Détails, durée de la comparaison en secondes).
+        """
+        with metrics.timer('compare_ship', table_name) as measure:
+            streams = [_ipc_stream(df_ref), _ipc_stream(df_new)]
+            sizes = [stream.size for stream in streams]
+            segment = SharedMemory(create=True, size=max(1, sum(sizes)))
+            try:
+                offset = 0
+                for stream, size in zip(streams, sizes):
+                    # Tampons Arrow exposés en octets signés ('b'), le segment en octets non signés ('B')
+                    segment.buf[offset:offset + size] = memoryview(stream).cast('B')
+                    offset += size
+            except Exception:
+                self._release(segment)
+                raise
+            measure['rows'], measure['bytes'] = len(df_ref) + len(df_new), sum(sizes)
+
+        try:
+            future = self._executor.submit(_compare_in_worker, table_name, segment.name, sizes)
+        except Exception:
+            self._release(segment)
+            raise
+
+        with self._lock:
+            self.submitted += 1
+            self.shipped_bytes += sum(sizes)
+        rows = len(df_ref) + len(df_new)
+        future.add_done_callback(lambda f: self._on_done(f, segment, table_name, rows))
+        return future
+
+    def _on_done(self, future, segment, table_name, rows):
+        self._release(segment)
+        if future.exception() is None:
+            metrics.observe('compare_process', future.result()[2], table_name, rows)
+
+    @staticmethod
+    def _release(segment):
+        segment.close()
+        segment.unlink()
+
+    def close(self):
+        """Attend les comparaisons en cours puis arrête les processus."""
+        self._executor.shutdown()
+        logger.info(f"Comparaison multi-processus : {self.submitted} comparaison(s) confiée(s) à {self.workers} processus "
+                    f"({self.shipped_bytes / 1e6:.1f} Mo transférés en mémoire partagée).")
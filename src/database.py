@@ -1,18 +1,96 @@
 import pandas as pd
 import urllib.parse
+import time
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.exc import SQLAlchemyError
-from config.settings import DB_CONFIG
+from sqlalchemy.sql.elements import TextClause
+from config.settings import DB_CONFIG, DB_POOL_CONFIG, QUERY_CONFIG, QUERY_CACHE_CONFIG
+from config.exclusions import IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS, TABLE_KEYS
+from sql.queries import BATCH_QUERIES, project_query, prepared, get_statement, padded_list
+from src.checksum import build_checksum_query
+from src.dtypes import apply_table_dtypes
+from src.metrics import metrics
+from src.query_cache import QueryCache, normalize_sql, cache_key
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Requête INSERT paramétrée du paiement d'activation (Mode 6), partagée par l'injection unitaire et en masse
+INSERT_PAYMENT_QUERY = text("""
+                     INSERT INTO LV.PRCTT0 (
+                         C_STE, NO_CNT, C_MD_PMT, D_REF_PRM, NO_ORD_RCP, TSTAMP_CRT_RCT,
+                         C_TY_RCT, D_BISM_DVA, D_BISM_DCOR, M_PAY, NM_CP,
+                         T_ADR_1_CP, T_ADR_2_CP, C_ETAT_RCP, T_COMMU, NO_BUR_SERV,
+                         NO_AVT, PC_COM, PC_FR_GEST, NO_IBAN_CP, C_BIC_CP,
+                         NM_AUTEUR_CRT, D_CRT, TY_DMOD, D_ORGN_DEV, C_ORGN_DEV
+                     ) VALUES (
+                                  'A', :no_cnt, '6', :d_ref, '1', :tstamp,
+                                  '1', :d_ref, :d_ref, :amount, 'TEST AUTOMATION',
+                                  'RUE DU TEST 1', '1000 BRUXELLES', 'B', :commu, '12831',
+                                  '0', 0.0245, 0.0105, 'BE47001304609580', 'GEBABEBB',
+                                  'AUTO_TEST', :d_ref, 'O', :d_ref, 'EUR'
+                              )
+                     """)
+
+class PoolStats:
+    """
+    Statistiques d'utilisation du pool de connexions : temps d'attente pour obtenir une connexion
+    et durée d'occupation. Une attente élevée indique un pool sous-dimensionné pour le nombre de threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def checked_out(self, wait):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def checked_in(self, hold):
+        with self._lock:
+            self.in_use -= 1
+            self.hold_total += hold
+            self.hold_max = max(self.hold_max, hold)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'wait_avg_ms': round(1000 * self.wait_total / self.checkouts, 2) if self.checkouts else 0.0,
+                'wait_max_ms': round(1000 * self.wait_max, 2),
+                'hold_avg_ms': round(1000 * self.hold_total / self.checkouts, 2) if self.checkouts else 0.0,
+                'hold_max_ms': round(1000 * self.hold_max, 2)
+            }
+
+
 class DatabaseManager:
     def __init__(self):
         self.engine = self._create_db_engine()
+        # Cache des métadonnées de tables (colonnes, types) : lues une seule fois par exécution
+        self._columns_cache = {}
+        self._columns_lock = threading.Lock()
+        # Connexion réservée par thread (voir session()) et statistiques du pool
+        self._local = threading.local()
+        self.pool_stats = PoolStats()
+        # Cache des résultats de get_data (optionnel, voir QUERY_CACHE_CONFIG)
+        self.query_cache = QueryCache() if QUERY_CACHE_CONFIG.get('ENABLED', False) else None
 
     def _create_db_engine(self):
         try:
@@ -39,27 +117,120 @@ class DatabaseManager:
 
             engine_url = f"mssql+pyodbc:///?odbc_connect={encoded_conn_str}"
 
-            return create_engine(engine_url, fast_executemany=True)
+            engine = create_engine(
+                engine_url,
+                fast_executemany=True,
+                pool_size=DB_POOL_CONFIG.get('POOL_SIZE', 5),
+                max_overflow=DB_POOL_CONFIG.get('MAX_OVERFLOW', 10),
+                pool_pre_ping=DB_POOL_CONFIG.get('PRE_PING', True),
+                pool_recycle=DB_POOL_CONFIG.get('RECYCLE', -1),
+                pool_timeout=DB_POOL_CONFIG.get('TIMEOUT', 30)
+            )
+
+            # Délai maximum par requête, appliqué à chaque nouvelle connexion ODBC (pyodbc Connection.timeout)
+            query_timeout = DB_POOL_CONFIG.get('QUERY_TIMEOUT', 0)
+            if query_timeout:
+                @event.listens_for(engine, "connect")
+                def _set_query_timeout(dbapi_connection, connection_record):
+                    dbapi_connection.timeout = query_timeout
+
+            return engine
 
         except Exception as e:
             logger.error(f"Erreur lors de la création de l'engine: {e}")
             raise
 
-    def get_data(self, query: str) -> pd.DataFrame:
+    @contextmanager
+    def _checkout(self, transaction=False):
+        """Emprunte une connexion au pool en mesurant l'attente et la durée d'occupation."""
+        start = time.perf_counter()
+        with (self.engine.begin() if transaction else self.engine.connect()) as connection:
+            acquired = time.perf_counter()
+            self.pool_stats.checked_out(acquired - start)
+            try:
+                yield connection
+            finally:
+                self.pool_stats.checked_in(time.perf_counter() - acquired)
+
+    @contextmanager
+    def session(self):
+        """
+        Réserve une connexion du pool au thread courant pour une série de requêtes.
+
+        Toutes les lectures faites par ce thread à l'intérieur du bloc (get_data, get_table_batch,
+        resolve_internal_ids...) réutilisent cette connexion au lieu d'en emprunter une par requête.
+        Les sessions imbriquées réutilisent la connexion de la session englobante.
+
+        Utilisation :
+            with db.session():
+                ...  # dizaines de requêtes d'un bloc de contrats, une seule connexion
+        """
+        if getattr(self._local, 'connection', None) is not None:
+            yield self._local.connection
+            return
+
+        with self._checkout() as connection:
+            self._local.connection = connection
+            try:
+                yield connection
+            finally:
+                self._local.connection = None
+
+    @contextmanager
+    def _connection(self):
+        """Connexion de lecture : celle de la session du thread si elle existe, sinon une connexion du pool."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            with self._checkout() as connection:
+                yield connection
+            return
+
+        try:
+            yield connection
+        except SQLAlchemyError:
+            # Transaction implicite en échec : on la clôt pour que la session reste utilisable
+            connection.rollback()
+            raise
+
+    def get_data(self, query, params=None, use_cache=True) -> pd.DataFrame:
         """
         Exécute une requête SQL SELECT et retourne un DataFrame Pandas.
 
         Args:
-            query (str): La requête SQL à exécuter.
+            query (str ou TextClause): La requête SQL (texte du registre sql/queries.py, avec des paramètres
+                                       nommés :param) ou une instruction déjà préparée.
+            params (dict): Valeurs des paramètres nommés (ex: {'internal_id': 123}).
+            use_cache (bool): False pour toujours interroger la base, même si le cache des requêtes est actif
+                              (ex: attente de la visibilité d'un contrat qui vient d'être créé).
 
         Returns:
             pd.DataFrame: Les résultats sous forme de DataFrame.
         """
+        statement = prepared(query) if isinstance(query, str) else query
+        if params:
+            # Scalaires numpy (ex: NO_CNT lus par pandas) convertis en types Python, seuls acceptés par pyodbc
+            params = {name: value.item() if hasattr(value, 'item') else value for name, value in params.items()}
+
+        key = ttl = None
+        if self.query_cache is not None and use_cache and isinstance(statement, TextClause):
+            sql = normalize_sql(statement.text)
+            ttl = self.query_cache.ttl(sql)
+            if ttl > 0:
+                key = cache_key(sql, params)
+                df = self.query_cache.get(key)
+                if df is not None:
+                    metrics.count('db_cache_hit', rows=len(df))
+                    return df
         try:
             # Utilisation d'une connexion explicite avec gestionnaire de contexte
-            with self.engine.connect() as connection:
+            with metrics.timer('db_query') as measure, self._connection() as connection:
                 # Pandas lit directement via la connexion ouverte
-                return pd.read_sql(text(query), connection)
+                df = pd.read_sql(statement, connection, params=params)
+                measure['rows'] = len(df)
+                measure['bytes'] = df.memory_usage(index=False).sum()
+            if key is not None:
+                self.query_cache.put(key, df, ttl)
+            return df
 
         except SQLAlchemyError as e:
             logger.error(f"Erreur SQL lors de l'exécution de la requête : {e}")
@@ -69,11 +240,278 @@ class DatabaseManager:
             logger.error(f"Erreur inattendue : {e}")
             raise
 
-    def inject_payment(self, contract_internal_id, amount, payment_date=None):
+    def resolve_internal_ids(self, contract_numbers, chunk_size=1000, use_cache=True):
         """
-        Insère un paiement dans LV.PRCTT0 pour activer le contrat.
-        Se base sur la structure de données fournie (Mode 6).
+        Résout en masse les numéros de police (NO_CNT_EXTENDED) en identifiants internes LISA.
+
+        Remplace les appels unitaires à GET_INTERNAL_ID : les contrats sont envoyés par paquets
+        (liste IN de `chunk_size` éléments) et on récupère en une fois NO_CNT et C_PROP_PRINC.
+
+        Args:
+            contract_numbers (iterable): Les numéros de contrat externes à résoudre.
+            chunk_size (int): Nombre maximum de contrats par requête.
+            use_cache (bool): False pour ignorer le cache des requêtes (contrats en cours de création).
+
+        Returns:
+            dict: Index en mémoire {NO_CNT_EXTENDED: {'NO_CNT': ..., 'C_PROP_PRINC': ...}}.
+                  Les contrats introuvables sont absents de l'index.
+        """
+        # Dédoublonnage en conservant l'ordre (un même contrat source peut apparaître sur plusieurs lignes)
+        unique_numbers = list(dict.fromkeys(
+            str(c).strip() for c in contract_numbers if c is not None and str(c).strip()
+        ))
+
+        index = {}
+        for start in range(0, len(unique_numbers), chunk_size):
+            chunk = unique_numbers[start:start + chunk_size]
+            # Liste liée en paramètres : aucun échappement à faire sur les numéros saisis dans Excel
+            with metrics.timer('id_lookup') as measure:
+                df = self.get_data(get_statement("GET_INTERNAL_IDS_BULK"),
+                                   {'contract_numbers': padded_list(chunk, chunk_size)}, use_cache=use_cache)
+                measure['rows'] = len(df)
+
+            if df.empty:
+                continue
+
+            for row in df.itertuples(index=False):
+                key = str(row.NO_CNT_EXTENDED).strip()
+                # Même comportement que le TOP 1 unitaire : on garde la première occurrence
+                if key in index:
+                    continue
+                product = row.C_PROP_PRINC
+                index[key] = {
+                    'NO_CNT': row.NO_CNT,
+                    'C_PROP_PRINC': str(product).strip() if pd.notna(product) else None
+                }
+
+        nb_queries = (len(unique_numbers) + chunk_size - 1) // chunk_size
+        logger.debug(f"Résolution des ID internes : {len(index)}/{len(unique_numbers)} contrats trouvés ({nb_queries} requête(s)).")
+        return index
+
+    def get_projected_columns(self, table_name):
+        """
+        Colonnes d'une table réellement utilisées par la comparaison, dans l'ordre de la table :
+        toutes sauf IGNORE_COLUMNS et SPECIFIC_EXCLUSIONS, en gardant NO_CNT (découpage par contrat)
+        et les clés métier de TABLE_KEYS (alignement des lignes).
+
+        Returns:
+            list: Les colonnes à sélectionner, ou None si les métadonnées sont indisponibles (SELECT *).
+        """
+        columns = self.get_table_columns(table_name)
+        if not columns:
+            return None
+
+        excluded = set(IGNORE_COLUMNS) | set(SPECIFIC_EXCLUSIONS.get(table_name, []))
+        required = {'NO_CNT'} | set(TABLE_KEYS.get(table_name, []))
+        return [name for name, _ in columns if name in required or name not in excluded]
+
+    def iter_data(self, query, params=None, chunksize=10000):
+        """
+        Exécute une requête SQL SELECT et restitue le résultat par morceaux de `chunksize` lignes.
+
+        Contrairement à get_data, le résultat n'est jamais matérialisé en entier : les lignes sont lues
+        au fil de l'eau sur le curseur (yield_per), la mémoire reste bornée quelle que soit la volumétrie.
+        Les types sont inférés morceau par morceau (comme pd.read_sql avec chunksize).
+
+        Args:
+            query (str ou TextClause): La requête SQL (voir get_data).
+            params (dict): Valeurs des paramètres nommés.
+            chunksize (int): Nombre de lignes par DataFrame restitué.
+
+        Yields:
+            pd.DataFrame: Les morceaux successifs du résultat.
+
+        Raises:
+            SQLAlchemyError: Une erreur en cours de lecture est propagée (un résultat partiel
+                             ne doit pas passer pour un résultat complet).
         """
+        for columns, rows in self._iter_rows(query, params, chunksize):
+            # coerce_float=True : comportement par défaut de pd.read_sql (Decimal -> float, etc.)
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+    def _iter_rows(self, query, params=None, chunksize=10000):
+        """Lecture en flux : restitue (colonnes, lignes) par paquets de `chunksize` lignes."""
+        statement = prepared(query) if isinstance(query, str) else query
+        if params:
+            params = {name: value.item() if hasattr(value, 'item') else value for name, value in params.items()}
+
+        try:
+            with self._connection() as connection:
+                result = connection.execution_options(yield_per=chunksize).execute(statement, params or {})
+                columns = list(result.keys())
+                empty = True
+                for rows in result.partitions(chunksize):
+                    empty = False
+                    yield columns, rows
+                if empty:
+                    # Résultat vide : on restitue tout de même les colonnes
+                    yield columns, []
+        except SQLAlchemyError as e:
+            logger.error(f"Erreur SQL lors de la lecture en flux : {e}")
+            raise
+
+    def iter_table_batch(self, table_name, internal_ids, chunk_size=500, full_rows=False, fetch_size=10000):
+        """
+        Version en flux de get_table_batch : restitue chaque contrat dès que toutes ses lignes sont lues.
+
+        Les requêtes ensemblistes sont triées d'abord par NO_CNT (voir BATCH_QUERIES) : dès qu'un nouveau
+        NO_CNT apparaît, le contrat précédent est complet. Seules les lignes du contrat en cours sont en
+        mémoire, même pour des historiques de plusieurs millions de lignes (LV.BSPDT0, LV.PRCTT0).
+
+        Args:
+            table_name, internal_ids, chunk_size, full_rows: Voir get_table_batch.
+            fetch_size (int): Nombre de lignes lues à la fois sur le curseur.
+
+        Yields:
+            tuple: (NO_CNT, pd.DataFrame). Un contrat sans ligne reçoit un DataFrame vide ; en cas d'erreur SQL,
+                   les contrats du lot non encore restitués reçoivent un DataFrame vide (comme get_data).
+        """
+        unique_ids = list(dict.fromkeys(i for i in internal_ids if i is not None))
+
+        query_template = BATCH_QUERIES[table_name]
+        if not full_rows and QUERY_CONFIG.get('PROJECTION'):
+            columns = self.get_projected_columns(table_name)
+            if columns:
+                query_template = project_query(query_template, columns)
+
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            pending = {internal_id: internal_id for internal_id in chunk}
+            columns = None
+            current_id, current_rows = None, []
+
+            try:
+                # Seul le temps de lecture du curseur est mesuré, pas celui du consommateur du générateur
+                fetched = metrics.timed_iter(
+                    self._iter_rows(query_template, {'internal_ids': padded_list(chunk, chunk_size)}, fetch_size),
+                    'db_fetch', table_name, rows=lambda chunk_rows: len(chunk_rows[1])
+                )
+                for columns, rows in fetched:
+                    key_pos = columns.index('NO_CNT')
+                    for row in rows:
+                        if row[key_pos] != current_id:
+                            if current_id in pending:
+                                yield self._contract_frame(table_name, pending.pop(current_id), current_rows, columns)
+                            current_id, current_rows = row[key_pos], []
+                        current_rows.append(tuple(row))
+
+                if current_id in pending:
+                    yield self._contract_frame(table_name, pending.pop(current_id), current_rows, columns)
+            except SQLAlchemyError as e:
+                logger.error(f"Erreur SQL lors de l'extraction par lot de {table_name} : {e}")
+                # Même contrat que get_data : un DataFrame vide plutôt qu'un plantage de la campagne
+                for internal_id in pending.values():
+                    yield internal_id, pd.DataFrame()
+                continue
+
+            # Contrats sans aucune ligne : DataFrame vide avec les colonnes du résultat
+            for internal_id in pending.values():
+                yield self._contract_frame(table_name, internal_id, [], columns)
+
+    @staticmethod
+    def _contract_frame(table_name, internal_id, rows, columns):
+        # coerce_float=True : comportement par défaut de pd.read_sql (Decimal -> float, etc.)
+        df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        if QUERY_CONFIG.get('COMPACT_DTYPES'):
+            # Types compacts du registre (codes en catégories, entiers nullables...), voir config/dtypes.py
+            df = apply_table_dtypes(df, table_name)
+        metrics.count('db_fetch', table_name, nbytes=df.memory_usage(index=False).sum())
+        return internal_id, df
+
+    def get_table_batch(self, table_name, internal_ids, chunk_size=500, full_rows=False):
+        """
+        Extrait une table pour tout un bloc de contrats en une seule requête (NO_CNT IN (...)).
+
+        Le résultat est ensuite redécoupé par contrat. Chaque DataFrame est reconstruit avec la même
+        inférence de types que pd.read_sql sur une requête unitaire : un contrat obtient donc exactement
+        le DataFrame qu'il aurait obtenu avec QUERIES[table_name] (mêmes types et ordre des lignes), auquel
+        s'ajoutent les types compacts du registre config/dtypes.py (QUERY_CONFIG['COMPACT_DTYPES']).
+
+        Par défaut (QUERY_CONFIG['PROJECTION']), seules les colonnes utiles à la comparaison sont
+        transférées (voir get_projected_columns) : les colonnes exclues (fillers, auteurs, timestamps...)
+        ne transitent plus par le réseau ni en mémoire.
+
+        Le résultat est lu en flux (voir iter_table_batch) : l'ensemble des lignes brutes n'est jamais
+        chargé en plus des DataFrames.
+
+        Args:
+            table_name (str): Nom de la table (clé de BATCH_QUERIES, ex: 'LV.SCNTT0').
+            internal_ids (iterable): Les identifiants internes (NO_CNT) à extraire.
+            chunk_size (int): Nombre maximum de contrats par requête.
+            full_rows (bool): Extrait toutes les colonnes (SELECT *), ex: snapshots complets.
+
+        Returns:
+            dict: {NO_CNT: pd.DataFrame}. Un contrat sans ligne reçoit un DataFrame vide.
+        """
+        return dict(self.iter_table_batch(table_name, internal_ids, chunk_size, full_rows))
+
+    def get_table_columns(self, table_name):
+        """
+        Colonnes d'une table et leurs types SQL, lus dans INFORMATION_SCHEMA puis gardés en cache.
+
+        Args:
+            table_name (str): Nom qualifié de la table (ex: 'LV.SCNTT0').
+
+        Returns:
+            list: [(COLUMN_NAME, DATA_TYPE), ...] dans l'ordre de la table. Vide si la table est inconnue
+                  ou si les métadonnées sont inaccessibles (une erreur n'est pas mise en cache).
+        """
+        with self._columns_lock:
+            if table_name in self._columns_cache:
+                return self._columns_cache[table_name]
+
+        schema, _, table = table_name.rpartition('.')
+        df = self.get_data(get_statement("GET_TABLE_COLUMNS"), {'schema': schema or 'dbo', 'table': table})
+        columns = [(str(row.COLUMN_NAME), str(row.DATA_TYPE)) for row in df.itertuples(index=False)] if not df.empty else []
+
+        if columns:
+            with self._columns_lock:
+                self._columns_cache[table_name] = columns
+        return columns
+
+    def get_table_checksums(self, table_name, internal_ids, chunk_size=500):
+        """
+        Calcule côté serveur, pour chaque contrat, le nombre de lignes et une somme de contrôle agrégée
+        des colonnes comparées (voir src/checksum.py), sans rapatrier les lignes.
+
+        Args:
+            table_name (str): Nom de la table (ex: 'LV.SCNTT0').
+            internal_ids (iterable): Les identifiants internes (NO_CNT).
+            chunk_size (int): Nombre maximum de contrats par requête.
+
+        Returns:
+            tuple: (empreinte de la définition, {NO_CNT: (nb_lignes, somme_de_contrôle)}).
+                   Un contrat sans ligne reçoit (0, None). Les contrats d'un lot en erreur sont absents,
+                   de même que tous les contrats si les métadonnées de la table sont inaccessibles.
+        """
+        query_template, definition = build_checksum_query(table_name, self.get_table_columns(table_name))
+        if query_template is None:
+            return None, {}
+
+        unique_ids = list(dict.fromkeys(i for i in internal_ids if i is not None))
+        checksums = {}
+
+        for start in range(0, len(unique_ids), chunk_size):
+            chunk = unique_ids[start:start + chunk_size]
+            try:
+                with metrics.timer('db_checksum', table_name) as measure, self._connection() as connection:
+                    rows = connection.execute(prepared(query_template), {'internal_ids': padded_list(chunk, chunk_size)}).fetchall()
+                    measure['rows'] = len(rows)
+            except SQLAlchemyError as e:
+                # Contrairement à get_data, on ne peut pas confondre une erreur avec "aucune ligne"
+                logger.error(f"Erreur SQL lors du calcul des sommes de contrôle de {table_name} : {e}")
+                continue
+
+            for internal_id in chunk:
+                checksums[internal_id] = (0, None)
+            for no_cnt, nb_rows, checksum in rows:
+                checksums[no_cnt] = (int(nb_rows), checksum)
+
+        return definition, checksums
+
+    @staticmethod
+    def _build_payment_params(contract_internal_id, amount, payment_date=None):
+        """Prépare les paramètres de l'INSERT de paiement (dates, communication structurée)."""
         # Si pas de date fournie, on prend maintenant
         if payment_date is None:
             now = datetime.now()
@@ -91,24 +529,7 @@ class DatabaseManager:
         # Format : 820 + 9 chiffres ID + 99 (juste pour l'unicité)
         fake_commu = f"820{str(contract_internal_id)[:9]}99"
 
-        # Requête INSERT paramétrée
-        query = text("""
-                     INSERT INTO LV.PRCTT0 (
-                         C_STE, NO_CNT, C_MD_PMT, D_REF_PRM, NO_ORD_RCP, TSTAMP_CRT_RCT,
-                         C_TY_RCT, D_BISM_DVA, D_BISM_DCOR, M_PAY, NM_CP,
-                         T_ADR_1_CP, T_ADR_2_CP, C_ETAT_RCP, T_COMMU, NO_BUR_SERV,
-                         NO_AVT, PC_COM, PC_FR_GEST, NO_IBAN_CP, C_BIC_CP,
-                         NM_AUTEUR_CRT, D_CRT, TY_DMOD, D_ORGN_DEV, C_ORGN_DEV
-                     ) VALUES (
-                                  'A', :no_cnt, '6', :d_ref, '1', :tstamp,
-                                  '1', :d_ref, :d_ref, :amount, 'TEST AUTOMATION',
-                                  'RUE DU TEST 1', '1000 BRUXELLES', 'B', :commu, '12831',
-                                  '0', 0.0245, 0.0105, 'BE47001304609580', 'GEBABEBB',
-                                  'AUTO_TEST', :d_ref, 'O', :d_ref, 'EUR'
-                              )
-                     """)
-
-        params = {
+        return {
             'no_cnt': contract_internal_id,
             'd_ref': d_ref,
             'tstamp': tstamp,
@@ -116,20 +537,99 @@ class DatabaseManager:
             'commu': fake_commu
         }
 
+    def inject_payment(self, contract_internal_id, amount, payment_date=None):
+        """
+        Insère un paiement dans LV.PRCTT0 pour activer le contrat.
+        Se base sur la structure de données fournie (Mode 6).
+        """
+        params = self._build_payment_params(contract_internal_id, amount, payment_date)
+
         try:
             # .begin() gère la transaction et le commit automatique
-            with self.engine.begin() as connection:
-                connection.execute(query, params)
-                logger.info(f"SUCCÈS: Paiement de {amount} EUR injecté pour le contrat {contract_internal_id} (Date: {d_ref})")
+            with self._checkout(transaction=True) as connection:
+                connection.execute(INSERT_PAYMENT_QUERY, params)
+                self._invalidate_cache('LV.PRCTT0')
+                logger.info(f"SUCCÈS: Paiement de {amount} EUR injecté pour le contrat {contract_internal_id} (Date: {params['d_ref']})")
                 return True
         except Exception as e:
             logger.error(f"ÉCHEC: Erreur lors de l'injection du paiement pour {contract_internal_id} : {e}")
             return False
 
+    def inject_payments(self, payments, batch_size=500):
+        """
+        Insère en masse des paiements dans LV.PRCTT0 (version ensembliste de inject_payment).
+
+        Chaque lot de `batch_size` lignes est envoyé en un seul executemany (fast_executemany côté pyodbc)
+        dans sa propre transaction. Si un lot échoue, il est annulé puis rejoué ligne par ligne afin
+        d'identifier précisément les paiements en erreur sans pénaliser les autres.
+
+        Args:
+            payments (list): Liste de tuples (contract_internal_id, amount, payment_date).
+                             payment_date peut être None (date du jour).
+            batch_size (int): Nombre de lignes par transaction.
+
+        Returns:
+            list: Un booléen de succès par paiement, dans l'ordre de la liste d'entrée.
+        """
+        results = [False] * len(payments)
+
+        for start in range(0, len(payments), batch_size):
+            batch = payments[start:start + batch_size]
+            params = [self._build_payment_params(*payment) for payment in batch]
+
+            try:
+                with metrics.timer('payment_insert', 'LV.PRCTT0') as measure, self._checkout(transaction=True) as connection:
+                    connection.execute(INSERT_PAYMENT_QUERY, params)
+                    measure['rows'] = len(params)
+                self._invalidate_cache('LV.PRCTT0')
+                results[start:start + len(batch)] = [True] * len(batch)
+                logger.info(f"SUCCÈS: {len(batch)} paiement(s) injecté(s) en masse dans LV.PRCTT0.")
+                continue
+            except Exception as e:
+                logger.warning(f"Échec du lot de {len(batch)} paiement(s), rejeu ligne par ligne : {e}")
+
+            # Rejeu unitaire : le lot a été annulé en bloc, on isole les lignes fautives
+            for offset, payment in enumerate(batch):
+                results[start + offset] = self.inject_payment(*payment)
+
+        return results
+
+    def _invalidate_cache(self, table_name):
+        """Après une écriture : les résultats en cache des requêtes sur cette table ne sont plus fiables."""
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+
+    def get_cache_stats(self):
+        """Statistiques du cache des requêtes (succès, échecs, évictions, mémoire), ou None s'il est désactivé."""
+        return self.query_cache.stats() if self.query_cache is not None else None
+
+    def get_pool_stats(self):
+        """
+        Statistiques du pool : emprunts, connexions occupées (courant / pic), attente et durée d'occupation
+        (moyenne / max, en ms), taille configurée. Sert à dimensionner le pool pour les exécutions parallèles.
+        """
+        stats = self.pool_stats.snapshot()
+        stats['capacity'] = self.pool_capacity()
+        return stats
+
+    def pool_capacity(self):
+        """
+        Nombre maximum de connexions simultanées que l'engine peut ouvrir (pool_size + max_overflow).
+        Sert à dimensionner les pools de threads des traitements parallèles. Pour un pool sans notion de
+        taille, retourne 1 : les appelants se rabattent alors sur une seule connexion (traitement séquentiel).
+        """
+        pool = self.engine.pool
+        try:
+            return pool.size() + max(pool._max_overflow, 0)
+        except AttributeError:
+            # Pools sans notion de taille (ex: NullPool, StaticPool) : limite inconnue, une seule connexion
+            # par prudence (un StaticPool partage d'ailleurs une connexion unique entre tous les threads)
+            return 1
+
     def test_connection(self):
         """Méthode utilitaire pour vérifier si la connexion fonctionne."""
         try:
-            with self.engine.connect() as connection:
+            with self._connection() as connection:
                 result = connection.execute(text("SELECT 1")).scalar()
                 if result == 1:
                     logger.info(f"Connexion réussie à la base : {DB_CONFIG['DATABASE']}")
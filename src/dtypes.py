@@ -0,0 +1,97 @@
+import fnmatch
+import logging
+from functools import lru_cache
+
+import pandas as pd
+
+from config.dtypes import DTYPE_PATTERNS, TABLE_DTYPES, STRING_DTYPE
+
+logger = logging.getLogger(__name__)
+
+
+def is_string_series(series):
+    """Indique si une colonne contient des chaînes (objets Python, StringDtype ou catégories de chaînes)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.api.types.infer_dtype(dtype.categories, skipna=True) == 'string'
+    if isinstance(dtype, pd.StringDtype):
+        return True
+    return dtype == object and pd.api.types.infer_dtype(series, skipna=True) == 'string'
+
+
+def target_dtype(table_name, column):
+    """Type compact attendu pour une colonne d'après le registre (config/dtypes.py), ou None."""
+    overrides = TABLE_DTYPES.get(table_name, {})
+    if column in overrides:
+        return overrides[column]
+    for pattern, dtype in DTYPE_PATTERNS:
+        if fnmatch.fnmatchcase(column, pattern):
+            return dtype
+    return STRING_DTYPE
+
+
+@lru_cache(maxsize=256)
+def _dtype_plan(table_name, columns):
+    """Conversions à tenter pour une table et une liste de colonnes : ((colonne, type pandas), ...)."""
+    plan = []
+    for column in columns:
+        dtype = target_dtype(table_name, column)
+        if dtype is not None:
+            plan.append((column, pd.api.types.pandas_dtype(dtype)))
+    return tuple(plan)
+
+
+def _convert(series, dtype):
+    """Conversion sûre d'une colonne ; retourne la colonne d'origine si la conversion ne s'applique pas."""
+    if series.dtype == dtype:
+        return series
+
+    if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        # Codes et chaînes : seules les colonnes de chaînes sont concernées (un code numérique reste numérique)
+        if not is_string_series(series) or isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.astype(dtype)
+
+    if pd.api.types.is_integer_dtype(dtype):
+        # Entier nullable : uniquement depuis une colonne numérique dont toutes les valeurs sont entières
+        if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            return series
+        return series.astype(dtype)
+
+    if pd.api.types.is_float_dtype(dtype):
+        if series.dtype == object:
+            # Decimal ou colonne partiellement NULL renvoyée en objets
+            return pd.to_numeric(series).astype(dtype)
+        if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            return series
+        return series.astype(dtype)
+
+    return series.astype(dtype)
+
+
+def apply_table_dtypes(df, table_name):
+    """
+    Applique le registre de types compacts d'une table à un DataFrame lu en base.
+
+    Le plan de conversion est calculé une seule fois par (table, colonnes). Une colonne dont les valeurs
+    ne se prêtent pas au type prévu (valeur non entière, texte dans un montant...) est laissée telle quelle.
+
+    Returns:
+        pd.DataFrame: Un nouveau DataFrame (le DataFrame passé en paramètre n'est pas modifié).
+    """
+    converted = {}
+    for column, dtype in _dtype_plan(table_name, tuple(df.columns)):
+        try:
+            series = _convert(df[column], dtype)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Type {dtype} non applicable à {table_name}.{column} : {e}")
+            continue
+        if series is not df[column]:
+            converted[column] = series
+
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for column, series in converted.items():
+        df[column] = series
+    return df
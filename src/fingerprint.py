@@ -0,0 +1,57 @@
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+def schema_hash(df):
+    """
+    Empreinte du schéma d'un DataFrame (noms de colonnes, ordre et types).
+    Deux DataFrames de même schéma ont la même empreinte, quel que soit leur contenu.
+    """
+    signature = "|".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    return hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+
+
+# Version de frame_checksum consignée dans les manifestes de snapshots.
+# 1 : hachage avec factorisation préalable des chaînes (manifestes antérieurs) ; 2 : sans factorisation.
+CHECKSUM_VERSION = 2
+
+
+def frame_checksum(df, version=CHECKSUM_VERSION):
+    """
+    Somme de contrôle du contenu d'un DataFrame (schéma + valeurs, ordre des lignes compris).
+
+    Calculée de manière vectorisée (pd.util.hash_pandas_object) : sert à vérifier qu'un snapshot
+    relu est strictement identique à celui qui a été écrit. `version` permet de vérifier une somme
+    enregistrée par une version antérieure (voir CHECKSUM_VERSION).
+    """
+    digest = hashlib.sha1(schema_hash(df).encode('utf-8'))
+    if len(df):
+        hashes = pd.util.hash_pandas_object(df, index=False, categorize=version < 2)
+        digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """
+    Empreinte 64 bits de chaque ligne d'un DataFrame (vectorisée, indépendante de l'index).
+
+    categorize=False : les empreintes ne sont comparées qu'entre elles, au sein d'une exécution. La
+    factorisation préalable des chaînes ne rapporte que sur de longues colonnes très répétitives ; sur
+    les quelques dizaines de lignes d'un contrat, elle multiplie le temps de hachage par cinq.
+    """
+    return pd.util.hash_pandas_object(df, index=False, categorize=False).to_numpy()
+
+
+def same_row_multiset(df1, df2):
+    """
+    Indique si deux DataFrames de même schéma contiennent exactement les mêmes lignes,
+    avec les mêmes multiplicités, quel que soit leur ordre.
+
+    On ne trie que deux vecteurs d'entiers 64 bits au lieu des DataFrames complets.
+    Un résultat False n'est pas une preuve d'écart (ex: 0.0 et -0.0 ont des empreintes différentes) :
+    l'appelant doit alors se rabattre sur une comparaison détaillée.
+    """
+    if len(df1) != len(df2) or not df1.dtypes.equals(df2.dtypes):
+        return False
+    return bool(np.array_equal(np.sort(row_hashes(df1)), np.sort(row_hashes(df2))))
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+
+from config.settings import METRICS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Bornes supérieures des intervalles des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Libellé des mesures qui ne portent pas sur une table précise (ex: résolution des ID)
+ALL_TABLES = '*'
+
+
+class Histogram:
+    """Histogramme de latences à intervalles fixes (LATENCY_BUCKETS), plus nombre, somme et maximum."""
+
+    __slots__ = ('bucket_counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Quantile approché : borne supérieure de l'intervalle qui le contient (maximum pour le dernier)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.bucket_counts)}
+        }
+
+
+class StageStats:
+    """Mesures cumulées d'une étape pour une table : latences, lignes et octets traités."""
+
+    __slots__ = ('latency', 'rows', 'bytes')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+        self.bytes = 0
+
+
+class RunMetrics:
+    """
+    Instrumentation d'une exécution (activation ou comparaison) : où passe le temps ?
+
+    Chaque étape (résolution des ID, extraction, lecture/écriture des snapshots, comparaison, écriture
+    du rapport...) est mesurée par table : histogramme de latences, nombre de lignes et d'octets.
+    L'avancement (contrats traités / attendus) donne le débit en contrats par minute et l'heure de fin estimée.
+
+    Les mesures sont exportées en JSON (un fichier horodaté par exécution) et/ou au format texte
+    Prometheus (node_exporter --collector.textfile), réécrits toutes les FLUSH_INTERVAL secondes
+    pendant l'exécution et une dernière fois à la fin (finish). Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or METRICS_CONFIG
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self, run_name='run', total=None, timestamp=None):
+        """Démarre (ou redémarre) la mesure d'une exécution."""
+        with self._lock:
+            self.run_name = run_name
+            self.timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.total = total
+            self.done = 0
+            self.started = time.monotonic()
+            self._last_flush = self.started
+            self._stages = {}
+
+    @property
+    def enabled(self):
+        return self.config.get('ENABLED', False)
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    # --- MESURES ---
+
+    def _stage(self, stage, table):
+        key = (stage, table or ALL_TABLES)
+        stats = self._stages.get(key)
+        if stats is None:
+            stats = self._stages[key] = StageStats()
+        return stats
+
+    def observe(self, stage, seconds, table=None, rows=0, nbytes=0):
+        """Enregistre une exécution d'une étape : durée (secondes), lignes et octets traités."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stage(stage, table)
+            stats.latency.observe(seconds)
+            stats.rows += int(rows)
+            stats.bytes += int(nbytes)
+
+    def count(self, stage, table=None, rows=0, nbytes=0):
+        """Ajoute des lignes / octets à une étape sans mesure de durée."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stage(stage, table)
+            stats.rows += int(rows)
+            stats.bytes += int(nbytes)
+
+    @contextmanager
+    def timer(self, stage, table=None):
+        """
+        Chronomètre un bloc de code. Le dictionnaire restitué permet de renseigner les volumes :
+            with metrics.timer('snapshot_load', table) as measure:
+                measure['rows'] = len(df)
+        """
+        measure = {'rows': 0, 'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield measure
+        finally:
+            self.observe(stage, time.perf_counter() - start, table, measure['rows'], measure['bytes'])
+
+    def timed_iter(self, iterable, stage, table=None, rows=None):
+        """
+        Parcourt un itérateur en ne chronométrant que le temps passé à produire ses éléments (ex: lecture d'un
+        curseur SQL), pas celui du code appelant entre deux éléments. Une seule mesure est enregistrée à la fin.
+
+        Args:
+            rows (callable): Optionnel, nombre de lignes d'un élément (ex: lambda chunk: len(chunk[1])).
+        """
+        elapsed, row_count = 0.0, 0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    break
+                elapsed += time.perf_counter() - start
+                if rows is not None:
+                    row_count += rows(item)
+                yield item
+        finally:
+            self.observe(stage, elapsed, table, row_count)
+
+    def advance(self, contracts=1):
+        """Signale des contrats terminés ; réécrit les fichiers de métriques si l'intervalle est écoulé."""
+        with self._lock:
+            self.done += contracts
+        self.maybe_flush()
+
+    # --- EXPORT ---
+
+    def progress(self):
+        """Avancement : contrats traités, attendus, débit (contrats/min) et temps restant estimé (secondes)."""
+        with self._lock:
+            done, total = self.done, self.total
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed * 60 if elapsed > 0 else 0.0
+        eta = (total - done) / rate * 60 if rate > 0 and total is not None else None
+        return {
+            'contracts_done': done,
+            'contracts_total': total,
+            'elapsed_s': round(elapsed, 1),
+            'contracts_per_min': round(rate, 2),
+            'eta_s': None if eta is None else round(max(eta, 0.0), 1)
+        }
+
+    def snapshot(self):
+        """Toutes les mesures sous forme de dictionnaire (sérialisable en JSON)."""
+        with self._lock:
+            stages = {}
+            for (stage, table), stats in sorted(self._stages.items()):
+                stages.setdefault(stage, {})[table] = dict(
+                    stats.latency.to_dict(), rows=stats.rows, bytes=stats.bytes
+                )
+        return {
+            'run': self.run_name,
+            'timestamp': self.timestamp,
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'progress': self.progress(),
+            'stages': stages
+        }
+
+    def to_prometheus(self):
+        """Mesures au format d'exposition texte Prometheus."""
+        run = self.run_name
+        lines = [
+            "# HELP autoactivator_stage_duration_seconds Durée des étapes par table.",
+            "# TYPE autoactivator_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._stages.items())
+            for (stage, table), stats in items:
+                labels = f'run="{run}",stage="{stage}",table="{table}"'
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), stats.latency.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'autoactivator_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'autoactivator_stage_duration_seconds_sum{{{labels}}} {stats.latency.total:.6f}')
+                lines.append(f'autoactivator_stage_duration_seconds_count{{{labels}}} {stats.latency.count}')
+
+            for metric, attribute, help_text in (
+                ('autoactivator_stage_rows_total', 'rows', "Lignes traitées par étape et par table."),
+                ('autoactivator_stage_bytes_total', 'bytes', "Octets traités par étape et par table."),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (stage, table), stats in items:
+                    lines.append(f'{metric}{{run="{run}",stage="{stage}",table="{table}"}} {getattr(stats, attribute)}')
+
+        progress = self.progress()
+        for metric, metric_type, value in (
+            ('autoactivator_contracts_done', 'counter', progress['contracts_done']),
+            ('autoactivator_contracts_total', 'gauge', progress['contracts_total']),
+            ('autoactivator_contracts_per_minute', 'gauge', progress['contracts_per_min']),
+            ('autoactivator_eta_seconds', 'gauge', progress['eta_s']),
+        ):
+            if value is None:
+                continue
+            lines.append(f"# TYPE {metric} {metric_type}")
+            lines.append(f'{metric}{{run="{run}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def maybe_flush(self):
+        """Réécrit les fichiers de métriques si FLUSH_INTERVAL est écoulé depuis la dernière écriture."""
+        interval = self.config.get('FLUSH_INTERVAL', 60)
+        with self._lock:
+            if time.monotonic() - self._last_flush < interval:
+                return
+            self._last_flush = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        """Écrit les fichiers de métriques (remplacement atomique : un lecteur ne voit jamais de fichier partiel)."""
+        if not self.enabled:
+            return
+        formats = self.config.get('FORMATS', ('json',))
+        try:
+            os.makedirs(self.config['DIR'], exist_ok=True)
+            if 'json' in formats:
+                self._write(f"{self.run_name}_{self.timestamp}.json", json.dumps(self.snapshot(), indent=2))
+            if 'prometheus' in formats:
+                # Nom stable : le textfile collector relit toujours le même fichier
+                self._write(f"autoactivator_{self.run_name}.prom", self.to_prometheus())
+        except OSError as e:
+            # Les métriques ne doivent jamais interrompre une campagne
+            logger.warning(f"   [!] Écriture des métriques impossible : {e}")
+
+    def _write(self, filename, content):
+        path = os.path.join(self.config['DIR'], filename)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+    def finish(self):
+        """Écriture finale des métriques et résumé des étapes les plus coûteuses dans les logs."""
+        self.flush()
+        if not self.enabled:
+            return
+        with self._lock:
+            totals = {}
+            for (stage, _), stats in self._stages.items():
+                totals[stage] = totals.get(stage, 0.0) + stats.latency.total
+        progress = self.progress()
+        breakdown = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in sorted(totals.items(), key=lambda kv: -kv[1]))
+        logger.info(f"Métriques ({self.run_name}) : {progress['contracts_done']} contrat(s) en {progress['elapsed_s']}s "
+                    f"({progress['contracts_per_min']} contrats/min). Temps par étape : {breakdown or 'aucune mesure'}.")
+
+
+# Instance partagée par tous les modules d'une exécution (comme le logger)
+metrics = RunMetrics()
@@ -0,0 +1,134 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Valeur de retour d'un étage qui confie l'élément à un traitement asynchrone (voir StagedPipeline.resume)
+DEFERRED = object()
+
+
+class StagedPipeline:
+    """
+    Pipeline producteur/consommateur à étages, avec une limite de concurrence propre à chaque étage.
+
+    Chaque élément soumis traverse les étages dans l'ordre. Un étage est une fonction qui reçoit
+    l'élément (un dict mutable) et retourne True pour le passer à l'étage suivant, False pour
+    arrêter son traitement (l'étage a alors renseigné le résultat final dans l'élément).
+    Un étage peut aussi retourner DEFERRED : l'élément reste en cours, sans occuper de thread, jusqu'à
+    ce qu'un autre composant appelle resume(item, proceed) (ex: attente de la synchro ELIA -> LISA).
+
+    Les étages tournent chacun sur leur propre pool de threads : un étage lent ou en attente
+    (ETL, synchro ELIA -> LISA) ne bloque pas les autres, qui continuent sur les éléments suivants.
+
+    Utilisation :
+        pipeline = StagedPipeline([("prime", f1, 4), ("paiement", f2, 2)])
+        pipeline.submit(item)   # depuis le producteur, autant de fois que nécessaire
+        pipeline.join()         # attend la fin de tous les éléments soumis
+    """
+
+    def __init__(self, stages, on_error=None, on_done=None):
+        """
+        Args:
+            stages (list): Liste de tuples (nom, fonction, nombre_de_threads).
+            on_error (callable): Appelé avec (item, nom_etage, exception) si un étage lève une exception.
+                                 L'élément est alors considéré comme terminé.
+            on_done (callable): Appelé avec l'élément lorsqu'il a terminé son parcours (ex: suivi d'avancement).
+        """
+        self.stages = stages
+        self.on_error = on_error
+        self.on_done = on_done
+        self._executors = [
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=name)
+            for name, _, workers in stages
+        ]
+        self._pending = 0
+        self._deferred = {}   # id(item) -> index de l'étage qui l'a mis en attente
+        self._resumed = {}    # id(item) -> proceed, si resume() précède la fin de l'étage qui a mis en attente
+        self._lock = threading.Lock()
+        self._all_done = threading.Event()
+        self._all_done.set()
+
+    def submit(self, item):
+        """Injecte un nouvel élément dans le premier étage."""
+        with self._lock:
+            self._pending += 1
+            self._all_done.clear()
+        self._schedule(0, item)
+
+    def resume(self, item, proceed):
+        """
+        Reprend un élément mis en attente par un étage (DEFERRED).
+
+        Args:
+            proceed (bool): True pour le passer à l'étage suivant, False pour terminer son traitement
+                            (le composant a alors renseigné le résultat final dans l'élément).
+        """
+        with self._lock:
+            stage_index = self._deferred.pop(id(item), None)
+            if stage_index is None:
+                # L'étage n'a pas encore rendu la main : la reprise sera faite par _on_stage_done
+                self._resumed[id(item)] = proceed
+                return
+        self._continue(stage_index, item, proceed)
+
+    def _continue(self, stage_index, item, proceed):
+        if proceed:
+            self._schedule(stage_index + 1, item)
+        else:
+            self._finish(item)
+
+    def join(self):
+        """Attend que tous les éléments soumis aient terminé, puis libère les threads."""
+        self._all_done.wait()
+        for executor in self._executors:
+            executor.shutdown()
+
+    def _schedule(self, stage_index, item):
+        if stage_index >= len(self.stages):
+            self._finish(item)
+            return
+
+        name, func, _ = self.stages[stage_index]
+        future = self._executors[stage_index].submit(self._run_stage, name, func, item)
+        future.add_done_callback(lambda f: self._on_stage_done(stage_index, item, f))
+
+    def _on_stage_done(self, stage_index, item, future):
+        name = self.stages[stage_index][0]
+        error = future.exception()
+
+        if error is not None:
+            logger.error(f"Erreur inattendue dans l'étage '{name}' : {error}")
+            try:
+                if self.on_error:
+                    self.on_error(item, name, error)
+            finally:
+                self._finish(item)
+        elif future.result() is DEFERRED:
+            with self._lock:
+                proceed = self._resumed.pop(id(item), None)
+                if proceed is None:
+                    self._deferred[id(item)] = stage_index
+                    return
+            self._continue(stage_index, item, proceed)
+        else:
+            self._continue(stage_index, item, future.result())
+
+    @staticmethod
+    def _run_stage(name, func, item):
+        # Durée de chaque passage dans un étage (métriques d'exécution, voir src/metrics.py)
+        with metrics.timer(f"pipeline_{name}"):
+            return func(item)
+
+    def _finish(self, item):
+        if self.on_done:
+            try:
+                self.on_done(item)
+            except Exception as e:
+                logger.error(f"Erreur dans le suivi de fin d'élément : {e}")
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._all_done.set()
@@ -0,0 +1,128 @@
+import time
+import fnmatch
+import logging
+import threading
+from collections import OrderedDict
+
+from config.settings import QUERY_CACHE_CONFIG
+from sql.queries import query_name
+
+logger = logging.getLogger(__name__)
+
+# Seules les requêtes de consultation sont mises en cache (jamais INSERT / UPDATE / DELETE / EXEC)
+READ_PREFIXES = ('SELECT', 'WITH')
+
+
+def normalize_sql(query):
+    """Texte SQL sans différence d'indentation ni de retours à la ligne (clé de cache)."""
+    return " ".join(query.split())
+
+
+def cache_key(sql, params):
+    """Clé d'un résultat : texte SQL normalisé et valeurs des paramètres (listes IN comprises)."""
+    if not params:
+        return sql, ()
+    return sql, tuple(sorted(
+        (name, tuple(value) if isinstance(value, (list, tuple)) else value) for name, value in params.items()
+    ))
+
+
+class QueryCache:
+    """
+    Cache en mémoire des résultats de DatabaseManager.get_data, le temps d'une exécution.
+
+    Une même consultation revient souvent dans un traitement : numéro interne d'un contrat source présent
+    sur plusieurs lignes du mapping, prime du premier paiement, relances après une erreur... Le résultat est
+    conservé par (texte SQL normalisé, paramètres) pendant une durée de validité propre à chaque requête du
+    registre (QUERY_CACHE_CONFIG['TTL']). La mémoire occupée est bornée (MAX_BYTES) : les résultats les
+    moins récemment utilisés sont évincés. Les résultats vides ne sont pas conservés (contrat pas encore
+    visible dans LISA : il doit être recherché à nouveau).
+
+    Les écritures passent à côté du cache ; DatabaseManager invalide les résultats d'une table après y avoir
+    écrit (invalidate). Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or QUERY_CACHE_CONFIG
+        self.max_bytes = self.config.get('MAX_BYTES', 256 * 1024 * 1024)
+        self._entries = OrderedDict()   # clé -> (DataFrame, expiration, octets), du moins au plus récemment utilisé
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def ttl(self, sql):
+        """Durée de validité (secondes) d'un texte SQL d'après son nom dans le registre ; 0 = non mis en cache."""
+        if not sql.upper().startswith(READ_PREFIXES):
+            return 0
+        name = query_name(sql)
+        if name is not None:
+            for pattern, ttl in self.config.get('TTL', {}).items():
+                if fnmatch.fnmatchcase(name, pattern):
+                    return ttl
+        return self.config.get('DEFAULT_TTL', 0)
+
+    def get(self, key):
+        """Résultat en cache (copie, l'appelant peut la modifier) ou None s'il est absent ou expiré."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            df, expires, nbytes = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                self._bytes -= nbytes
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return df.copy()
+
+    def put(self, key, df, ttl):
+        """Conserve un résultat pendant `ttl` secondes, en évinçant au besoin les moins récemment utilisés."""
+        if ttl <= 0 or df.empty:
+            return
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        df = df.copy()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (df, time.monotonic() + ttl, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def invalidate(self, table_name=None):
+        """Oublie les résultats des requêtes portant sur une table (toutes si `table_name` est None)."""
+        with self._lock:
+            if table_name is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key in self._entries if table_name in key[0]]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[2]
+        if keys:
+            logger.debug(f"Cache des requêtes : {len(keys)} résultat(s) invalidé(s) ({table_name or 'tous'}).")
+
+    def stats(self):
+        """Succès, échecs (dont expirations), évictions, nombre de résultats et mémoire occupée (Mo)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_mb': round(self._bytes / 1e6, 2)
+            }
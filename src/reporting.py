@@ -0,0 +1,156 @@
+import os
+import csv
+import time
+import logging
+from collections import Counter
+
+import pandas as pd
+
+from config.settings import REPORT_CONFIG
+from src.metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow absent : seul le format CSV est disponible
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Colonnes du rapport détaillé (les lignes CRITICAL_ERROR n'ont pas de Source_Type : cellule vide)
+REPORT_COLUMNS = ['Reference_Contract', 'New_Contract', 'Product', 'Table', 'Status', 'Source_Type', 'Details']
+
+
+def build_summary(status_counts):
+    """
+    Construit le tableau de synthèse par produit à partir des compteurs (Product, Status) -> nombre.
+
+    Returns:
+        pd.DataFrame: Une ligne par produit, une colonne par statut, plus Total et Success_Rate (%).
+    """
+    # Agrégation des statuts OK/KO par produit
+    summary = pd.Series(status_counts).rename_axis(['Product', 'Status']).sort_index().unstack(fill_value=0)
+
+    # Normalisation des colonnes pour éviter les KeyError si un statut manque
+    for col in ['OK', 'KO']:
+        if col not in summary.columns:
+            summary[col] = 0
+
+    # Calcul des indicateurs de performance (Total et Taux de succès)
+    summary['Total'] = summary.sum(axis=1)
+    if 'Total' in summary.columns and (summary['Total'] > 0).any():
+        summary['Success_Rate (%)'] = (summary['OK'] / summary['Total'] * 100).round(1)
+    else:
+        summary['Success_Rate (%)'] = 0.0
+
+    return summary
+
+
+class ReportWriter:
+    """
+    Écriture en flux du rapport détaillé d'une campagne de comparaison.
+
+    Les lignes sont ajoutées au fichier au fur et à mesure que les contrats sont traités (tampon vidé
+    toutes les `flush_every` lignes) : la mémoire reste bornée et un arrêt brutal ne perd que le tampon.
+    Les différentiels trop volumineux sont déportés dans un fichier annexe, le rapport n'en garde qu'un aperçu.
+    La synthèse par produit est calculée à partir de compteurs, sans conserver la liste des contrats.
+    """
+
+    def __init__(self, output_dir, timestamp, file_format=None, flush_every=None, max_details_chars=None):
+        self.output_dir = output_dir
+        self.file_format = file_format or REPORT_CONFIG.get('FORMAT', 'csv')
+        self.flush_every = flush_every or REPORT_CONFIG.get('FLUSH_EVERY', 100)
+        self.max_details_chars = max_details_chars or REPORT_CONFIG.get('MAX_DETAILS_CHARS', 32000)
+
+        if self.file_format == 'parquet' and pa is None:
+            logger.warning("pyarrow n'est pas installé : le rapport détaillé sera écrit en CSV.")
+            self.file_format = 'csv'
+
+        self.report_path = os.path.join(output_dir, f'rapport_detaille_{timestamp}.{self.file_format}')
+        self.details_dir = os.path.join(output_dir, f'details_{timestamp}')
+
+        self.status_counts = Counter()
+        self.rows_written = 0
+        self.contracts_counted = 0
+        self._buffer = []
+        self._spill_seq = 0
+        self._file = None
+        self._csv_writer = None
+        self._parquet_writer = None
+
+    def write_rows(self, rows):
+        """Ajoute des lignes au rapport détaillé (écriture différée jusqu'au prochain vidage du tampon)."""
+        for row in rows:
+            row = dict(row)
+            row['Details'] = self._cap_details(row)
+            self._buffer.append(row)
+
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def add_stats(self, entry):
+        """Comptabilise le statut global d'un contrat pour la synthèse par produit."""
+        self.status_counts[(entry['Product'], entry['Status'])] += 1
+        self.contracts_counted += 1
+
+    def flush(self):
+        """Écrit le tampon sur disque."""
+        if not self._buffer:
+            return
+
+        size_before = os.path.getsize(self.report_path) if os.path.exists(self.report_path) else 0
+        started = time.perf_counter()
+        if self.file_format == 'parquet':
+            table = pa.Table.from_pylist(
+                [{col: None if row.get(col) is None else str(row.get(col)) for col in REPORT_COLUMNS} for row in self._buffer],
+                schema=pa.schema([(col, pa.string()) for col in REPORT_COLUMNS])
+            )
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.report_path, table.schema, compression='zstd')
+            self._parquet_writer.write_table(table)
+        else:
+            if self._file is None:
+                # Encodage utf-8-sig pour une ouverture native sans problème d'accents dans MS Excel
+                self._file = open(self.report_path, 'w', newline='', encoding='utf-8-sig')
+                self._csv_writer = csv.DictWriter(self._file, fieldnames=REPORT_COLUMNS, delimiter=';',
+                                                  restval='', extrasaction='ignore')
+                self._csv_writer.writeheader()
+            self._csv_writer.writerows(self._buffer)
+            self._file.flush()
+
+        metrics.observe('report_write', time.perf_counter() - started, rows=len(self._buffer),
+                        nbytes=os.path.getsize(self.report_path) - size_before)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        """Vide le tampon et ferme le rapport détaillé."""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def summary(self):
+        """Synthèse par produit calculée à partir des compteurs (None si aucun contrat)."""
+        if not self.status_counts:
+            return None
+        return build_summary(self.status_counts)
+
+    def _cap_details(self, row):
+        details = row.get('Details')
+        if details is None or len(str(details)) <= self.max_details_chars:
+            return details
+
+        # Différentiel volumineux : fichier annexe + aperçu dans le rapport
+        os.makedirs(self.details_dir, exist_ok=True)
+        self._spill_seq += 1
+        table = str(row.get('Table', '')).replace('.', '_')
+        filename = f"{self._spill_seq:06d}_{row.get('Reference_Contract', '')}_{table}.txt"
+        with open(os.path.join(self.details_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(str(details))
+
+        preview = str(details)[:min(1000, self.max_details_chars)]
+        return f"{preview}\n... [différentiel complet : {os.path.join(os.path.basename(self.details_dir), filename)}]"
@@ -0,0 +1,103 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+
+from config.settings import RESULT_CACHE_CONFIG
+from src.comparator import PLAN_VERSION
+from src.fingerprint import frame_checksum
+
+logger = logging.getLogger(__name__)
+
+
+def content_checksum(df):
+    """
+    Somme de contrôle du contenu d'un DataFrame : celle du manifeste pour un snapshot relu et vérifié
+    (SnapshotReader.load), recalculée sinon.
+    """
+    return df.attrs.get('checksum') or frame_checksum(df)
+
+
+def result_key(table_name, df_ref, df_new):
+    """
+    Clé de cache d'une comparaison : (table, empreinte source, empreinte cible, version du plan).
+    Toute modification d'une donnée comparée, ou des règles de comparaison (PLAN_VERSION), change la clé.
+    """
+    raw = f"{PLAN_VERSION}|{table_name}|{content_checksum(df_ref)}|{content_checksum(df_new)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache persistant (SQLite) des résultats de comparaison, d'une exécution à l'autre.
+
+    Lors des relances J+7 d'un même cycle de recette, la plupart des couples (snapshot, table cible)
+    n'ont pas bougé : leur statut et leur différentiel sérialisé sont relus au lieu d'être recalculés.
+    Le cache est borné (MAX_ENTRIES) : les entrées les moins récemment utilisées sont évincées.
+    Utilisable depuis plusieurs threads (connexion partagée protégée par un verrou).
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or RESULT_CACHE_CONFIG['PATH']
+        self.max_entries = max_entries or RESULT_CACHE_CONFIG.get('MAX_ENTRIES', 200000)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                details TEXT,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Retourne (statut, détails sérialisés) ou None si le résultat n'est pas en cache."""
+        with self._lock:
+            row = self.conn.execute("SELECT status, details FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0], row[1]
+
+    def put(self, key, status, details):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, str(status), None if details is None else str(details), time.time())
+            )
+
+    def commit(self):
+        """Rend durables les écritures en attente (appelé une fois par bloc)."""
+        with self._lock:
+            self.conn.commit()
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de MAX_ENTRIES."""
+        with self._lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used ASC LIMIT ?)",
+                    (excess,)
+                )
+                logger.info(f"Cache de résultats : {excess} entrée(s) évincée(s) (limite {self.max_entries}).")
+            self.conn.commit()
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,416 @@
+import os
+import glob
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from config.settings import SNAPSHOT_DIR, SNAPSHOT_CONFIG
+from src.fingerprint import schema_hash, frame_checksum, CHECKSUM_VERSION
+from src.metrics import metrics
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow absent : seul l'ancien format Pickle est disponible
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+RUNS_DIRNAME = 'runs'
+INDEX_FILENAME = 'index.jsonl'
+# Métadonnée de schéma Arrow listant les colonnes catégorielles (snapshots écrits avec les catégories)
+CATEGORICAL_METADATA_KEY = b'snapshot_categorical_columns'
+
+
+def without_categories(df):
+    """
+    DataFrame dont les colonnes catégorielles (types compacts, voir src/dtypes.py) sont remplacées par leurs
+    valeurs. Un fichier Arrow IPC n'admet qu'un seul dictionnaire par colonne pour tous ses record batches,
+    alors que chaque contrat a ses propres catégories : les snapshots ne gardent donc que les valeurs.
+    """
+    categorical = [col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.astype({col: df[col].cat.categories.dtype for col in categorical})
+
+
+def frame_to_record_batch(df):
+    """Record batch Arrow d'un DataFrame de snapshot (colonnes catégorielles écrites en valeurs simples)."""
+    return pa.RecordBatch.from_pandas(without_categories(df), preserve_index=False)
+
+
+def record_batch_to_frame(batch):
+    """DataFrame d'un record batch de snapshot, avec ses types d'origine."""
+    # Les métadonnées pandas du schéma restaurent les types exacts du DataFrame d'origine
+    df = pa.Table.from_batches([batch]).to_pandas()
+    # Snapshots écrits avec les catégories : elles sont reconstruites pour que la somme de contrôle corresponde
+    categorical = json.loads((batch.schema.metadata or {}).get(CATEGORICAL_METADATA_KEY, b'[]'))
+    if categorical:
+        df = df.astype({col: 'category' for col in categorical})
+    return df
+
+
+class SnapshotWriter:
+    """
+    Écriture des snapshots J0 d'une exécution de run_activation.
+
+    Format 'arrow' : pour chaque bloc de contrats et chaque table, un fichier Arrow IPC (Feather v2)
+    compressé est écrit sous runs/<run_id>/<table>/. Chaque contrat y occupe son propre record batch,
+    ce qui permet au lecteur de n'en décompresser qu'un seul. Les contrats dont les types diffèrent
+    (ex: colonne entièrement NULL) sont répartis dans des fichiers distincts, un par schéma, afin que
+    chaque DataFrame relu ait exactement les types d'origine.
+
+    Chaque (contrat, table) est consigné dans le manifeste du run (runs/<run_id>/index.jsonl) :
+    emplacement, nombre de lignes, taille en octets, empreinte du schéma et somme de contrôle du contenu.
+    Le comparateur s'en sert pour planifier son travail et détecter les snapshots absents ou corrompus.
+
+    Format 'pickle' (ou pyarrow absent, ou DataFrame non convertible en Arrow) : un fichier .pkl par
+    contrat et par table, lui aussi rangé sous runs/<run_id>/<table>/ et consigné dans le manifeste.
+    Les fichiers .pkl à la racine du dossier des snapshots sont ceux des anciens runs, sans manifeste.
+    """
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, run_id=None, file_format=None, compression=None):
+        self.snapshot_dir = snapshot_dir
+        self.file_format = file_format or SNAPSHOT_CONFIG.get('FORMAT', 'arrow')
+        self.compression = compression if compression is not None else SNAPSHOT_CONFIG.get('COMPRESSION')
+
+        if self.file_format == 'arrow' and pa is None:
+            logger.warning("pyarrow n'est pas installé : les snapshots seront écrits au format Pickle.")
+            self.file_format = 'pickle'
+
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.run_dir = os.path.join(snapshot_dir, RUNS_DIRNAME, self.run_id)
+        self._part_seq = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    def write_block(self, table_name, frames, server_checksums=None):
+        """
+        Sauvegarde une table pour un bloc de contrats.
+
+        Les contrats peuvent être fournis en flux (ex: DatabaseManager.iter_table_batch) : chacun est
+        écrit dans son fichier dès sa réception, sans attendre le reste du bloc.
+
+        Args:
+            table_name (str): Nom de la table (ex: 'LV.SCNTT0').
+            frames (dict ou iterable): {contract_ext: pd.DataFrame} ou itérable de (contract_ext, pd.DataFrame).
+            server_checksums (tuple): Optionnel, (définition, {contract_ext: (nb_lignes, somme)}) tel que
+                                      calculé par DatabaseManager.get_table_checksums. Consigné dans le manifeste
+                                      pour la comparaison par sommes de contrôle (run_comparison.py --pushdown).
+        """
+        items = frames.items() if isinstance(frames, dict) else frames
+        entries = []
+
+        if self.file_format != 'arrow':
+            for contract_ext, df in items:
+                with metrics.timer('snapshot_save', table_name) as measure:
+                    entry = self._write_pickle(contract_ext, table_name, df)
+                    measure['rows'], measure['bytes'] = entry['rows'], entry['bytes']
+                entries.append(entry)
+            self._append_index(self._with_server_checksums(entries, server_checksums))
+            return
+
+        table_dir = os.path.join(self.run_dir, table_name)
+        os.makedirs(table_dir, exist_ok=True)
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+
+        # Un fichier ouvert par schéma Arrow (types + métadonnées) : un fichier IPC n'accepte qu'un seul schéma
+        open_parts = {}
+        try:
+            for contract_ext, df in items:
+                save_started = time.perf_counter()
+                # Somme de contrôle et schéma du manifeste calculés sur le DataFrame tel qu'il sera relu
+                df = without_categories(df)
+                try:
+                    batch = frame_to_record_batch(df)
+                except Exception as e:
+                    # Types mixtes non convertibles : on garde le Pickle pour ce seul DataFrame
+                    logger.warning(f"   [!] Conversion Arrow impossible ({contract_ext}, {table_name}), repli Pickle : {e}")
+                    entries.append(self._write_pickle(contract_ext, table_name, df))
+                    metrics.observe('snapshot_save', time.perf_counter() - save_started, table_name,
+                                    entries[-1]['rows'], entries[-1]['bytes'])
+                    continue
+
+                arrow_schema_key = hashlib.sha1(batch.schema.serialize().to_pybytes()).hexdigest()[:12]
+                part = open_parts.get(arrow_schema_key)
+                if part is None:
+                    with self._lock:
+                        self._part_seq += 1
+                        part_seq = self._part_seq
+                    filename = f"part-{part_seq:06d}-{arrow_schema_key}.arrow"
+                    sink = pa.OSFile(os.path.join(table_dir, filename), 'wb')
+                    part = open_parts[arrow_schema_key] = {
+                        'sink': sink,
+                        'writer': pa.ipc.new_file(sink, batch.schema, options=options),
+                        'file': os.path.join(table_name, filename),
+                        'batches': 0
+                    }
+
+                part['writer'].write_batch(batch)
+                entries.append(self._manifest_entry(
+                    contract_ext, table_name, df, 'arrow', part['file'], batch.nbytes, batch=part['batches']
+                ))
+                part['batches'] += 1
+                metrics.observe('snapshot_save', time.perf_counter() - save_started, table_name, len(df), batch.nbytes)
+        finally:
+            for part in open_parts.values():
+                part['writer'].close()
+                part['sink'].close()
+
+        self._append_index(self._with_server_checksums(entries, server_checksums))
+
+    @staticmethod
+    def _with_server_checksums(entries, server_checksums):
+        if not server_checksums:
+            return entries
+        definition, values = server_checksums
+        for entry in entries:
+            value = values.get(entry['contract'])
+            # Contrôle de cohérence : la somme n'est gardée que si elle porte sur les lignes sauvegardées
+            if value is not None and value[0] == entry['rows']:
+                entry['server_checksum'] = {'definition': definition, 'rows': value[0], 'value': value[1]}
+        return entries
+
+    def _write_pickle(self, contract_ext, table_name, df):
+        # Sauvegarde au format Pickle (garde les types exacts : dates, float...)
+        # Dans le dossier du run, comme les fichiers Arrow : un autre run ne peut pas l'écraser
+        table_dir = os.path.join(self.run_dir, table_name)
+        os.makedirs(table_dir, exist_ok=True)
+        path = os.path.join(table_dir, f"{contract_ext}.pkl")
+        df.to_pickle(path)
+        return self._manifest_entry(
+            contract_ext, table_name, df, 'pickle', os.path.relpath(path, self.run_dir), os.path.getsize(path)
+        )
+
+    @staticmethod
+    def _manifest_entry(contract_ext, table_name, df, file_format, file, nbytes, batch=None):
+        entry = {
+            'contract': str(contract_ext),
+            'table': table_name,
+            'format': file_format,
+            'file': file,
+            'rows': len(df),
+            'bytes': int(nbytes),
+            'schema_hash': schema_hash(df),
+            'checksum': frame_checksum(df),
+            'checksum_version': CHECKSUM_VERSION
+        }
+        if batch is not None:
+            entry['batch'] = batch
+        return entry
+
+    def _append_index(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            os.makedirs(self.run_dir, exist_ok=True)
+            # Ajout en fin de fichier : un crash en cours de run ne perd que le bloc en cours
+            with open(os.path.join(self.run_dir, INDEX_FILENAME), 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+
+
+class SnapshotReader:
+    """
+    Lecture des snapshots J0 pour le comparateur.
+
+    Les manifestes de toutes les exécutions sont chargés une seule fois en mémoire (le run le plus
+    récent l'emporte pour un même contrat) ; les anciens fichiers Pickle sans manifeste sont recensés
+    en un seul parcours du dossier. Toute question "ce snapshot existe-t-il, combien de lignes ?"
+    est ensuite une simple recherche dans un dictionnaire, sans accès disque.
+
+    La lecture d'un (contrat, table) ouvre le fichier Arrow en memory-map et ne décompresse que le
+    record batch du contrat, sans parcourir les autres. La somme de contrôle du manifeste, calculée une
+    seule fois à l'écriture, est vérifiée sur demande (load(..., verify=True)) et sur un échantillon
+    des lectures (verify_sample, toujours les mêmes (contrat, table)) : un snapshot altéré est traité
+    comme absent. La cohérence structurelle des fichiers est contrôlée pour tous par plan().
+    """
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, max_open_files=None, verify_sample=None):
+        self.snapshot_dir = snapshot_dir
+        self.max_open_files = max_open_files or SNAPSHOT_CONFIG.get('MAX_OPEN_FILES', 64)
+        self.verify_sample = verify_sample if verify_sample is not None else SNAPSHOT_CONFIG.get('VERIFY_SAMPLE', 0.0)
+        self.index = self._load_index()
+        self._open_files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        index = {}
+
+        # Anciens runs : un fichier Pickle par contrat et par table, sans manifeste
+        if os.path.isdir(self.snapshot_dir):
+            for dir_entry in os.scandir(self.snapshot_dir):
+                if not dir_entry.is_file() or not dir_entry.name.endswith('.pkl'):
+                    continue
+                contract_ext, _, table_name = dir_entry.name[:-len('.pkl')].rpartition('_')
+                index[(contract_ext, table_name)] = {
+                    'contract': contract_ext, 'table': table_name, 'format': 'pickle', 'path': dir_entry.path
+                }
+
+        # Runs avec manifeste : les run_id commencent par un horodatage, l'ordre alphabétique est chronologique
+        pattern = os.path.join(self.snapshot_dir, RUNS_DIRNAME, '*', INDEX_FILENAME)
+        for index_path in sorted(glob.glob(pattern)):
+            run_dir = os.path.dirname(index_path)
+            with open(index_path, encoding='utf-8') as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par un crash de run_activation
+                        logger.warning(f"   [!] Ligne {line_number} illisible dans le manifeste {index_path}.")
+                        continue
+                    entry['path'] = os.path.normpath(os.path.join(run_dir, entry['file']))
+                    index[(entry['contract'], entry['table'])] = entry
+
+        if index:
+            logger.info(f"Index des snapshots chargé : {len(index)} entrée(s) (contrat, table).")
+        return index
+
+    def fingerprint(self):
+        """
+        Identité des snapshots connus : (contrat, table) et somme de contrôle de chacun (à défaut, fichier).
+        Change dès qu'un run est ajouté, complété ou supprimé. À calculer avant plan(), qui retire les corrompus.
+        """
+        digest = hashlib.sha1()
+        for key in sorted(self.index):
+            entry = self.index[key]
+            digest.update(f"{key[0]}|{key[1]}|{entry.get('checksum') or entry['path']}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_entry(self, contract_ext, table_name):
+        """Entrée du manifeste d'un (contrat, table), ou None si aucun snapshot n'est connu."""
+        return self.index.get((str(contract_ext), table_name))
+
+    def has(self, contract_ext, table_name):
+        return (str(contract_ext), table_name) in self.index
+
+    def plan(self, contracts, tables):
+        """
+        Planifie une campagne de comparaison à partir du manifeste, avant toute requête.
+
+        Vérifie pour chaque (contrat, table) que le snapshot est présent et structurellement sain
+        (fichier présent, taille cohérente pour les Pickle, record batch présent pour les fichiers Arrow).
+        Les snapshots corrompus sont retirés de l'index : ils basculeront en mode dégradé (Live).
+
+        Returns:
+            dict: {'available', 'missing', 'corrupt' (liste de (contrat, table, raison)), 'rows', 'bytes'}
+        """
+        summary = {'available': 0, 'missing': 0, 'corrupt': [], 'rows': 0, 'bytes': 0}
+        file_checks = {}
+
+        for contract_ext in dict.fromkeys(str(c) for c in contracts):
+            for table_name in tables:
+                entry = self.index.get((contract_ext, table_name))
+                if entry is None:
+                    summary['missing'] += 1
+                    continue
+
+                # Un fichier Arrow est partagé par tout un bloc de contrats : on ne l'ouvre qu'une fois
+                if entry['path'] not in file_checks:
+                    file_checks[entry['path']] = self._check_file(entry)
+                problem, num_batches = file_checks[entry['path']]
+                if problem is None and entry['format'] == 'arrow' and entry['batch'] >= num_batches:
+                    problem = "record batch absent du fichier"
+
+                if problem is not None:
+                    summary['corrupt'].append((contract_ext, table_name, problem))
+                    del self.index[(contract_ext, table_name)]
+                    continue
+
+                summary['available'] += 1
+                summary['rows'] += entry.get('rows', 0)
+                summary['bytes'] += entry.get('bytes', 0)
+
+        return summary
+
+    def _check_file(self, entry):
+        """Contrôle structurel d'un fichier de snapshot. Retourne (problème ou None, nombre de record batches)."""
+        if not os.path.exists(entry['path']):
+            return "fichier introuvable", 0
+
+        if entry['format'] == 'pickle':
+            if 'bytes' in entry and os.path.getsize(entry['path']) != entry['bytes']:
+                return "taille différente de celle du manifeste", 0
+            return None, 0
+
+        if pa is None:
+            return "pyarrow non installé", 0
+        try:
+            # Seul le pied de fichier (footer) est lu : aucune donnée n'est décompressée
+            return None, pa.ipc.open_file(pa.memory_map(entry['path'], 'r')).num_record_batches
+        except Exception as e:
+            return f"fichier Arrow illisible ({e})", 0
+
+    def _sampled(self, contract_ext, table_name):
+        """Le (contrat, table) fait-il partie de l'échantillon vérifié ? Tirage déterministe d'une exécution à l'autre."""
+        if self.verify_sample >= 1:
+            return True
+        if self.verify_sample <= 0:
+            return False
+        return zlib.crc32(f"{contract_ext}|{table_name}".encode('utf-8')) < self.verify_sample * 2 ** 32
+
+    def load(self, contract_ext, table_name, verify=None):
+        """
+        Charge le snapshot d'un contrat pour une table.
+        Retourne None si le snapshot est absent, illisible ou (s'il est vérifié) ne correspond pas à sa
+        somme de contrôle. `verify` : True / False pour forcer ou éviter la vérification, None pour
+        s'en remettre à l'échantillonnage (verify_sample).
+        """
+        entry = self.get_entry(contract_ext, table_name)
+        if entry is None:
+            return None
+
+        try:
+            with metrics.timer('snapshot_load', table_name) as measure:
+                if entry['format'] == 'pickle':
+                    df = pd.read_pickle(entry['path'])
+                else:
+                    df = self._read_arrow_batch(entry['path'], entry['batch'])
+                measure['rows'], measure['bytes'] = len(df), entry.get('bytes', 0)
+        except Exception as e:
+            logger.warning(f"   [!] Erreur de lecture du snapshot {entry['path']} : {e}")
+            return None
+
+        if 'checksum' in entry:
+            if verify is None:
+                verify = self._sampled(contract_ext, table_name)
+            if verify:
+                checksum_version = entry.get('checksum_version', 1)
+                if frame_checksum(df, checksum_version) != entry['checksum']:
+                    logger.warning(f"   [!] Snapshot corrompu ({contract_ext}, {table_name}) : somme de contrôle invalide.")
+                    return None
+                # Somme vérifiée, réutilisable par l'appelant sans nouveau calcul (cache de résultats).
+                # Jamais pour une lecture non vérifiée : un snapshot altéré garderait la clé de l'original.
+                if checksum_version == CHECKSUM_VERSION:
+                    df.attrs['checksum'] = entry['checksum']
+        return df
+
+    def _read_arrow_batch(self, path, batch_index):
+        if pa is None:
+            raise RuntimeError("pyarrow est requis pour relire les snapshots au format Arrow.")
+
+        with self._lock:
+            reader = self._open_files.get(path)
+            if reader is None:
+                reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+                self._open_files[path] = reader
+                # Nombre de fichiers ouverts borné (LRU)
+                if len(self._open_files) > self.max_open_files:
+                    self._open_files.popitem(last=False)
+            else:
+                self._open_files.move_to_end(path)
+
+        # Lecture et décompression hors verrou : les chargements des threads de comparaison restent parallèles.
+        # Le lecteur (memory-map) accepte les lectures concurrentes, et reste utilisable même s'il vient
+        # d'être évincé du LRU par un autre thread (il n'est fermé qu'une fois plus référencé).
+        batch = reader.get_batch(batch_index)
+        return record_batch_to_frame(batch)
@@ -0,0 +1,92 @@
+import re
+import logging
+from functools import lru_cache
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+from config.settings import DB_POOL_CONFIG
+from src.database import DatabaseManager
+from src.checksum import register_sqlite_functions
+
+logger = logging.getLogger(__name__)
+
+_NOLOCK = re.compile(r"\s+WITH\s*\(\s*NOLOCK\s*\)", re.IGNORECASE)
+_TOP = re.compile(r"\bSELECT\s+TOP\s+(\d+)\s+", re.IGNORECASE)
+_MAX_LENGTH = re.compile(r"\(\s*MAX\s*\)", re.IGNORECASE)
+_BINARY_TO_INT = re.compile(r"\bCAST\((SUBSTRING\([^()]*\)) AS INT\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def to_sqlite_sql(statement):
+    """
+    Traduit les quelques tournures SQL Server des requêtes du projet en SQL SQLite :
+    suppression des indicateurs WITH (NOLOCK), SELECT TOP n -> SELECT ... LIMIT n, NVARCHAR(MAX) -> NVARCHAR,
+    CAST(SUBSTRING(...) AS INT) -> BINARY_TO_INT(SUBSTRING(...)) (CAST d'un BLOB en entier non pris en charge).
+    """
+    statement = _NOLOCK.sub("", statement)
+    statement = _MAX_LENGTH.sub("", statement)
+    statement = _BINARY_TO_INT.sub(r"BINARY_TO_INT(\1)", statement)
+    match = _TOP.search(statement)
+    if match:
+        statement = _TOP.sub("SELECT ", statement, count=1).rstrip().rstrip(';') + f" LIMIT {match.group(1)}"
+    return statement
+
+
+class SQLiteDatabaseManager(DatabaseManager):
+    """
+    DatabaseManager sur une base SQLite locale, pour les bancs d'essai hors ligne (run_benchmark.py).
+
+    Le fichier SQLite est attaché sous le nom LV : les requêtes du registre (sql/queries.py), les sommes
+    de contrôle (src/checksum.py) et l'INSERT de paiement s'exécutent sans modification, à la traduction
+    près des tournures SQL Server (voir to_sqlite_sql). Toutes les autres méthodes (lecture en flux,
+    sessions par thread, statistiques du pool...) sont celles de DatabaseManager.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        super().__init__()
+
+    def _create_db_engine(self):
+        engine = create_engine(
+            "sqlite://",
+            poolclass=QueuePool,
+            pool_size=DB_POOL_CONFIG.get('POOL_SIZE', 5),
+            max_overflow=DB_POOL_CONFIG.get('MAX_OVERFLOW', 10),
+            pool_timeout=DB_POOL_CONFIG.get('TIMEOUT', 30),
+            connect_args={'check_same_thread': False}
+        )
+
+        @event.listens_for(engine, "connect")
+        def _attach_lv(dbapi_connection, connection_record):
+            dbapi_connection.execute("ATTACH DATABASE ? AS LV", (self.path,))
+            dbapi_connection.execute("PRAGMA LV.journal_mode=WAL")
+            register_sqlite_functions(dbapi_connection)
+
+        @event.listens_for(engine, "before_cursor_execute", retval=True)
+        def _translate(conn, cursor, statement, parameters, context, executemany):
+            return to_sqlite_sql(statement), parameters
+
+        return engine
+
+    def get_table_columns(self, table_name):
+        """Colonnes et types d'une table (PRAGMA table_info au lieu d'INFORMATION_SCHEMA), gardés en cache."""
+        with self._columns_lock:
+            if table_name in self._columns_cache:
+                return self._columns_cache[table_name]
+
+        schema, _, table = table_name.rpartition('.')
+        try:
+            with self._connection() as connection:
+                rows = connection.exec_driver_sql(f"PRAGMA {schema or 'main'}.table_info({table})").fetchall()
+        except SQLAlchemyError as e:
+            logger.error(f"Métadonnées SQLite inaccessibles pour {table_name} : {e}")
+            return []
+
+        # DECIMAL(15,2) -> 'decimal' : même forme que DATA_TYPE dans INFORMATION_SCHEMA
+        columns = [(row[1], row[2].split('(')[0].strip().lower()) for row in rows]
+        if columns:
+            with self._columns_lock:
+                self._columns_cache[table_name] = columns
+        return columns
@@ -0,0 +1,335 @@
+import os
+import json
+import logging
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from config.exclusions import IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS, TABLE_KEYS
+
+logger = logging.getLogger(__name__)
+
+# GÉNÉRATEUR DE DONNÉES SYNTHÉTIQUES LV.* (BANCS D'ESSAI HORS LIGNE)
+
+# Schéma des 8 tables comparées : (colonne, type SQL, générateur). Les colonnes utilisées par les requêtes
+# (filtres, ORDER BY, INSERT du paiement d'activation) et les colonnes techniques exclues de la
+# comparaison sont reprises telles quelles ; des colonnes métier génériques élargissent ensuite chaque
+# table à une largeur réaliste (voir TABLE_WIDTHS).
+#
+# Générateurs : 'id' (NO_CNT), 'external' (numéro de police), 'product', 'seq' (rang dans le contrat),
+# 'code', 'amount', 'rate', 'date', 'text', 'int', 'zero', 'iban', 'bic', 'const:<texte>'.
+# Générateurs techniques, différents entre source et cible (colonnes exclues) : 'created', 'tstamp', 'author', 'filler'.
+TECHNICAL_COLUMNS = [
+    ('D_CRT', 'DATE', 'created'),
+    ('TSTAMP_DMOD', 'VARCHAR(26)', 'tstamp'),
+    ('NM_AUTEUR_CRT', 'VARCHAR(8)', 'author'),
+    ('NM_AUTEUR_DMOD', 'VARCHAR(8)', 'author'),
+    ('TY_DMOD', 'CHAR(1)', 'const:O'),
+]
+
+TABLE_SCHEMAS = {
+    'LV.SCNTT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('NO_CNT_EXTENDED', 'VARCHAR(20)', 'external'),
+        ('C_PROP_PRINC', 'CHAR(6)', 'product'), ('NO_POLICE_PAPIER', 'VARCHAR(12)', 'text'),
+        ('NO_BUR_INTRO', 'INTEGER', 'int'), ('NO_BUR_INT_GES', 'INTEGER', 'int'),
+        ('D_EFFET_CNT', 'DATE', 'date'), ('C_ETAT_CNT', 'CHAR(2)', 'code'), ('M_PRIME_ANN', 'DECIMAL(15,2)', 'amount'),
+        ('T_FILLER_30', 'CHAR(30)', 'filler'),
+    ],
+    'LV.SAVTT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('NO_AVT', 'INTEGER', 'seq'),
+        ('NO_AVT_REF', 'INTEGER', 'seq'), ('D_EFFET_AVT', 'DATE', 'date'), ('C_TY_AVT', 'CHAR(2)', 'code'),
+        ('M_PRIME_AVT', 'DECIMAL(15,2)', 'amount'), ('T_FILLER_20', 'CHAR(20)', 'filler'),
+    ],
+    'LV.PRCTT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('C_MD_PMT', 'CHAR(1)', 'code'),
+        ('D_REF_PRM', 'DATE', 'date'), ('NO_ORD_RCP', 'INTEGER', 'seq'), ('TSTAMP_CRT_RCT', 'VARCHAR(26)', 'date'),
+        ('C_TY_RCT', 'CHAR(1)', 'code'), ('D_BISM_DVA', 'DATE', 'date'), ('D_BISM_DCOR', 'DATE', 'date'),
+        ('M_PAY', 'DECIMAL(15,2)', 'amount'), ('NM_CP', 'VARCHAR(30)', 'text'), ('T_ADR_1_CP', 'VARCHAR(30)', 'text'),
+        ('T_ADR_2_CP', 'VARCHAR(30)', 'text'), ('C_ETAT_RCP', 'CHAR(1)', 'code'), ('T_COMMU', 'VARCHAR(20)', 'text'),
+        ('NO_BUR_SERV', 'VARCHAR(5)', 'const:12831'), ('NO_AVT', 'INTEGER', 'zero'), ('PC_COM', 'DECIMAL(7,4)', 'rate'),
+        ('PC_FR_GEST', 'DECIMAL(7,4)', 'rate'), ('NO_IBAN_CP', 'VARCHAR(34)', 'iban'), ('C_BIC_CP', 'VARCHAR(11)', 'bic'),
+        ('D_ORGN_DEV', 'DATE', 'date'), ('C_ORGN_DEV', 'CHAR(3)', 'const:EUR'),
+    ],
+    'LV.SWBGT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('NO_AVT', 'INTEGER', 'seq'),
+        ('C_PROP', 'CHAR(6)', 'product'), ('M_CAPITAL', 'DECIMAL(15,2)', 'amount'), ('PC_TAUX', 'DECIMAL(7,4)', 'rate'),
+    ],
+    'LV.SCLST0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('NO_AVT', 'INTEGER', 'seq'),
+        ('NO_ORD_CLS', 'INTEGER', 'seq'), ('C_TY_CLS', 'CHAR(2)', 'code'), ('T_CLAUSE', 'VARCHAR(60)', 'text'),
+    ],
+    'LV.SCLRT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('NO_AVT', 'INTEGER', 'seq'),
+        ('NO_ORD_CLS', 'INTEGER', 'seq'), ('NO_ORD_RNG', 'INTEGER', 'seq'), ('NM_BENEF', 'VARCHAR(30)', 'text'),
+        ('PC_REPART', 'DECIMAL(7,4)', 'rate'),
+    ],
+    'LV.BSPDT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('D_REF_MVT_EPA', 'DATE', 'date'),
+        ('NO_ORD_TRF_EPA', 'INTEGER', 'seq'), ('NO_ORD_MVT_EPA', 'INTEGER', 'seq'), ('NO_ORD_QUITT', 'INTEGER', 'seq'),
+        ('NO_ORD_MVT_ANNUL', 'INTEGER', 'zero'), ('D_STA_IMPR', 'DATE', 'date'), ('C_STA_IMPR', 'CHAR(1)', 'code'),
+        ('C_TY_MVT', 'CHAR(2)', 'code'), ('M_MVT', 'DECIMAL(15,2)', 'amount'), ('T_FILLER_84', 'CHAR(84)', 'filler'),
+    ],
+    'LV.BSPGT0': [
+        ('C_STE', 'CHAR(1)', 'const:A'), ('NO_CNT', 'INTEGER', 'id'), ('D_REF_MVT_EPA', 'DATE', 'date'),
+        ('NO_ORD_TRF_EPA', 'INTEGER', 'seq'), ('C_FONDS', 'CHAR(6)', 'code'), ('M_UNITES', 'DECIMAL(15,4)', 'rate'),
+        ('M_VALEUR', 'DECIMAL(15,2)', 'amount'),
+    ],
+}
+
+# Largeur cible (nombre de colonnes) de chaque table, atteinte avec des colonnes métier génériques
+TABLE_WIDTHS = {
+    'LV.SCNTT0': 80, 'LV.SAVTT0': 60, 'LV.PRCTT0': 40, 'LV.SWBGT0': 45,
+    'LV.SCLST0': 20, 'LV.SCLRT0': 20, 'LV.BSPDT0': 35, 'LV.BSPGT0': 25,
+}
+
+# Nombre de lignes par contrat : f(générateur aléatoire, nombre de contrats) -> tableau d'entiers.
+# Historiques financiers à queue lourde (quelques contrats très anciens ont des centaines de lignes).
+ROW_DISTRIBUTIONS = {
+    'LV.SCNTT0': lambda rng, n: np.ones(n, dtype=int),
+    'LV.SAVTT0': lambda rng, n: rng.geometric(0.4, n),
+    'LV.PRCTT0': lambda rng, n: np.clip(rng.lognormal(2.8, 0.8, n), 1, 600).astype(int),
+    'LV.SWBGT0': lambda rng, n: 1 + rng.poisson(2, n),
+    'LV.SCLST0': lambda rng, n: 1 + rng.poisson(1, n),
+    'LV.SCLRT0': lambda rng, n: rng.poisson(2, n),
+    'LV.BSPDT0': lambda rng, n: np.clip(rng.lognormal(3.2, 1.0, n), 0, 2000).astype(int),
+    'LV.BSPGT0': lambda rng, n: rng.poisson(6, n),
+}
+
+# Écarts injectés dans les contrats cibles : (type, probabilité relative)
+DIFF_KINDS = (('value', 0.7), ('missing_row', 0.15), ('extra_row', 0.15))
+
+PRODUCTS = np.array(['VIE01 ', 'EPA02 ', 'TAK03 ', 'PEN04 ', 'INV05 '])
+CODES = np.array(['A', 'B', 'C', 'D', 'E ', 'F ', 'G', 'H'])
+WORDS = np.array(['RUE', 'AVENUE', 'DU', 'TEST', 'BRUXELLES', 'LIEGE', 'GAND', 'NAMUR', 'CLAUSE', 'BENEFICIAIRE'])
+SOURCE_ID_OFFSET = 1_000_000
+TARGET_ID_OFFSET = 5_000_000
+
+
+def table_schema(table_name):
+    """Schéma complet d'une table synthétique : colonnes de TABLE_SCHEMAS, techniques, puis génériques."""
+    columns = list(TABLE_SCHEMAS[table_name])
+    names = {name for name, _, _ in columns}
+    columns += [column for column in TECHNICAL_COLUMNS if column[0] not in names]
+
+    generic_kinds = (('C_OPT', 'CHAR(2)', 'code'), ('M_MNT', 'DECIMAL(15,2)', 'amount'),
+                     ('T_LIB', 'VARCHAR(40)', 'text'), ('D_DATE', 'DATE', 'date'), ('PC_TX', 'DECIMAL(7,4)', 'rate'))
+    index = 0
+    while len(columns) < TABLE_WIDTHS.get(table_name, len(columns)):
+        prefix, sql_type, kind = generic_kinds[index % len(generic_kinds)]
+        columns.append((f"{prefix}_{index // len(generic_kinds) + 1:02d}", sql_type, kind))
+        index += 1
+    return columns
+
+
+def compared_columns(table_name):
+    """Colonnes synthétiques comparées (hors exclusions et clés), candidates aux écarts de valeur injectés."""
+    excluded = set(IGNORE_COLUMNS) | set(SPECIFIC_EXCLUSIONS.get(table_name, [])) | set(TABLE_KEYS.get(table_name, []))
+    return [(name, kind) for name, _, kind in table_schema(table_name)
+            if name not in excluded and kind in ('amount', 'code', 'text', 'rate')]
+
+
+def _column_values(kind, rng, ids, ranks, externals, side):
+    """Valeurs d'une colonne pour toutes les lignes d'un lot (vectorisé)."""
+    n = len(ids)
+    if kind.startswith('const:'):
+        return np.full(n, kind[len('const:'):], dtype=object)
+    if kind == 'zero':
+        return np.zeros(n, dtype=int)
+    if kind == 'id':
+        return ids
+    if kind == 'external':
+        return externals
+    if kind == 'product':
+        return PRODUCTS[ids % len(PRODUCTS)]
+    if kind == 'seq':
+        return ranks + 1
+    if kind == 'int':
+        return rng.integers(1, 99999, n)
+    if kind == 'code':
+        return CODES[rng.integers(0, len(CODES), n)]
+    if kind == 'amount':
+        return np.round(rng.lognormal(5, 1.2, n), 2)
+    if kind == 'rate':
+        return np.round(rng.random(n) * 0.1, 4)
+    if kind == 'date':
+        days = rng.integers(0, 3650, n) + ranks * 30
+        return (pd.Timestamp('2010-01-01') + pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d').to_numpy()
+    if kind == 'text':
+        first = WORDS[rng.integers(0, len(WORDS), n)]
+        second = WORDS[rng.integers(0, len(WORDS), n)]
+        # Champs CHAR complétés d'espaces, comme en base
+        return np.char.ljust(np.char.add(np.char.add(first, ' '), second), 24).astype(object)
+    if kind == 'iban':
+        return np.char.add('BE', (ids % 10**14).astype(str)).astype(object)
+    if kind == 'bic':
+        return np.full(n, 'GEBABEBB', dtype=object)
+    # Colonnes techniques : différentes entre source (J0) et cible (créée plus tard par un autre batch)
+    if kind == 'created':
+        return np.full(n, '2024-01-01' if side == 'source' else '2024-03-15', dtype=object)
+    if kind == 'tstamp':
+        return np.full(n, '2024-01-01 08:00:00.000000' if side == 'source' else '2024-03-15 22:30:00.000000', dtype=object)
+    if kind == 'author':
+        return np.full(n, 'SRC_USR' if side == 'source' else 'BATCH', dtype=object)
+    if kind == 'filler':
+        return np.full(n, '', dtype=object)
+    raise ValueError(f"Générateur inconnu : {kind}")
+
+
+def generate_table(table_name, rng, contract_numbers, counts):
+    """
+    Lignes source d'une table pour un lot de contrats (DataFrame, colonnes dans l'ordre du schéma).
+
+    Args:
+        contract_numbers (np.ndarray): Index des contrats du lot (0..N-1).
+        counts (np.ndarray): Nombre de lignes de chaque contrat.
+    """
+    ids = np.repeat(contract_numbers + SOURCE_ID_OFFSET, counts)
+    # Rang de chaque ligne dans son contrat (0, 1, 2... puis on repart à 0 au contrat suivant)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    ranks = np.arange(len(ids)) - starts
+    externals = np.char.add('S', np.char.zfill((ids - SOURCE_ID_OFFSET).astype(str), 9)).astype(object)
+
+    return pd.DataFrame({
+        name: _column_values(kind, rng, ids, ranks, externals, 'source')
+        for name, _, kind in table_schema(table_name)
+    })
+
+
+def _target_rows(table_name, df_source, rng):
+    """Copie cible d'une table : même contenu métier, identifiants et colonnes techniques du nouveau contrat."""
+    df_target = df_source.copy()
+    df_target['NO_CNT'] = df_target['NO_CNT'] - SOURCE_ID_OFFSET + TARGET_ID_OFFSET
+    for name, _, kind in table_schema(table_name):
+        if kind == 'external':
+            df_target[name] = 'T' + df_target[name].str[1:]
+        elif kind in ('created', 'tstamp', 'author'):
+            df_target[name] = _column_values(kind, rng, df_target['NO_CNT'].to_numpy(), None, None, 'target')
+    return df_target
+
+
+def _inject_differences(frames, rng, diff_rate, contract_numbers):
+    """
+    Injecte des écarts contrôlés dans les tables cibles d'un lot.
+
+    Returns:
+        list: Écarts attendus [(index du contrat, table, type d'écart)].
+    """
+    kinds = [kind for kind, _ in DIFF_KINDS]
+    weights = np.array([weight for _, weight in DIFF_KINDS])
+    expected = []
+
+    for contract in contract_numbers[rng.random(len(contract_numbers)) < diff_rate]:
+        target_id = contract + TARGET_ID_OFFSET
+        candidates = [table for table, (_, df_target) in frames.items() if (df_target['NO_CNT'] == target_id).any()]
+        if not candidates:
+            continue
+        table = candidates[rng.integers(0, len(candidates))]
+        df_target = frames[table][1]
+        rows = np.flatnonzero(df_target['NO_CNT'].to_numpy() == target_id)
+        row = df_target.index[rows[rng.integers(0, len(rows))]]
+        kind = kinds[rng.choice(len(kinds), p=weights / weights.sum())]
+        if table == 'LV.SCNTT0':
+            # Une ligne SCNTT0 en moins rendrait le contrat cible introuvable (résolution des ID)
+            kind = 'value'
+
+        if kind == 'value':
+            candidates = compared_columns(table)
+            column, column_kind = candidates[rng.integers(0, len(candidates))]
+            if column_kind in ('amount', 'rate'):
+                df_target.loc[row, column] = round(float(df_target.loc[row, column]) + 1.0, 4)
+            else:
+                df_target.loc[row, column] = 'ZZ_ECART'
+        elif kind == 'missing_row':
+            df_target = df_target.drop(index=row)
+        else:
+            df_target = pd.concat([df_target, df_target.loc[[row]]], ignore_index=True)
+
+        frames[table] = (frames[table][0], df_target.reset_index(drop=True))
+        expected.append((int(contract), table, kind))
+    return expected
+
+
+def create_schema(connection):
+    """Crée les 8 tables synthétiques (base SQLite attachée sous le nom LV) et leurs index NO_CNT."""
+    for table_name in TABLE_SCHEMAS:
+        table = table_name.split('.')[1]
+        columns = ", ".join(f"{name} {sql_type}" for name, sql_type, _ in table_schema(table_name))
+        connection.execute(f"CREATE TABLE {table} ({columns})")
+        connection.execute(f"CREATE INDEX IX_{table}_NO_CNT ON {table} (NO_CNT)")
+    connection.execute("CREATE INDEX IX_SCNTT0_EXT ON SCNTT0 (NO_CNT_EXTENDED)")
+
+
+def generate_database(path, n_contracts, seed=42, diff_rate=0.05, chunk_size=5000):
+    """
+    Génère une base SQLite de N couples (contrat source, contrat cible dupliqué) sur les 8 tables LV.
+
+    Les contrats sources sont numérotés S000000000.., les cibles T000000000.. (NO_CNT_EXTENDED).
+    Les cibles sont des copies des sources (colonnes techniques exclues de la comparaison mises à jour),
+    dans lesquelles une proportion `diff_rate` de contrats reçoit un écart contrôlé. La génération est
+    faite par lots de `chunk_size` contrats : la mémoire reste bornée même à 100 000 contrats.
+
+    Un fichier <path>.json décrit le jeu de données (paramètres, volumes, écarts attendus) : une base
+    déjà générée avec les mêmes paramètres est réutilisée telle quelle.
+
+    Returns:
+        dict: Description du jeu de données ('contracts', 'rows', 'expected_diffs', ...).
+    """
+    info_path = path + '.json'
+    params = {'contracts': n_contracts, 'seed': seed, 'diff_rate': diff_rate}
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path, encoding='utf-8') as f:
+            info = json.load(f)
+        if all(info.get(key) == value for key, value in params.items()):
+            logger.info(f"Jeu de données synthétique réutilisé : {path}")
+            return info
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    rows = {table_name: 0 for table_name in TABLE_SCHEMAS}
+    expected = []
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        create_schema(connection)
+
+        for start in range(0, n_contracts, chunk_size):
+            contract_numbers = np.arange(start, min(start + chunk_size, n_contracts))
+            frames = {}
+            for table_name in TABLE_SCHEMAS:
+                counts = ROW_DISTRIBUTIONS[table_name](rng, len(contract_numbers))
+                df_source = generate_table(table_name, rng, contract_numbers, counts)
+                frames[table_name] = (df_source, _target_rows(table_name, df_source, rng))
+
+            expected += _inject_differences(frames, rng, diff_rate, contract_numbers)
+
+            for table_name, (df_source, df_target) in frames.items():
+                table = table_name.split('.')[1]
+                placeholders = ", ".join("?" * len(df_source.columns))
+                for df in (df_source, df_target):
+                    values = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+                    connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", values)
+                    rows[table_name] += len(df)
+            connection.commit()
+            logger.info(f"   Génération : {min(start + chunk_size, n_contracts)}/{n_contracts} contrats.")
+    finally:
+        connection.close()
+
+    info = dict(params, rows=rows, expected_diffs=[list(diff) for diff in expected])
+    with open(info_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    return info
+
+
+def contract_mapping(n_contracts):
+    """Fichier de mapping (format run_activation.py) des N couples source / cible synthétiques."""
+    numbers = np.char.zfill(np.arange(n_contracts).astype(str), 9)
+    return pd.DataFrame({
+        'Ancien_Contrat': np.char.add('S', numbers),
+        'Nouveau_Contrat': np.char.add('T', numbers),
+        'Statut': 'OK'
+    })
@@ -0,0 +1,133 @@
+import time
+import logging
+import threading
+
+from config.settings import VISIBILITY_CONFIG
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class VisibilityWatcher:
+    """
+    Attente groupée de la visibilité dans LISA (LV.SCNTT0) des contrats tout juste dupliqués dans ELIA.
+
+    Au lieu d'interroger la base contrat par contrat avec une pause fixe, le surveillant garde l'ensemble
+    des contrats en attente et les recherche tous ensemble, en une requête ensembliste par passage
+    (DatabaseManager.resolve_internal_ids, sans cache). Chaque contrat a son propre rythme : première
+    recherche INITIAL_DELAY secondes après son enregistrement, puis délai multiplié par BACKOFF (plafonné
+    à MAX_DELAY) tant qu'il reste introuvable. Un passage regroupe tous les contrats arrivés à échéance.
+
+    Dès qu'un contrat est visible, on_visible(item, internal_id) est appelé ; s'il ne l'est toujours pas
+    DEADLINE secondes après son enregistrement, on_timeout(item). Les rappels sont exécutés sur le thread
+    du surveillant : ils doivent rester courts (ex: StagedPipeline.resume).
+
+    Utilisation :
+        watcher = VisibilityWatcher(db, on_visible, on_timeout)
+        watcher.watch('999123456', item)   # depuis n'importe quel thread
+        ...
+        watcher.close()                    # une fois tous les contrats résolus ou expirés
+    """
+
+    def __init__(self, db, on_visible, on_timeout, config=None):
+        self.db = db
+        self.on_visible = on_visible
+        self.on_timeout = on_timeout
+        self.config = config or VISIBILITY_CONFIG
+        self._waiting = {}   # contrat -> {'items', 'since', 'next_check', 'delay'}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='visibilite', daemon=True)
+        self._thread.start()
+
+    def watch(self, contract_ext, item):
+        """Ajoute un contrat (numéro externe) à l'ensemble des contrats attendus dans LISA."""
+        contract_ext = str(contract_ext).strip()
+        now = time.monotonic()
+        with self._condition:
+            entry = self._waiting.get(contract_ext)
+            if entry is not None:
+                # Même contrat cible pour plusieurs éléments : une seule recherche pour tous
+                entry['items'].append(item)
+                return
+            delay = self.config.get('INITIAL_DELAY', 1.0)
+            self._waiting[contract_ext] = {'items': [item], 'since': now, 'next_check': now + delay, 'delay': delay}
+            self._condition.notify()
+
+    def pending(self):
+        """Nombre de contrats encore attendus."""
+        with self._condition:
+            return len(self._waiting)
+
+    def close(self):
+        """Arrête le surveillant. Les contrats encore attendus ne sont plus recherchés."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self._waiting:
+            logger.warning(f"   [!] Surveillance de la synchro ELIA -> LISA arrêtée avec {len(self._waiting)} contrat(s) en attente.")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due = self._wait_for_due()
+                if due is None:
+                    return
+            self._check(due)
+
+    def _wait_for_due(self):
+        """Attend qu'au moins un contrat arrive à échéance (sous verrou). Retourne None à l'arrêt."""
+        while not self._closed:
+            now = time.monotonic()
+            due = [contract for contract, entry in self._waiting.items() if entry['next_check'] <= now]
+            if due:
+                return due
+            timeout = min((entry['next_check'] for entry in self._waiting.values()), default=None)
+            self._condition.wait(None if timeout is None else timeout - now)
+        return None
+
+    def _check(self, due):
+        """Un passage : recherche ensembliste des contrats arrivés à échéance, puis rappels."""
+        try:
+            with metrics.timer('visibility_poll') as measure:
+                found = self.db.resolve_internal_ids(due, chunk_size=self.config.get('CHUNK_SIZE', 1000), use_cache=False)
+                measure['rows'] = len(due)
+        except Exception as e:
+            # Erreur passagère (réseau, verrou...) : les contrats seront recherchés au passage suivant
+            logger.warning(f"   [!] Recherche de {len(due)} contrat(s) dans LISA impossible : {e}")
+            found = {}
+
+        now = time.monotonic()
+        visible, expired = [], []
+        with self._condition:
+            for contract in due:
+                entry = self._waiting[contract]
+                if contract in found:
+                    del self._waiting[contract]
+                    visible.append((entry, found[contract]['NO_CNT']))
+                    metrics.observe('visibility_wait', now - entry['since'])
+                elif now - entry['since'] >= self.config.get('DEADLINE', 300.0):
+                    del self._waiting[contract]
+                    expired.append(entry)
+                else:
+                    entry['delay'] = min(entry['delay'] * self.config.get('BACKOFF', 2.0), self.config.get('MAX_DELAY', 30.0))
+                    # La dernière recherche a lieu à l'échéance, pas après
+                    entry['next_check'] = min(now + entry['delay'], entry['since'] + self.config.get('DEADLINE', 300.0))
+            remaining = len(self._waiting)
+
+        logger.debug(f"Synchro ELIA -> LISA : {len(visible)} visible(s), {len(expired)} expiré(s) sur {len(due)} recherché(s), "
+                     f"{remaining} en attente.")
+        for entry, internal_id in visible:
+            for item in entry['items']:
+                self._callback(self.on_visible, item, internal_id)
+        for entry in expired:
+            for item in entry['items']:
+                self._callback(self.on_timeout, item)
+
+    @staticmethod
+    def _callback(func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Erreur dans le traitement d'un contrat visible / expiré : {e}")
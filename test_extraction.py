@@ -32,15 +32,13 @@ def main():
     # 3. Récupération de l'ID interne (NO_CNT)
     logger.info(f"Recherche de l'ID interne pour le contrat externe : {TARGET_CONTRACT}")
 
-    q_id = QUERIES["GET_INTERNAL_ID"].format(contract_number=TARGET_CONTRACT)
-    df_id = db.get_data(q_id)
+    df_id = db.get_data(QUERIES["GET_INTERNAL_ID"], {'contract_number': TARGET_CONTRACT})
 
     # Petite sécurité : parfois les numéros sont stockés sans tirets en base
     if df_id.empty:
         alt_contract = TARGET_CONTRACT.replace("-", "")
         logger.warning(f"Contrat introuvable avec tirets. Essai sans tirets : {alt_contract}")
-        q_id = QUERIES["GET_INTERNAL_ID"].format(contract_number=alt_contract)
-        df_id = db.get_data(q_id)
+        df_id = db.get_data(QUERIES["GET_INTERNAL_ID"], {'contract_number': alt_contract})
 
         if df_id.empty:
             logger.error(f"Le contrat {TARGET_CONTRACT} est totalement introuvable dans LV.SCNTT0.")
@@ -72,9 +70,8 @@ def main():
                 if table not in QUERIES:
                     continue
 
-                # Formatage de la requête avec l'ID interne
-                query = QUERIES[table].format(internal_id=internal_id)
-                df_table = db.get_data(query)
+                # Requête paramétrée avec l'ID interne
+                df_table = db.get_data(QUERIES[table], {'internal_id': internal_id})
 
                 # Nom de l'onglet (On enlève 'LV.' pour que ce soit plus propre, ex: 'SCNTT0')
                 sheet_name = table.replace("LV.", "")
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from src.synthetic_data import create_schema, table_schema
+from src.sqlite_database import SQLiteDatabaseManager
+
+
+@pytest.fixture
+def lv_path(tmp_path):
+    """Base SQLite vide au schéma des 8 tables LV synthétiques (attachée sous le nom LV par SQLiteDatabaseManager)."""
+    path = str(tmp_path / 'lv.sqlite')
+    connection = sqlite3.connect(path)
+    try:
+        create_schema(connection)
+        connection.commit()
+    finally:
+        connection.close()
+    return path
+
+
+@pytest.fixture
+def insert_rows(lv_path):
+    """Insère des lignes partielles dans une table LV (colonnes absentes : NULL)."""
+    def insert(table_name, rows):
+        names = {name for name, _, _ in table_schema(table_name)}
+        connection = sqlite3.connect(lv_path)
+        try:
+            for row in rows:
+                assert set(row) <= names
+                columns = ", ".join(row)
+                placeholders = ", ".join("?" * len(row))
+                connection.execute(f"INSERT INTO {table_name.split('.')[1]} ({columns}) VALUES ({placeholders})", list(row.values()))
+            connection.commit()
+        finally:
+            connection.close()
+    return insert
+
+
+@pytest.fixture
+def lv_db(lv_path):
+    """SQLiteDatabaseManager sur la base de test."""
+    db = SQLiteDatabaseManager(lv_path)
+    yield db
+    db.engine.dispose()
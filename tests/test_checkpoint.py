@@ -0,0 +1,59 @@
+import pytest
+
+from src.checkpoint import CheckpointJournal, campaign_fingerprint
+
+ROWS = [{'Contract': 'S001', 'Table': 'LV.SCNTT0', 'Status': 'OK', 'Details': None}]
+STATS = {'Product': 'VIE01', 'Contract': 'S001', 'Status': 'OK'}
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'checkpoints' / 'journal.sqlite')
+
+
+def test_round_trip(journal_path):
+    journal = CheckpointJournal(journal_path, fingerprint='campagne-1')
+    journal.record([('S001', 'T001', ROWS, STATS)])
+    journal.close()
+
+    journal = CheckpointJournal(journal_path, resume=True, fingerprint='campagne-1')
+    completed = journal.load()
+    journal.close()
+
+    assert completed == {('S001', 'T001'): (ROWS, STATS)}
+
+
+def test_reset_without_resume(journal_path):
+    journal = CheckpointJournal(journal_path, fingerprint='campagne-1')
+    journal.record([('S001', 'T001', ROWS, STATS)])
+    journal.close()
+
+    journal = CheckpointJournal(journal_path, fingerprint='campagne-2')
+    assert journal.load() == {}
+    journal.close()
+
+
+def test_resume_of_another_campaign_is_refused(journal_path):
+    journal = CheckpointJournal(journal_path, fingerprint='campagne-1')
+    journal.record([('S001', 'T001', ROWS, STATS)])
+    journal.close()
+
+    with pytest.raises(RuntimeError):
+        CheckpointJournal(journal_path, resume=True, fingerprint='campagne-2')
+
+    # Le journal refusé reste intact pour une reprise de la bonne campagne
+    journal = CheckpointJournal(journal_path, resume=True, fingerprint='campagne-1')
+    assert ('S001', 'T001') in journal.load()
+    journal.close()
+
+
+def test_fingerprint_covers_mapping_snapshots_and_plan(tmp_path):
+    mapping = tmp_path / 'mapping.xlsx'
+    mapping.write_bytes(b'mapping v1')
+    reference = campaign_fingerprint(str(mapping), 'snapshots-1', 2)
+
+    assert campaign_fingerprint(str(mapping), 'snapshots-1', 2) == reference
+    assert campaign_fingerprint(str(mapping), 'snapshots-2', 2) != reference
+    assert campaign_fingerprint(str(mapping), 'snapshots-1', 3) != reference
+    mapping.write_bytes(b'mapping v2')
+    assert campaign_fingerprint(str(mapping), 'snapshots-1', 2) != reference
@@ -0,0 +1,82 @@
+from src.checksum import build_checksum_query, checksum_expressions
+
+
+def bspdt0_rows(no_cnt, rows):
+    return [{'C_STE': 'A', 'NO_CNT': no_cnt, 'M_MVT': amount, 'C_TY_MVT': code} for amount, code in rows]
+
+
+def test_expressions_follow_comparison_rules():
+    columns = [('NO_CNT', 'int'), ('M_MVT', 'float'), ('C_TY_MVT', 'char'), ('D_CRT', 'date'),
+               ('D_VALEUR', 'datetime'), ('T_LIB', 'ntext')]
+    assert checksum_expressions('LV.BSPDT0', columns) == [
+        'COALESCE(CAST(LTRIM(RTRIM(C_TY_MVT)) AS NVARCHAR(MAX)), CHAR(0))',
+        'COALESCE(CAST(CAST(D_VALEUR AS DATETIME2) AS NVARCHAR(MAX)), CHAR(0))',
+        'COALESCE(CAST(CAST(ROUND(M_MVT, 4) AS DECIMAL(38, 4)) AS NVARCHAR(MAX)), CHAR(0))',
+        'COALESCE(CAST(LTRIM(RTRIM(CAST(T_LIB AS NVARCHAR(MAX)))) AS NVARCHAR(MAX)), CHAR(0))',
+    ]
+
+
+def test_wide_tables_stay_within_concat_ws_arguments():
+    columns = [(f"C_{index:03d}", 'int') for index in range(450)]
+    query, _ = build_checksum_query('LV.BSPDT0', columns)
+    assert query.count('CONCAT_WS(CHAR(31)') == 4
+
+
+def test_definition_changes_with_columns():
+    _, first = build_checksum_query('LV.BSPDT0', [('NO_CNT', 'int'), ('M_MVT', 'decimal')])
+    _, second = build_checksum_query('LV.BSPDT0', [('NO_CNT', 'int'), ('C_TY_MVT', 'char')])
+    assert first != second
+
+
+def test_duplicate_rows_do_not_cancel_out(lv_db, insert_rows):
+    insert_rows('LV.BSPDT0', bspdt0_rows(1, [(100, 'B'), (100, 'B')]) + bspdt0_rows(2, [(555, 'X'), (555, 'X')]))
+
+    _, checksums = lv_db.get_table_checksums('LV.BSPDT0', [1, 2])
+
+    assert checksums[1][0] == checksums[2][0] == 2
+    assert checksums[1][1] is not None
+    assert checksums[1] != checksums[2]
+
+
+def test_checksum_ignores_row_order_and_trailing_spaces(lv_db, insert_rows):
+    insert_rows('LV.BSPDT0', bspdt0_rows(1, [(100, 'B'), (250.5, 'C')]) + bspdt0_rows(2, [(250.5, 'C '), (100, 'B')]))
+
+    _, checksums = lv_db.get_table_checksums('LV.BSPDT0', [1, 2, 3])
+
+    assert checksums[1] == checksums[2]
+    assert checksums[3] == (0, None)
+
+
+def binary_checksum(text):
+    """BINARY_CHECKSUM de SQL Server sur une chaîne : rotation de 4 bits puis OU exclusif, octet par octet."""
+    value = 0
+    for byte in text.encode('latin-1'):
+        value = (((value << 4) | (value >> 28)) & 0xFFFFFFFF) ^ byte
+    return value
+
+
+def test_checksum_detects_changes_binary_checksum_misses(lv_db, insert_rows):
+    # Deux caractères distants de 8 positions échangés : rotation de 32 bits, même BINARY_CHECKSUM
+    assert binary_checksum('ABCDEFGHIJ') == binary_checksum('IBCDEFGHAJ')
+    insert_rows('LV.BSPDT0', bspdt0_rows(1, [(100, 'ABCDEFGHIJ')]) + bspdt0_rows(2, [(100, 'IBCDEFGHAJ')]))
+
+    _, checksums = lv_db.get_table_checksums('LV.BSPDT0', [1, 2])
+
+    assert checksums[1] != checksums[2]
+
+
+def test_null_is_not_confused_with_a_neighbour_column(lv_db, insert_rows):
+    insert_rows('LV.BSPDT0', [{'C_STE': 'A', 'NO_CNT': 1, 'M_MVT': None, 'C_TY_MVT': '100'},
+                              {'C_STE': 'A', 'NO_CNT': 2, 'M_MVT': 100, 'C_TY_MVT': None}])
+
+    _, checksums = lv_db.get_table_checksums('LV.BSPDT0', [1, 2])
+
+    assert checksums[1] != checksums[2]
+
+
+def test_checksum_detects_value_difference(lv_db, insert_rows):
+    insert_rows('LV.BSPDT0', bspdt0_rows(1, [(100, 'B'), (100, 'B')]) + bspdt0_rows(2, [(100, 'B'), (100.01, 'B')]))
+
+    _, checksums = lv_db.get_table_checksums('LV.BSPDT0', [1, 2])
+
+    assert checksums[1] != checksums[2]
@@ -0,0 +1,138 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config.exclusions import IGNORE_COLUMNS, SPECIFIC_EXCLUSIONS
+from src.comparator import compare_dataframes, compare_tables_bulk, _compare_by_keys
+from src.fingerprint import same_row_multiset
+
+CODES = ['A', 'B', 'C ', ' D', None]
+
+
+def random_frame(rng, rows):
+    return pd.DataFrame({
+        'NO_CNT': rng.integers(1, 10**6, rows),
+        'NO_AVT': rng.integers(0, 4, rows),
+        'C_PROP': rng.choice(CODES, rows),
+        'M_MNT': rng.integers(0, 10**6, rows) / 100,
+        'PC_TX': np.where(rng.random(rows) < 0.2, np.nan, rng.random(rows)),
+        'NB_UNITES': rng.integers(0, 50, rows),
+    })
+
+
+def mutate(rng, df):
+    """Variante d'un DataFrame : équivalente (ordre, espaces, bruit sous l'arrondi) ou en écart."""
+    df = df.sample(frac=1, random_state=int(rng.integers(1 << 31))).reset_index(drop=True)
+    df['NO_CNT'] = rng.integers(1, 10**6, len(df))
+    kind = rng.choice(['same', 'spaces', 'noise', 'value', 'code', 'drop', 'duplicate'])
+    if kind == 'spaces':
+        df['C_PROP'] = df['C_PROP'].map(lambda v: v if v is None else f"  {v} ")
+    elif kind == 'noise':
+        df['M_MNT'] = df['M_MNT'] + 1e-9
+    elif kind == 'value':
+        df.loc[int(rng.integers(len(df))), 'NB_UNITES'] += 1
+    elif kind == 'code':
+        row = int(rng.integers(len(df)))
+        df.loc[row, 'C_PROP'] = 'Z' if df.loc[row, 'C_PROP'] != 'Z' else 'Y'
+    elif kind == 'drop' and len(df) > 1:
+        df = df.drop(index=int(rng.integers(len(df)))).reset_index(drop=True)
+    elif kind == 'duplicate':
+        df = pd.concat([df, df.iloc[[int(rng.integers(len(df)))]]], ignore_index=True)
+    return df
+
+
+def reference_rows(df, table_name):
+    """Ancienne méthode : valeurs normalisées ligne par ligne, comparées comme multi-ensembles de tuples."""
+    excluded = set(IGNORE_COLUMNS) | set(SPECIFIC_EXCLUSIONS.get(table_name, []))
+    columns = sorted(col for col in df.columns if col not in excluded)
+
+    def normalize(value):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return None
+        if isinstance(value, str):
+            value = value.strip()
+            return None if value in ('nan', 'None') else value
+        return value
+
+    values = {col: df[col].round(4) if pd.api.types.is_float_dtype(df[col]) else df[col] for col in columns}
+    return Counter(zip(*(map(normalize, values[col].astype(object)) for col in columns)))
+
+
+@pytest.mark.parametrize('table_name', ['LV.BSPDT0', 'LV.SWBGT0'])
+def test_randomized_pairs_match_reference(table_name):
+    rng = np.random.default_rng(20261017)
+    pairs = []
+    for _ in range(100):
+        df_ref = random_frame(rng, int(rng.integers(1, 12)))
+        pairs.append((df_ref, mutate(rng, df_ref)))
+
+    statuses = []
+    for df_ref, df_new in pairs:
+        status, details = compare_dataframes(df_ref, df_new, table_name)
+        statuses.append(status)
+        expected_equal = reference_rows(df_ref, table_name) == reference_rows(df_new, table_name)
+        assert (status == 'OK') == expected_equal, (status, details)
+        if status != 'OK':
+            assert status.startswith('KO')
+
+    # Mode bulk : mêmes statuts que la comparaison contrat par contrat
+    df_ref_all = pd.concat([df.assign(contract=i) for i, (df, _) in enumerate(pairs)], ignore_index=True)
+    df_new_all = pd.concat([df.assign(contract=i) for i, (_, df) in enumerate(pairs)], ignore_index=True)
+    bulk = compare_tables_bulk(table_name, df_ref_all, df_new_all)
+    assert [bulk[i][0] == 'OK' for i in range(len(pairs))] == [status == 'OK' for status in statuses]
+
+
+def test_same_row_multiset():
+    df = pd.DataFrame({'A': [1, 2, 2], 'B': ['x', 'y', 'y']})
+
+    assert same_row_multiset(df, df.iloc[[2, 0, 1]])
+    # Même ensemble de lignes, multiplicités différentes
+    assert not same_row_multiset(df, df.iloc[[0, 1, 0]])
+    assert not same_row_multiset(df, df.iloc[[0, 1]])
+    assert not same_row_multiset(df, df.astype({'A': 'float64'}))
+
+
+def test_empty_and_missing_data():
+    df = random_frame(np.random.default_rng(1), 3)
+    assert compare_dataframes(df.iloc[:0], df.iloc[:0], 'LV.BSPDT0') == ("OK_EMPTY", None)
+    assert compare_dataframes(df, df.iloc[:0], 'LV.BSPDT0')[0] == "KO_MISSING_DATA"
+
+
+def keyed(rows):
+    return pd.DataFrame(rows, columns=['NO_AVT', 'C_PROP', 'M_MNT'])
+
+
+def test_compare_by_keys_isolates_changes():
+    df1 = keyed([(1, 'A', 10.0), (2, 'B', 20.0), (3, 'C', 30.0)])
+    df2 = keyed([(1, 'A', 10.0), (2, 'B', 25.0), (4, 'D', 40.0)])
+    values = ['C_PROP', 'M_MNT']
+
+    diff = _compare_by_keys(df1[values], df2[values], df1[['NO_AVT']], df2[['NO_AVT']])
+
+    assert sorted(set(diff.index.get_level_values('Ecart'))) == ['CIBLE_SEULE', 'MODIFIE', 'SOURCE_SEULE']
+    modified = diff.xs('MODIFIE', level='Ecart')
+    # Seule la cellule modifiée est renseignée
+    assert modified['C_PROP'].isna().all()
+    assert modified['M_MNT'].tolist() == [20.0, 25.0]
+    assert diff.xs('SOURCE_SEULE', level='Ecart').index.get_level_values('[NO_AVT]').tolist() == [3]
+    assert diff.xs('CIBLE_SEULE', level='Ecart').index.get_level_values('[NO_AVT]').tolist() == [4]
+
+
+def test_compare_by_keys_pairs_duplicate_keys_and_ignores_order():
+    df1 = keyed([(1, 'A', 10.0), (1, 'B', 11.0), (2, 'C', 20.0)])
+    df2 = keyed([(2, 'C', 20.0), (1, 'B', 11.0), (1, 'A', 10.0)])
+    values = ['C_PROP', 'M_MNT']
+
+    assert _compare_by_keys(df1[values], df2[values], df1[['NO_AVT']], df2[['NO_AVT']]) is None
+
+
+def test_keyed_table_reports_row_count_difference():
+    df_ref = keyed([(1, 'A', 10.0), (2, 'B', 20.0)])
+    df_new = keyed([(1, 'A', 10.0), (2, 'B', 20.0), (3, 'C', 30.0)])
+
+    status, diff = compare_dataframes(df_ref, df_new, 'LV.SAVTT0')
+
+    assert status == 'KO_ROW_COUNT'
+    assert diff.index.get_level_values('Ecart').unique().tolist() == ['CIBLE_SEULE']
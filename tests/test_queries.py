@@ -0,0 +1,43 @@
+import numpy as np
+from sql.queries import BATCH_QUERIES, QUERIES, padded_list, prepared, query_name
+
+
+def test_padded_list_rounds_up_to_power_of_two():
+    assert padded_list([], 500) == []
+    assert padded_list([7], 500) == [7]
+    assert padded_list([1, 2, 3], 500) == [1, 2, 3, 3]
+    assert padded_list(list(range(5)), 500) == [0, 1, 2, 3, 4, 4, 4, 4]
+
+
+def test_padded_list_is_capped_by_max_size():
+    assert len(padded_list(list(range(300)), 500)) == 500
+    assert len(padded_list(list(range(500)), 500)) == 500
+    # Une liste déjà plus longue que la borne n'est pas tronquée
+    assert len(padded_list(list(range(600)), 500)) == 600
+
+
+def test_padded_list_converts_numpy_scalars():
+    values = padded_list(list(np.array([1, 2, 3], dtype=np.int64)), 500)
+    assert all(type(value) is int for value in values)
+
+
+def test_prepared_binds_lists_as_expanding_parameters():
+    statement = prepared(BATCH_QUERIES['LV.SCNTT0'])
+    assert statement._bindparams['internal_ids'].expanding
+
+    single = prepared(QUERIES['GET_INTERNAL_ID'])
+    assert not single._bindparams['contract_number'].expanding
+
+
+def test_prepared_statement_runs_on_sqlite(lv_db, insert_rows):
+    insert_rows('LV.SCNTT0', [{'NO_CNT': no_cnt, 'NO_CNT_EXTENDED': f'T{no_cnt}'} for no_cnt in (1, 2, 3)])
+
+    df = lv_db.get_data(prepared(BATCH_QUERIES['LV.SCNTT0']), {'internal_ids': padded_list([1, 3], 8)})
+
+    assert sorted(df['NO_CNT'].tolist()) == [1, 3]
+
+
+def test_query_name_ignores_layout():
+    assert query_name(" ".join(QUERIES['GET_INTERNAL_ID'].split())) == 'GET_INTERNAL_ID'
+    assert query_name(BATCH_QUERIES['LV.PRCTT0']) == 'LV.PRCTT0'
+    assert query_name("SELECT 1") is None
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+import src.query_cache as query_cache
+from sql.queries import QUERIES
+from src.query_cache import QueryCache, cache_key, normalize_sql
+
+CONFIG = {'MAX_BYTES': 10 ** 6, 'DEFAULT_TTL': 60, 'TTL': {'GET_INTERNAL_ID': 900, 'LV.*': 0}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ttl_from_registry_patterns():
+    cache = QueryCache(CONFIG)
+    assert cache.ttl(normalize_sql(QUERIES['GET_INTERNAL_ID'])) == 900
+    assert cache.ttl(normalize_sql(QUERIES['LV.PRCTT0'])) == 0
+    assert cache.ttl("SELECT 1") == 60
+    assert cache.ttl("INSERT INTO LV.PRCTT0 VALUES (1)") == 0
+
+
+def test_entries_expire(clock):
+    cache = QueryCache(CONFIG)
+    key = cache_key("SELECT NO_CNT FROM LV.SCNTT0", {'ids': [1, 2]})
+    cache.put(key, pd.DataFrame({'NO_CNT': [1]}), ttl=10)
+
+    clock[0] += 9
+    assert cache.get(key) is not None
+    clock[0] += 2
+    assert cache.get(key) is None
+    assert cache.stats()['expired'] == 1
+
+
+def test_get_returns_a_copy():
+    cache = QueryCache(CONFIG)
+    cache.put('k', pd.DataFrame({'A': [1]}), ttl=10)
+    copy = cache.get('k')
+    copy.loc[0, 'A'] = 99
+    assert cache.get('k')['A'].tolist() == [1]
+
+
+def test_empty_results_are_not_cached():
+    cache = QueryCache(CONFIG)
+    cache.put('k', pd.DataFrame({'A': []}), ttl=10)
+    assert cache.get('k') is None
+
+
+def test_invalidate_by_table():
+    cache = QueryCache(CONFIG)
+    df = pd.DataFrame({'A': [1]})
+    cache.put(("SELECT * FROM LV.PRCTT0", ()), df, ttl=10)
+    cache.put(("SELECT * FROM LV.SCNTT0", ()), df, ttl=10)
+
+    cache.invalidate('LV.PRCTT0')
+
+    assert cache.get(("SELECT * FROM LV.PRCTT0", ())) is None
+    assert cache.get(("SELECT * FROM LV.SCNTT0", ())) is not None
+    cache.invalidate()
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_are_evicted_beyond_max_bytes():
+    df = pd.DataFrame({'A': range(1000)})
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    cache = QueryCache(dict(CONFIG, MAX_BYTES=2 * size))
+    cache.put('a', df, ttl=10)
+    cache.put('b', df, ttl=10)
+    cache.get('a')
+    cache.put('c', df, ttl=10)
+
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_database_reads_hit_cache_until_a_write(lv_db, insert_rows):
+    insert_rows('LV.SCNTT0', [{'NO_CNT': 1, 'NO_CNT_EXTENDED': 'T1'}])
+    insert_rows('LV.PRCTT0', [{'NO_CNT': 1, 'M_PAY': 10.0, 'C_MD_PMT': '6', 'D_REF_PRM': '2026-01-01'}])
+    lv_db.query_cache = QueryCache(dict(CONFIG, TTL={'*': 600}))
+    query = "SELECT NO_CNT, M_PAY FROM LV.PRCTT0 WHERE NO_CNT = :internal_id"
+
+    assert len(lv_db.get_data(query, {'internal_id': 1})) == 1
+    assert len(lv_db.get_data(query, {'internal_id': 1})) == 1
+    assert lv_db.get_cache_stats()['hits'] == 1
+
+    assert lv_db.inject_payment(1, 25.0)
+    assert len(lv_db.get_data(query, {'internal_id': 1})) == 2
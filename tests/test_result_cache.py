@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from config.settings import SNAPSHOT_CONFIG
+from src.result_cache import ResultCache, result_key
+from src.snapshot_store import SnapshotReader, SnapshotWriter
+
+
+def test_round_trip_across_instances(tmp_path):
+    path = str(tmp_path / 'cache' / 'results.sqlite')
+    cache = ResultCache(path)
+    cache.put('k1', 'KO', 'différentiel')
+    cache.put('k2', 'OK', None)
+    cache.commit()
+    cache.close()
+
+    cache = ResultCache(path)
+    assert cache.get('k1') == ('KO', 'différentiel')
+    assert cache.get('k2') == ('OK', None)
+    assert cache.get('absent') is None
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'), max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, 'OK', None)
+        cache.commit()
+    cache.get('a')
+    cache.evict()
+
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+    cache.close()
+
+
+def test_key_follows_content():
+    df = pd.DataFrame({'M_MNT': [1.0, 2.0]})
+    key = result_key('LV.SWBGT0', df, df)
+
+    assert result_key('LV.SWBGT0', df.copy(), df.copy()) == key
+    assert result_key('LV.SWBGT0', df, df.assign(M_MNT=[1.0, 3.0])) != key
+    assert result_key('LV.SCLST0', df, df) != key
+    # Somme de contrôle du manifeste réutilisée telle quelle pour un snapshot relu et vérifié
+    snapshot = df.copy()
+    snapshot.attrs['checksum'] = 'manifeste'
+    assert result_key('LV.SWBGT0', snapshot, df) != key
+
+
+def test_corrupted_snapshot_does_not_reuse_cached_result(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    # Fichier Arrow non compressé : l'altération d'un octet reste lisible
+    monkeypatch.setitem(SNAPSHOT_CONFIG, 'COMPRESSION', None)
+    df = pd.DataFrame({'C_ETAT': ['VALEUR_A', 'VALEUR_B'], 'M_PAY': [1.0, 2.0]})
+    SnapshotWriter(str(tmp_path), run_id='20260101_000000_1').write_block('LV.PRCTT0', {'S001': df})
+
+    loaded = SnapshotReader(str(tmp_path), verify_sample=0).load('S001', 'LV.PRCTT0')
+    assert 'checksum' not in loaded.attrs
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    cache.put(result_key('LV.PRCTT0', loaded, df), 'OK', None)
+
+    part_file, = (tmp_path / 'runs' / '20260101_000000_1' / 'LV.PRCTT0').glob('*.arrow')
+    content = part_file.read_bytes()
+    assert content.count(b'VALEUR_B') == 1
+    part_file.write_bytes(content.replace(b'VALEUR_B', b'VALEUR_X'))
+
+    corrupted = SnapshotReader(str(tmp_path), verify_sample=0).load('S001', 'LV.PRCTT0')
+    assert corrupted['C_ETAT'].tolist() == ['VALEUR_A', 'VALEUR_X']
+    assert cache.get(result_key('LV.PRCTT0', corrupted, df)) is None
+    cache.close()
@@ -0,0 +1,66 @@
+import threading
+
+from run_activation import PaymentBatcher, check_connection_budget, stage_payment
+from src.pipeline import StagedPipeline
+
+
+def payment_item(index):
+    return {'Ancien_Contrat': f"R{index}", 'Nouveau_Contrat': f"N{index}", 'Id_New': index, 'Montant': 100.0, 'Result': None}
+
+
+def test_partial_batch_is_injected_without_waiting_for_close(lv_db):
+    paid = []
+    all_paid = threading.Event()
+
+    def on_paid(item):
+        paid.append(item)
+        if len(paid) == 3:
+            all_paid.set()
+
+    batcher = PaymentBatcher(lv_db, on_paid, batch_size=200, max_wait=0.05)
+    try:
+        for index in range(3):
+            batcher.add(payment_item(index))
+        # Lot incomplet : injecté après max_wait, sans attendre close()
+        assert all_paid.wait(5)
+    finally:
+        batcher.close()
+
+    assert [item['Result']['Statut'] for item in paid] == ['OK_PAID'] * 3
+    assert len(lv_db.get_data("SELECT NO_CNT FROM LV.PRCTT0")) == 3
+
+
+def test_contract_is_done_only_once_paid(lv_db):
+    done = []
+    batcher = PaymentBatcher(lv_db, on_paid=lambda item: pipeline.resume(item, False), batch_size=2, max_wait=0.05)
+    pipeline = StagedPipeline(
+        [('paiement', lambda item: stage_payment(batcher, item), 1)],
+        on_done=lambda item: done.append(item['Result'])
+    )
+    try:
+        for index in range(5):
+            pipeline.submit(payment_item(index))
+        pipeline.join()
+    finally:
+        batcher.close()
+
+    assert len(done) == 5
+    assert all(result is not None and result['Statut'] == 'OK_PAID' for result in done)
+
+
+def test_injection_error_still_finishes_contracts():
+    class BrokenDatabase:
+        def inject_payments(self, payments):
+            raise RuntimeError("connexion perdue")
+
+    paid = []
+    batcher = PaymentBatcher(BrokenDatabase(), paid.append, batch_size=2, max_wait=10)
+    batcher.add(payment_item(1))
+    batcher.close()
+
+    assert paid[0]['Result']['Statut'] == 'KO_PAYMENT'
+    assert paid[0]['Result']['Error'] == "connexion perdue"
+
+
+def test_pipeline_fits_in_the_default_pool(lv_db):
+    assert check_connection_budget(lv_db)
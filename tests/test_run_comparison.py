@@ -0,0 +1,68 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from run_comparison import checksum_pushdown, map_bounded
+from sql.queries import QUERIES
+from src.snapshot_store import SnapshotReader, SnapshotWriter
+from tests.test_checksum import bspdt0_rows
+
+
+def test_map_bounded_keeps_order_and_window():
+    submitted = []
+    lock = threading.Lock()
+
+    def work(item):
+        with lock:
+            submitted.append(item)
+        # Les premiers éléments finissent en dernier : l'ordre doit pourtant être conservé
+        time.sleep(0.02 if item < 3 else 0)
+        return item * 10
+
+    consumed = []
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for result in map_bounded(executor, work, range(20), window=4):
+            with lock:
+                # Jamais plus de `window` éléments soumis et pas encore consommés
+                assert len(submitted) - len(consumed) <= 4
+            consumed.append(result)
+
+    assert consumed == [item * 10 for item in range(20)]
+
+
+def pushdown_jobs(insert_rows):
+    """
+    Quatre paires (source, cible) : identique, ligne modifiée, doublons remplacés par d'autres doublons,
+    libellé aux caractères échangés (même BINARY_CHECKSUM).
+    """
+    insert_rows('LV.BSPDT0', bspdt0_rows(1, [(100, 'B'), (250.5, 'C')]) + bspdt0_rows(2, [(250.5, 'C '), (100, 'B')])
+                + bspdt0_rows(3, [(100, 'B'), (250.5, 'C')]) + bspdt0_rows(4, [(100, 'B'), (250.6, 'C')])
+                + bspdt0_rows(5, [(100, 'B'), (100, 'B')]) + bspdt0_rows(6, [(555, 'X'), (555, 'X')])
+                + bspdt0_rows(7, [(100, 'ABCDEFGHIJ')]) + bspdt0_rows(8, [(100, 'IBCDEFGHAJ')]))
+    return [
+        {'Row': row, 'Id_Ref': ref, 'Id_New': ref + 1, 'Ref_Contract': f"R{ref}"}
+        for row, ref in enumerate([1, 3, 5, 7])
+    ]
+
+
+def test_checksum_pushdown_live_matches_only_equal_pairs(lv_db, insert_rows, tmp_path):
+    jobs = pushdown_jobs(insert_rows)
+
+    matched = checksum_pushdown(lv_db, jobs, 'LV.BSPDT0', SnapshotReader(str(tmp_path)))
+
+    assert matched == {0: (("OK", None), False)}
+
+
+def test_checksum_pushdown_uses_snapshot_checksums(lv_db, insert_rows, tmp_path):
+    jobs = pushdown_jobs(insert_rows)
+    definition, source_checksums = lv_db.get_table_checksums('LV.BSPDT0', [job['Id_Ref'] for job in jobs])
+    writer = SnapshotWriter(str(tmp_path))
+    writer.write_block(
+        'LV.BSPDT0',
+        {job['Ref_Contract']: lv_db.get_data(QUERIES['LV.BSPDT0'], {'internal_id': job['Id_Ref']}) for job in jobs},
+        server_checksums=(definition, {job['Ref_Contract']: source_checksums[job['Id_Ref']] for job in jobs})
+    )
+
+    matched = checksum_pushdown(lv_db, jobs, 'LV.BSPDT0', SnapshotReader(str(tmp_path)))
+
+    assert matched == {0: (("OK", None), True)}
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.fingerprint import frame_checksum
+from src.snapshot_store import SnapshotWriter, SnapshotReader
+
+pytest.importorskip('pyarrow')
+
+
+def contract_frame(seed, rows=5):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'NO_CNT': np.full(rows, seed),
+        'C_ETAT': rng.choice(['A', 'B ', None], rows),
+        'M_PAY': rng.random(rows).round(2),
+    })
+
+
+@pytest.fixture
+def written(tmp_path):
+    frames = {f'S{i:03d}': contract_frame(i) for i in range(20)}
+    writer = SnapshotWriter(str(tmp_path), run_id='20260101_000000_1')
+    writer.write_block('LV.PRCTT0', frames)
+    return str(tmp_path), frames
+
+
+def corrupt_manifest(snapshot_dir, contract_ext):
+    reader = SnapshotReader(snapshot_dir)
+    reader.index[(contract_ext, 'LV.PRCTT0')]['checksum'] = '0' * 40
+    return reader
+
+
+def test_round_trip_keeps_values_and_checksum(written):
+    snapshot_dir, frames = written
+    reader = SnapshotReader(snapshot_dir, verify_sample=1.0)
+    for contract_ext, df in frames.items():
+        loaded = reader.load(contract_ext, 'LV.PRCTT0')
+        pd.testing.assert_frame_equal(loaded, df)
+        assert loaded.attrs['checksum'] == frame_checksum(df)
+
+
+def test_categorical_columns_are_stored_as_values(tmp_path):
+    df = contract_frame(1).astype({'C_ETAT': 'category'})
+    SnapshotWriter(str(tmp_path), run_id='20260101_000000_1').write_block('LV.PRCTT0', {'S001': df})
+
+    loaded = SnapshotReader(str(tmp_path), verify_sample=1.0).load('S001', 'LV.PRCTT0')
+
+    assert loaded is not None
+    assert not isinstance(loaded['C_ETAT'].dtype, pd.CategoricalDtype)
+    assert loaded['C_ETAT'].tolist() == df['C_ETAT'].astype(object).tolist()
+
+
+def test_checksum_verified_on_demand(written):
+    snapshot_dir, _ = written
+    reader = corrupt_manifest(snapshot_dir, 'S003')
+    reader.verify_sample = 0
+
+    assert reader.load('S003', 'LV.PRCTT0') is not None
+    assert reader.load('S003', 'LV.PRCTT0', verify=True) is None
+
+
+def test_checksum_verified_on_sample(written):
+    snapshot_dir, frames = written
+    reader = SnapshotReader(snapshot_dir, verify_sample=0.5)
+    sampled = [contract_ext for contract_ext in frames if reader._sampled(contract_ext, 'LV.PRCTT0')]
+    assert 0 < len(sampled) < len(frames)
+
+    for contract_ext in frames:
+        reader.index[(contract_ext, 'LV.PRCTT0')]['checksum'] = '0' * 40
+    missing = [contract_ext for contract_ext in frames if reader.load(contract_ext, 'LV.PRCTT0') is None]
+
+    assert missing == sampled
+
+
+def test_pickle_files_stay_in_their_run(tmp_path):
+    first, second = contract_frame(1), contract_frame(2)
+    SnapshotWriter(str(tmp_path), run_id='20260101_000000_1', file_format='pickle').write_block('LV.PRCTT0', {'S001': first})
+    SnapshotWriter(str(tmp_path), run_id='20260102_000000_1', file_format='pickle').write_block('LV.PRCTT0', {'S001': second})
+
+    assert not list(tmp_path.glob('*.pkl'))
+    runs = SnapshotReader(str(tmp_path), verify_sample=1.0)
+    pd.testing.assert_frame_equal(runs.load('S001', 'LV.PRCTT0'), second)
+    # Le fichier du premier run est intact
+    pd.testing.assert_frame_equal(pd.read_pickle(tmp_path / 'runs' / '20260101_000000_1' / 'LV.PRCTT0' / 'S001.pkl'), first)
+
+
+def test_concurrent_loads_return_the_right_frames(tmp_path):
+    frames = {f'S{i:03d}': contract_frame(i, rows=50) for i in range(40)}
+    writer = SnapshotWriter(str(tmp_path), run_id='20260101_000000_1')
+    for start in range(0, len(frames), 10):
+        writer.write_block('LV.PRCTT0', dict(list(frames.items())[start:start + 10]))
+    # Moins de fichiers gardés ouverts que de fichiers lus : évictions pendant les lectures
+    reader = SnapshotReader(str(tmp_path), max_open_files=2, verify_sample=0)
+
+    def load(contract_ext):
+        return contract_ext, reader.load(contract_ext, 'LV.PRCTT0')
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for contract_ext, loaded in executor.map(load, list(frames) * 5):
+            pd.testing.assert_frame_equal(loaded, frames[contract_ext])
@@ -0,0 +1,17 @@
+from src.sqlite_database import to_sqlite_sql
+
+
+def test_sql_server_hints_are_translated():
+    statement = to_sqlite_sql("SELECT TOP 1 NO_CNT FROM LV.SCNTT0 WITH (NOLOCK) WHERE NO_CNT_EXTENDED = :contract_ext")
+    assert statement == "SELECT NO_CNT FROM LV.SCNTT0 WHERE NO_CNT_EXTENDED = :contract_ext LIMIT 1"
+
+
+def test_table_columns_from_pragma(lv_db):
+    columns = dict(lv_db.get_table_columns('LV.BSPDT0'))
+    assert columns['NO_CNT'] == 'integer'
+    assert columns['M_MVT'] == 'decimal'
+
+
+def test_table_columns_of_unknown_schema_is_empty(lv_db):
+    # Erreur SQL remontée par SQLAlchemy (OperationalError) : journalisée, pas propagée
+    assert lv_db.get_table_columns('XX.UNKNOWN') == []